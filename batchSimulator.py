@@ -0,0 +1,208 @@
+from __future__ import division
+import numpy as np
+from blockCache import openBlockCache
+
+# Vectorized batch simulation of the Gabor-bandit task
+#
+# Block files are loaded into arrays of shape (blocks, trials) and N simulated
+# participants are run through all blocks at once without PsychoPy. Only the
+# loop over trial positions is sequential (learning); participants and blocks
+# are processed as arrays. Scoring follows createFractals and taskLoop.
+#
+# Missed trials are repeated at the end of the block (repeat policy 'end').
+# Misses are independent of the trial, so the number of misses of every trial
+# is drawn at once: a trial that is missed k times is answered in round k of
+# the queue, and the answered order is the sort by (k, trial index).
+
+
+def loadBlocks(blockList, blockDir='blockFiles'):
+    """ This function loads block files into arrays
+
+    Input:
+        blockList: list of paths to block files (all with the same number of trials)
+        blockDir: directory that contains blockFiles
+
+    Return:
+        blocks: dictionary with arrays of shape (blocks, trials):
+                PU (contrast difference), targetLeft (target patch is left),
+                redUp (red fractal is up), corrUp (correct fractal is up), outcomes
+    """
+
+    blockCache = openBlockCache(blockDir)
+    rows = np.stack([blockCache.getBlock(blockIndex) for blockIndex in blockList])
+    return {'PU': rows['PU'].astype(float), 'targetLeft': rows['targetPatch'] == 'left',
+            'redUp': rows['redFractal'] == 'up', 'corrUp': rows['corrAns'] == 'up',
+            'outcomes': rows['outcomes'].astype(int)}
+
+
+def answerOrder(misses, maxRepeats=None):
+    """ This function returns the order in which trials are answered (repeat policy 'end')
+
+    Input:
+        misses: array (..., trials) with number of misses before each trial is answered
+        maxRepeats: number of repeats after which a missed trial is given up (None = repeat until answered)
+
+    Return:
+        order: trial indices in order of answering (given-up trials last)
+        answered: indicates if the trial at this position was answered
+    """
+
+    nTrials = misses.shape[-1]
+    rounds = misses.copy()
+    if maxRepeats is not None:
+        rounds[misses > maxRepeats] = maxRepeats + 1  # given up
+    order = np.argsort(rounds * nTrials + np.arange(nTrials), axis=-1, kind='stable')
+    answered = np.take_along_axis(rounds, order, axis=-1) <= (np.inf if maxRepeats is None else maxRepeats)
+    return order, answered
+
+
+def simulate(blocks, nParticipants, perceptualNoise=0.03, learningRate=0.2, beta=5.0, lapseRate=0.02,
+             missRate=0.02, maxRepeats=None, reward=1, noReward=0, seed=None, chunkSize=10000):
+    """ This function simulates participants in all blocks at once
+
+    Every presented trial is missed with probability missRate (no feedback,
+    trial is repeated). Answered trials are perceived with Gaussian noise on
+    the contrast difference; the perceived target side is the state. The
+    value of each fractal color in each state is learned with a delta rule
+    (reset at the start of every block) and choices follow a softmax. With
+    probability lapseRate a decision is random.
+
+    Input:
+        blocks: block arrays (loadBlocks)
+        nParticipants: number of simulated participants
+        perceptualNoise: standard deviation of perceived contrast difference
+        learningRate: learning rate of the delta rule
+        beta: inverse temperature of the softmax
+        lapseRate: probability of a random decision
+        missRate: probability of missing a presented trial
+        maxRepeats: number of repeats after which a missed trial is given up (None = repeat until answered)
+        reward: number of points if rewarded
+        noReward: number of points if not rewarded
+        seed: seed of the random number generator
+        chunkSize: number of participants that are simulated at once (bounds memory)
+
+    Return:
+        results: dictionary with arrays of shape (participants, blocks):
+                 points, decision1Corr, decision2Corr, misses, givenUp
+    """
+
+    randomState = np.random.RandomState(seed)
+    (nBlocks, nTrials) = blocks['PU'].shape
+    results = dict((name, np.zeros((nParticipants, nBlocks), dtype=int))
+                   for name in ('points', 'decision1Corr', 'decision2Corr', 'misses', 'givenUp'))
+
+    for start in range(0, nParticipants, chunkSize):
+        n = min(chunkSize, nParticipants - start)
+        shape = (n, nBlocks, nTrials)
+
+        # Misses and order of answered trials
+        if missRate > 0:
+            misses = randomState.geometric(1 - missRate, size=shape) - 1
+        else:
+            misses = np.zeros(shape, dtype=int)
+        (order, answered) = answerOrder(misses, maxRepeats)
+        if maxRepeats is None:
+            results['misses'][start:start+n] = misses.sum(axis=-1)
+        else:
+            results['misses'][start:start+n] = np.minimum(misses, maxRepeats + 1).sum(axis=-1)
+        results['givenUp'][start:start+n] = nTrials - answered.sum(axis=-1)
+
+        def trialArray(name):
+            return np.take_along_axis(np.broadcast_to(blocks[name], shape), order, axis=-1)
+        PU = trialArray('PU')
+        targetLeft = trialArray('targetLeft')
+        redUp = trialArray('redUp')
+        corrUp = trialArray('corrUp')
+        outcomes = trialArray('outcomes')
+
+        # Perceptual decision (perceived target side is the state)
+        perceivedCorrect = PU + randomState.normal(0, perceptualNoise, size=shape) > 0
+        lapse1 = randomState.random_sample(shape) < lapseRate
+        chooseLeft = np.where(lapse1, randomState.random_sample(shape) < 0.5, perceivedCorrect == targetLeft)
+        decision1Corr = (chooseLeft == targetLeft) & answered
+        state = chooseLeft.astype(int)
+
+        # Economic decision with learning (sequential over trial positions)
+        lapse2 = randomState.random_sample(shape) < lapseRate
+        lapseRed = randomState.random_sample(shape) < 0.5
+        uniform = randomState.random_sample(shape)
+        values = np.full((n, nBlocks, 2, 2), 0.5)  # state x color (0 = red, 1 = blue)
+        index = np.indices((n, nBlocks))
+        points = np.zeros((n, nBlocks), dtype=type(reward + noReward))
+        decision2Corr = np.zeros((n, nBlocks), dtype=int)
+        for t in range(nTrials):
+            thisState = state[:, :, t]
+            thisValues = values[index[0], index[1], thisState]
+            pRed = 1 / (1 + np.exp(-beta * (thisValues[..., 0] - thisValues[..., 1])))
+            chooseRed = np.where(lapse2[:, :, t], lapseRed[:, :, t], uniform[:, :, t] < pRed)
+
+            # Scoring of createFractals: correct fractal is rewarded if outcome is 1, the other one otherwise
+            chooseUp = chooseRed == redUp[:, :, t]
+            corr = chooseUp == corrUp[:, :, t]
+            rewarded = corr == (outcomes[:, :, t] == 1)
+            thisReward = np.where(rewarded, reward, noReward)
+            thisAnswered = answered[:, :, t]
+            points = points + np.where(thisAnswered, thisReward, 0)
+            decision2Corr = decision2Corr + (corr & thisAnswered)
+
+            # Delta rule on the chosen color (missed trials give no feedback)
+            color = (~chooseRed).astype(int)
+            chosenValue = values[index[0], index[1], thisState, color]
+            values[index[0], index[1], thisState, color] = np.where(thisAnswered,
+                chosenValue + learningRate * (rewarded - chosenValue), chosenValue)
+
+        results['points'][start:start+n] = points
+        results['decision1Corr'][start:start+n] = decision1Corr.sum(axis=-1)
+        results['decision2Corr'][start:start+n] = decision2Corr
+    return results
+
+
+def taskReward(points, nTrials, nBlocks):
+    """ This function computes the reward of a task loop like taskLoop
+
+    taskLoop computes (points - nTrials*nBlocks/2)/15 with float points, so
+    the reward is a true division; only the chance level nTrials*nBlocks/2 is
+    an integer division (Python 2).
+
+    Input:
+        points: array (..., blocks) of points per block
+        nTrials: number of trials per block
+        nBlocks: number of blocks
+
+    Return:
+        totalReward: reward in Euros (one per participant)
+    """
+
+    y = np.sum(points, axis=-1)
+    return (y - (nTrials*nBlocks)//2)/15
+
+
+def simulateSession(manifest, set, nParticipants, nTrials=25, blockDir='blockFiles', seed=None, **params):
+    """ This function simulates the main session (economic decisions without and with perceptual uncertainty)
+
+    Input:
+        manifest: block manifest
+        set: participant specific outcome set
+        nParticipants: number of simulated participants
+        nTrials: number of trials per block
+        blockDir: directory that contains blockFiles
+        seed: seed of the random number generator
+        params: parameters of simulate
+
+    Return:
+        session: dictionary with results of both task loops ('main_safe', 'main_unc'),
+                 totalScore and totalReward per participant
+    """
+
+    from blockManifest import selectBlocks
+
+    randomState = np.random.RandomState(seed)
+    session = {'totalScore': 0, 'totalReward': 0}
+    for phase in ('main_safe', 'main_unc'):
+        blockList = selectBlocks(manifest, set, phase)
+        results = simulate(loadBlocks(blockList, blockDir), nParticipants, seed=randomState.randint(2**31), **params)
+        results['reward'] = taskReward(results['points'], nTrials, len(blockList))
+        session[phase] = results
+        session['totalScore'] = session['totalScore'] + results['points'].sum(axis=-1)
+        session['totalReward'] = session['totalReward'] + results['reward']
+    return session
@@ -0,0 +1,441 @@
+from __future__ import division
+import sys
+import os
+import time
+import timeit
+import numpy as np
+from blockCache import findBlockFiles
+
+# Benchmarks of the task infrastructure
+#
+# Run with: python benchmarks.py [name ...]
+
+
+def benchmarkXlsxReader(blockDir='blockFiles', repeats=3):
+    """ This function compares the streaming .xlsx reader with PsychoPy's importConditions
+
+    All block files of all sets and the digit-span files are read.
+
+    Input:
+        blockDir: directory that contains the set_* folders
+        repeats: number of repetitions (best time is reported)
+
+    Return:
+        results: dictionary with time per file in ms for both readers
+    """
+
+    from xlsxReader import readConditions
+
+    paths = findBlockFiles(blockDir) + [blockDir + '/digit-span/digit-span.xlsx', blockDir + '/digit-span/N_Back.xlsx']
+
+    def runReader():
+        for path in paths:
+            readConditions(path)
+
+    results = {}
+    results['readConditions'] = min(timeit.repeat(runReader, number=1, repeat=repeats)) / len(paths) * 1000
+
+    importTime = timeit.default_timer()
+    from psychopy import data
+    results['psychopy import (s)'] = timeit.default_timer() - importTime
+
+    def runImportConditions():
+        for path in paths:
+            data.importConditions(path)
+
+    results['importConditions'] = min(timeit.repeat(runImportConditions, number=1, repeat=repeats)) / len(paths) * 1000
+
+    print('xlsx reader over %d files (ms per file):' % len(paths))
+    for name in sorted(results):
+        print('    %-22s %8.3f' % (name, results[name]))
+    return results
+
+
+def benchmarkTrialRecords(blockIndex='blockFiles/set_1/main_unc/leftBlue/GB_LB_1.xlsx', whichVersion=2, repeats=200):
+    """ This function measures the per-trial setup time of exec-based unpacking and compiled trial records
+
+    The legacy path unpacks every column with exec and resolves positions and
+    response keys inside the trial; the compiled path reads attributes of
+    records that were compiled once per block.
+
+    Input:
+        blockIndex: path to pre-generated block
+        whichVersion: 1 = behavioral; 2 = fMRI
+        repeats: number of passes over the block
+
+    Return:
+        results: dictionary with setup time per trial in microseconds
+    """
+
+    from xlsxReader import readConditions
+    from trialRecords import compileTrials
+
+    conditions = readConditions(blockIndex)
+    cBal = '1'
+
+    def legacySetup():
+        for thisTrial in conditions:
+            namespace = {'thisTrial': thisTrial}
+            for paramName in thisTrial.keys():
+                exec(paramName + '= thisTrial["' + paramName + '"]', namespace)
+            targetPatch = namespace['targetPatch']
+            redFractal = namespace['redFractal']
+            corrAns = namespace['corrAns']
+            contrast = float(namespace['PU'])
+            outcomes = float(namespace['outcomes'])
+            if cBal == '1':
+                if targetPatch == 'left':
+                    patch1Pos = [-6, 0]
+                elif targetPatch == 'right':
+                    patch1Pos = [6, 0]
+            if whichVersion == 1:
+                targetPatchKey = targetPatch
+            elif whichVersion == 2:
+                if targetPatch == 'left':
+                    targetPatchKey = '3'
+                elif targetPatch == 'right':
+                    targetPatchKey = '1'
+            if redFractal == 'up':
+                fractal1Pos = [0, -4]
+            elif redFractal == 'down':
+                fractal1Pos = [0, 4]
+            if whichVersion == 1:
+                corrAnsKey = corrAns
+            elif whichVersion == 2:
+                if corrAns == 'up':
+                    corrAnsKey = '4'
+                elif corrAns == 'down':
+                    corrAnsKey = '2'
+
+    def compiledSetup():
+        records = compileTrials(conditions, whichVersion, cBal)
+        for thisTrial in records:
+            contrast = thisTrial.PU
+            outcomes = thisTrial.outcomes
+            patch1Pos = thisTrial.patch1Pos
+            fractal1Pos = thisTrial.fractal1Pos
+            targetPatchKey = thisTrial.targetPatchKey
+            corrAnsKey = thisTrial.corrAnsKey
+
+    nTrials = len(conditions) * repeats
+    results = {}
+    results['exec unpacking'] = min(timeit.repeat(legacySetup, number=repeats, repeat=3)) / nTrials * 1e6
+    results['trial records'] = min(timeit.repeat(compiledSetup, number=repeats, repeat=3)) / nTrials * 1e6
+
+    print('trial setup (us per trial, block compile included):')
+    for name in sorted(results):
+        print('    %-22s %8.3f' % (name, results[name]))
+    return results
+
+
+class SimulatedClock(object):
+    """ This class is a clock that advances by one frame period on every flip of the simulated window """
+
+    def __init__(self, window):
+        self.window = window
+        self.offset = 0.0
+
+    def reset(self):
+        self.offset = self.window.time
+
+    def getTime(self):
+        return self.window.time - self.offset
+
+    def add(self, duration):
+        self.offset = self.offset - duration
+
+
+class SimulatedCountdown(SimulatedClock):
+    """ This class is a countdown timer on the simulated window """
+
+    def getTime(self):
+        return self.offset - self.window.time
+
+    def add(self, duration):
+        self.offset = max(self.offset, self.window.time) + duration
+
+
+class SimulatedWindow(object):
+    """ This class counts flips instead of drawing (60 Hz) """
+
+    def __init__(self):
+        self.monitorFramePeriod = 1.0/60
+        self.time = 0.0
+
+    def flip(self):
+        self.time = self.time + self.monitorFramePeriod
+
+
+class SimulatedStim(object):
+    """ This class keeps the status of a stimulus like PsychoPy's autoDraw """
+
+    def __init__(self):
+        self.status = 0
+
+    def setAutoDraw(self, value):
+        self.status = 1 if value else -1
+
+
+class SimulatedKeyResponse(object):
+    """ This class mirrors event.BuilderKeyResponse """
+
+    def __init__(self, window):
+        self.status = 0
+        self.keys = []
+        self.rt = []
+        self.clock = SimulatedClock(window)
+
+
+class SimulatedEvent(object):
+    """ This class replaces psychopy.event without keyboard input """
+
+    BuilderKeyResponse = SimulatedKeyResponse
+
+    def getKeys(self, keyList=None):
+        return []
+
+    def clearEvents(self, eventType=None):
+        pass
+
+
+def benchmarkRoutineEngine(nTrials=200):
+    """ This function measures the Python time per frame of the Builder-style loop and the routine engine
+
+    The Gabor-patch routine (fixation cross, two patches, keyboard response) is
+    run on a simulated window without drawing, so that only the loop overhead is
+    measured.
+
+    Input:
+        nTrials: number of simulated trials
+
+    Return:
+        results: dictionary with time per frame in microseconds
+    """
+
+    from routineEngine import Routine, stimulus, response, runRoutine
+
+    NOT_STARTED, STARTED, FINISHED, STOPPED = (0, 1, -1, -1)
+    win = SimulatedWindow()
+    event = SimulatedEvent()
+    endExpNow = False
+    (fixCrossTiming, stimulusTiming) = (1.0, 2.0)
+    experimentStructure = {'NOT_STARTED': NOT_STARTED, 'STARTED': STARTED, 'STOPPED': STOPPED,
+                           'endExpNow': endExpNow, 'event': event, 'win': win}
+    (patch1, patch2, fixationCross) = (SimulatedStim(), SimulatedStim(), SimulatedStim())
+    patchClock = SimulatedClock(win)
+    routineTimer = SimulatedCountdown(win)
+    decision1Keys = ['3', '1']
+
+    def legacyTrial():
+        patchClock.reset()
+        frameN = -1
+        routineTimer.add(fixCrossTiming + stimulusTiming)
+        decision1 = SimulatedKeyResponse(win)
+        trialComponents = [patch1, patch2, decision1, fixationCross]
+        for thisComponent in trialComponents:
+            if hasattr(thisComponent, 'status'):
+                thisComponent.status = NOT_STARTED
+        continueRoutine = True
+        while continueRoutine and routineTimer.getTime() > 0:
+            t = patchClock.getTime()
+            frameN = frameN + 1
+            if t >= fixCrossTiming and patch1.status == NOT_STARTED:
+                patch1.tStart = t
+                patch1.frameNStart = frameN
+                patch1.setAutoDraw(True)
+            if patch1.status == STARTED and t >= (fixCrossTiming + (stimulusTiming - win.monitorFramePeriod*0.75)):
+                patch1.setAutoDraw(False)
+            if t >= fixCrossTiming and patch2.status == NOT_STARTED:
+                patch2.tStart = t
+                patch2.frameNStart = frameN
+                patch2.setAutoDraw(True)
+            if patch2.status == STARTED and t >= (fixCrossTiming + (stimulusTiming - win.monitorFramePeriod*0.75)):
+                patch2.setAutoDraw(False)
+            if t >= 0.0 and fixationCross.status == NOT_STARTED:
+                fixationCross.tStart = t
+                fixationCross.frameNStart = frameN
+                fixationCross.setAutoDraw(True)
+            if fixationCross.status == STARTED and t >= (0.0 + (fixCrossTiming + stimulusTiming - win.monitorFramePeriod*0.75)):
+                fixationCross.setAutoDraw(False)
+            if t >= fixCrossTiming and decision1.status == NOT_STARTED:
+                decision1.tStart = t
+                decision1.frameNStart = frameN
+                decision1.status = STARTED
+                decision1.clock.reset()
+                event.clearEvents(eventType='keyboard')
+            if decision1.status == STARTED and t >= (fixCrossTiming + (stimulusTiming - win.monitorFramePeriod*0.75)):
+                decision1.status = STOPPED
+            if decision1.status == STARTED:
+                theseKeys = event.getKeys(keyList=decision1Keys)
+                if len(theseKeys) > 0:
+                    decision1.keys = theseKeys[-1]
+                    decision1.rt = decision1.clock.getTime()
+            for thisComponent in trialComponents:
+                if hasattr(thisComponent, "status") and thisComponent.status != FINISHED:
+                    continueRoutine = True
+                    break
+                else:
+                    continueRoutine = False
+            if endExpNow or event.getKeys(keyList=["escape"]):
+                return
+            if continueRoutine:
+                win.flip()
+        for thisComponent in trialComponents:
+            if hasattr(thisComponent, "setAutoDraw"):
+                thisComponent.setAutoDraw(False)
+        return frameN + 1
+
+    def engineTrial():
+        decision1 = SimulatedKeyResponse(win)
+        trialRoutine = Routine(experimentStructure,
+                               [stimulus(patch1, fixCrossTiming, fixCrossTiming + stimulusTiming),
+                                stimulus(patch2, fixCrossTiming, fixCrossTiming + stimulusTiming),
+                                response(decision1, fixCrossTiming, fixCrossTiming + stimulusTiming, decision1Keys),
+                                stimulus(fixationCross, 0.0, fixCrossTiming + stimulusTiming)],
+                               fixCrossTiming + stimulusTiming)
+        return runRoutine(experimentStructure, trialRoutine, patchClock, routineTimer)
+
+    results = {}
+    for (name, runTrial) in [('builder loop', legacyTrial), ('routine engine', engineTrial)]:
+        nFrames = 0
+        startTime = timeit.default_timer()
+        for trial in range(nTrials):
+            nFrames = nFrames + runTrial()
+        results[name] = (timeit.default_timer() - startTime) / nFrames * 1e6
+
+    print('routine frame loop (us per frame, %d frames per trial):' % (nFrames // nTrials))
+    for name in sorted(results):
+        print('    %-22s %8.3f' % (name, results[name]))
+    return results
+
+
+def benchmarkGazeSampler(duration=2.0, rate=1000):
+    """ This function load-tests threaded gaze acquisition with the simulated tracker
+
+    Input:
+        duration: sampling duration in seconds
+        rate: requested sampling rate in Hz
+
+    Return:
+        results: dictionary with achieved sampling rate and time of the fixation check
+    """
+
+    from eyeTracking import GazeSampler, SimulatedTracker, fixationMiss
+
+    tracker = SimulatedTracker(rate=rate, seed=1)
+    gazeSampler = GazeSampler(tracker, timeit.default_timer, rate).start()
+    startTime = timeit.default_timer()
+    time.sleep(duration)
+    gazeSampler.stop()
+    samples = gazeSampler.since(startTime)
+
+    results = {}
+    results['achieved rate (Hz)'] = len(samples) / (samples[-1, 0] - samples[0, 0])
+    results['max interval (ms)'] = np.max(np.diff(samples[:, 0])) * 1000
+    lastSecond = samples[samples[:, 0] >= samples[-1, 0] - 1.0]
+    results['fixation check (us)'] = min(timeit.repeat(lambda: fixationMiss(lastSecond, tracker.center, 1.0, 50.0),
+                                                       number=100, repeat=3)) / 100 * 1e6
+
+    print('gaze sampler (%d Hz requested, %.1f s):' % (rate, duration))
+    for name in sorted(results):
+        print('    %-22s %8.3f' % (name, results[name]))
+    return results
+
+
+def benchmarkGaborTextures(blockIndex='blockFiles/set_1/main_unc/leftBlue/GB_LB_1.xlsx', texRes=512):
+    """ This function compares cached Gabor textures with setting the opacity of the patches per trial
+
+    Textures from a synthesized and from a cached unit row and the size of the
+    on-disk cache are always measured.
+    Per-trial setup and first-frame latency (setup, draw and flip) require
+    PsychoPy and a display and are skipped otherwise.
+
+    Input:
+        blockIndex: path to pre-generated block
+        texRes: resolution of textures
+
+    Return:
+        results: dictionary with times in milliseconds
+    """
+
+    import shutil
+    import tempfile
+    from xlsxReader import readConditions
+    from trialRecords import compileTrials
+    from gaborTextures import TextureStore, GaborCache
+
+    records = compileTrials(readConditions(blockIndex), 1, '1')
+    contrasts = [0.5 + sign*thisTrial.PU/2 for thisTrial in records for sign in (1, -1)]
+    cacheDir = tempfile.mkdtemp()
+    results = {}
+    try:
+        startTime = timeit.default_timer()
+        store = TextureStore(0.4, 10, texRes, cacheDir)
+        for contrast in contrasts:
+            store.get(contrast)
+        results['texture (new row)'] = (timeit.default_timer() - startTime) / len(contrasts) * 1e3
+        startTime = timeit.default_timer()
+        store = TextureStore(0.4, 10, texRes, cacheDir)
+        for contrast in contrasts:
+            store.get(contrast)
+        results['texture (row on disk)'] = (timeit.default_timer() - startTime) / len(contrasts) * 1e3
+        results['disk cache (kB)'] = sum(os.path.getsize(os.path.join(cacheDir, f)) for f in os.listdir(cacheDir)) / 1e3
+
+        try:
+            from psychopy import visual
+            from initializeComponents import initializePatches
+        except ImportError:
+            print('PsychoPy not available: per-trial setup and first-frame latency are skipped')
+            visual = None
+        if visual is not None:
+            win = visual.Window(size=(800, 600), fullscr=False, units='deg', colorSpace='rgb')
+            (patchClock, patch1, patch2) = initializePatches(win, {'frameRate': 60})
+            gaborCache = GaborCache(win, texRes=texRes, cacheDir=cacheDir)
+            gaborCache.prepareBlock(records)
+
+            def opacitySetup(thisTrial):
+                patch1.setPos(thisTrial.patch1Pos)
+                patch2.setPos(thisTrial.patch2Pos)
+                patch1.setOpacity(0.5 + thisTrial.PU/2)
+                patch2.setOpacity(0.5 - thisTrial.PU/2)
+                return patch1, patch2
+
+            def cacheSetup(thisTrial):
+                (cachedPatch1, cachedPatch2) = gaborCache.patchPair(thisTrial.PU)
+                cachedPatch1.setPos(thisTrial.patch1Pos)
+                cachedPatch2.setPos(thisTrial.patch2Pos)
+                return cachedPatch1, cachedPatch2
+
+            for (name, setup) in (('opacity', opacitySetup), ('texture cache', cacheSetup)):
+                setupTimes = []
+                frameTimes = []
+                for thisTrial in records:
+                    win.flip()
+                    startTime = timeit.default_timer()
+                    patches = setup(thisTrial)
+                    setupTimes.append(timeit.default_timer() - startTime)
+                    for patch in patches:
+                        patch.draw()
+                    win.flip()
+                    frameTimes.append(timeit.default_timer() - startTime)
+                results[name + ' setup'] = np.median(setupTimes) * 1e3
+                results[name + ' first frame'] = np.median(frameTimes) * 1e3
+            win.close()
+    finally:
+        shutil.rmtree(cacheDir)
+
+    print('Gabor textures (ms, %d trials, texRes %d):' % (len(records), texRes))
+    for name in sorted(results):
+        print('    %-22s %8.3f' % (name, results[name]))
+    return results
+
+
+benchmarks = {'xlsxReader': benchmarkXlsxReader, 'trialRecords': benchmarkTrialRecords,
+              'routineEngine': benchmarkRoutineEngine, 'gazeSampler': benchmarkGazeSampler,
+              'gaborTextures': benchmarkGaborTextures}
+
+if __name__ == '__main__':
+
+    names = sys.argv[1:] if len(sys.argv) > 1 else sorted(benchmarks)
+    for name in names:
+        benchmarks[name]()
@@ -0,0 +1,351 @@
+from __future__ import division
+import os
+import json
+import hashlib
+import numpy as np
+from xlsxReader import readConditions
+
+# Compact binary cache of the pre-generated block files
+#
+# All .xlsx workbooks under blockFiles/set_* are compiled once into a single
+# NumPy structured array (blocks.npy) plus an index (blocks.json) that stores
+# offset, number of rows, mtime and hash of every source workbook. At runtime
+# the array is memory-mapped and each block is returned as a zero-copy slice.
+# Trial records are compiled from the columns of the slice; only the trial
+# list of the PsychoPy TrialHandler is converted into one dictionary per trial.
+
+blockDtype = np.dtype([('PU', 'f8'), ('targetPatch', 'U5'), ('redFractal', 'U4'),
+                       ('corrAns', 'U4'), ('outcomes', 'i1')])
+
+
+def hashFile(path):
+    """ This function computes the content hash of a block file
+
+    Input:
+        path: path to block file
+
+    Return:
+        hexdigest: sha1 hash of the file content
+    """
+
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        sha1.update(f.read())
+    return sha1.hexdigest()
+
+
+def blockKey(blockIndex, baseDir):
+    """ This function converts a path to a block file into a cache key
+
+    Keys are relative to the task directory and always use forward slashes,
+    so that paths returned by glob on Windows find the same entry.
+
+    Input:
+        blockIndex: path to pre-generated block
+        baseDir: directory that contains blockFiles
+
+    Return:
+        key: normalized block key
+    """
+
+    key = os.path.relpath(os.path.abspath(blockIndex), baseDir)
+    return key.replace(os.sep, '/')
+
+
+def findBlockFiles(blockDir):
+    """ This function lists all block files of all participant sets
+
+    Input:
+        blockDir: directory that contains the set_* folders
+
+    Return:
+        blockFiles: sorted list of paths to .xlsx block files
+    """
+
+    blockFiles = []
+    for setName in os.listdir(blockDir):
+        if not setName.startswith('set_'):
+            continue
+        for root, dirs, files in os.walk(os.path.join(blockDir, setName)):
+            for fileName in files:
+                if fileName.endswith('.xlsx') and not fileName.startswith('~$'):
+                    blockFiles.append(os.path.join(root, fileName))
+    return sorted(blockFiles)
+
+
+def conditionsToArray(conditions):
+    """ This function converts the rows of a block file into a structured array
+
+    Input:
+        conditions: list of dictionaries (one per trial) as returned by readConditions
+
+    Return:
+        block: structured array with blockDtype
+    """
+
+    block = np.zeros(len(conditions), dtype=blockDtype)
+    for i, thisTrial in enumerate(conditions):
+        block[i] = (float(thisTrial['PU']), str(thisTrial['targetPatch']), str(thisTrial['redFractal']),
+                    str(thisTrial['corrAns']), int(float(thisTrial['outcomes'])))
+    return block
+
+
+def compileBlockCache(blockDir='blockFiles', cacheDir=None):
+    """ This function compiles all block files into the binary block cache
+
+    Input:
+        blockDir: directory that contains the set_* folders
+        cacheDir: directory of the cache (default: blockDir/cache)
+
+    Return:
+        index: dictionary with offset, nRows, mtime and sha1 of every block
+    """
+
+    if cacheDir is None:
+        cacheDir = os.path.join(blockDir, 'cache')
+    baseDir = os.path.dirname(os.path.abspath(blockDir))
+
+    blocks = []
+    index = {}
+    offset = 0
+    for path in findBlockFiles(blockDir):
+        block = conditionsToArray(readConditions(path))
+        index[blockKey(path, baseDir)] = {'offset': offset, 'nRows': len(block),
+                                          'mtime': os.path.getmtime(path), 'sha1': hashFile(path)}
+        blocks.append(block)
+        offset = offset + len(block)
+
+    writeBlockCache(cacheDir, blocks, index)
+    return index
+
+
+def writeBlockCache(cacheDir, blocks, index):
+    """ This function writes blocks and index in the block cache format
+
+    Input:
+        cacheDir: directory of the cache
+        blocks: list of structured arrays with blockDtype (in index order)
+        index: dictionary with offset and nRows of every block
+
+    Return: ~
+    """
+
+    if not os.path.isdir(cacheDir):
+        os.makedirs(cacheDir)
+    if len(blocks) > 0:
+        allBlocks = np.concatenate(blocks)
+    else:
+        allBlocks = np.zeros(0, dtype=blockDtype)
+
+    # Write array first so that an index never points to a missing array. Both files are written
+    # to temporary files and renamed, because other processes may have the array memory-mapped
+    # (truncating a mapped file can crash them).
+    temporaryFile = os.path.join(cacheDir, 'blocks.%d.tmp.npy' % os.getpid())
+    np.save(temporaryFile, allBlocks)
+    replaceFile(temporaryFile, os.path.join(cacheDir, 'blocks.npy'))
+    writeIndex(os.path.join(cacheDir, 'blocks.json'), index)
+
+
+def writeIndex(indexFile, index):
+    """ This function writes the cache index (temporary file and rename)
+
+    Input:
+        indexFile: path of the index
+        index: cache index
+
+    Return: ~
+    """
+
+    temporaryFile = '%s.%d.tmp' % (indexFile, os.getpid())
+    with open(temporaryFile, 'w') as f:
+        json.dump(index, f)
+    replaceFile(temporaryFile, indexFile)
+
+
+def replaceFile(source, destination):
+    """ This function renames a file and replaces an existing destination
+
+    Input:
+        source: path of new file
+        destination: path of file that is replaced
+
+    Return: ~
+    """
+
+    if hasattr(os, 'replace'):
+        os.replace(source, destination)
+    else:
+        # Python 2: os.rename replaces existing files only on POSIX
+        if os.name == 'nt' and os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
+
+
+def cacheIsStale(index, blockDir, baseDir):
+    """ This function checks whether the block cache has to be rebuilt
+
+    Files whose mtime changed are hashed; the cache is only stale if the
+    content changed or if block files were added or removed. Entries that
+    only have a new mtime are updated in place.
+
+    Input:
+        index: cache index
+        blockDir: directory that contains the set_* folders
+        baseDir: directory that contains blockFiles
+
+    Return:
+        stale: indicates if cache has to be rebuilt
+        touched: indicates if mtimes in the index have been updated
+    """
+
+    touched = False
+    seen = set()
+    for path in findBlockFiles(blockDir):
+        key = blockKey(path, baseDir)
+        seen.add(key)
+        if key not in index:
+            return True, touched
+        mtime = os.path.getmtime(path)
+        if mtime != index[key]['mtime']:
+            if hashFile(path) != index[key]['sha1']:
+                return True, touched
+            index[key]['mtime'] = mtime
+            touched = True
+    return len(seen) != len(index), touched
+
+
+class BlockCache(object):
+    """ This class provides zero-copy access to the compiled block files
+
+    Input:
+        blocks: memory-mapped structured array of all blocks
+        index: cache index
+        baseDir: directory that contains blockFiles
+    """
+
+    def __init__(self, blocks, index, baseDir):
+        self.blocks = blocks
+        self.index = index
+        self.baseDir = baseDir
+
+    def __contains__(self, blockIndex):
+        return blockKey(blockIndex, self.baseDir) in self.index
+
+    def getBlock(self, blockIndex):
+        """ This function returns a block as a view into the memory-mapped cache
+
+        Input:
+            blockIndex: path to pre-generated block
+
+        Return:
+            block: structured array slice (no copy)
+        """
+
+        entry = self.index[blockKey(blockIndex, self.baseDir)]
+        return self.blocks[entry['offset']:entry['offset'] + entry['nRows']]
+
+    def getConditions(self, blockIndex):
+        """ This function returns a block as trial list for the PsychoPy TrialHandler
+
+        Input:
+            blockIndex: path to pre-generated block
+
+        Return:
+            conditions: list of dictionaries (one per trial)
+        """
+
+        return blockConditions(self.getBlock(blockIndex))
+
+
+def blockConditions(block):
+    """ This function returns the trial list of a block for the PsychoPy TrialHandler
+
+    The TrialHandler records the parameters of every trial in the data file
+    and therefore needs one dictionary per trial. Cached blocks are converted
+    here; trial lists that were read from a block file are returned as they are.
+
+    Input:
+        block: structured array with blockDtype or list of dictionaries
+
+    Return:
+        conditions: list of dictionaries (one per trial)
+    """
+
+    if isinstance(block, np.ndarray):
+        names = block.dtype.names
+        return [dict(zip(names, row)) for row in block.tolist()]
+    return block
+
+
+def openBlockCache(blockDir='blockFiles', cacheDir=None):
+    """ This function opens the block cache and rebuilds it if block files changed
+
+    Input:
+        blockDir: directory that contains the set_* folders
+        cacheDir: directory of the cache (default: blockDir/cache)
+
+    Return:
+        blockCache: block cache object instance
+    """
+
+    if cacheDir is None:
+        cacheDir = os.path.join(blockDir, 'cache')
+    baseDir = os.path.dirname(os.path.abspath(blockDir))
+    indexFile = os.path.join(cacheDir, 'blocks.json')
+    arrayFile = os.path.join(cacheDir, 'blocks.npy')
+
+    if os.path.isfile(indexFile) and os.path.isfile(arrayFile):
+        with open(indexFile) as f:
+            index = json.load(f)
+        (stale, touched) = cacheIsStale(index, blockDir, baseDir)
+        if stale:
+            compileBlockCache(blockDir, cacheDir)
+        elif touched:
+            writeIndex(indexFile, index)
+    else:
+        compileBlockCache(blockDir, cacheDir)
+
+    return loadBlockCache(cacheDir, baseDir)
+
+
+def loadBlockCache(cacheDir, baseDir='.'):
+    """ This function memory-maps a block cache without checking source files
+
+    Used for caches of generated sets that have no .xlsx files.
+
+    Input:
+        cacheDir: directory of the cache
+        baseDir: directory that block keys are relative to
+
+    Return:
+        blockCache: block cache object instance
+    """
+
+    with open(os.path.join(cacheDir, 'blocks.json')) as f:
+        index = json.load(f)
+    blocks = np.load(os.path.join(cacheDir, 'blocks.npy'), mmap_mode='r')
+    return BlockCache(blocks, index, os.path.abspath(baseDir))
+
+
+def importBlock(experimentStructure, data, blockIndex):
+    """ This function returns a block (cached if possible)
+
+    Cached blocks are returned as zero-copy slices of the memory-mapped cache,
+    which compileTrials reads column by column. Use blockConditions to get the
+    trial list of the TrialHandler.
+
+    Input:
+        experimentStructure: all general experimental properties
+        data: PsychoPy data functions
+        blockIndex: path to pre-generated block
+
+    Return:
+        block: structured array with blockDtype (cached) or list of dictionaries (one per trial)
+    """
+
+    blockCache = experimentStructure.get('blockCache')
+    if blockCache is not None and blockIndex in blockCache:
+        return blockCache.getBlock(blockIndex)
+    if blockIndex.endswith('.xlsx'):
+        return readConditions(blockIndex)
+    return data.importConditions(blockIndex)
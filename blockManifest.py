@@ -0,0 +1,336 @@
+from __future__ import division
+import os
+import sys
+import json
+from multiprocessing import Pool
+from blockCache import hashFile, blockKey, findBlockFiles
+from xlsxReader import readConditions
+
+# Manifest of all pre-generated block files
+#
+# The manifest records for every block of every set the number of rows,
+# the column dtypes, a content hash and the condition labels. Sessions
+# select their blocks through dictionary lookups and check the whole set
+# at startup. When the manifest is loaded, entries of block files whose mtime
+# or size changed are described again (as in blockCache.py, a new mtime with
+# the same content hash only updates the entry); added and removed block files
+# are added to and removed from the manifest.
+#
+# Building the manifest with a process pool should be done from the command
+# line (python blockManifest.py), because on Windows every worker process
+# re-imports the main script.
+
+expectedColumns = ['PU', 'targetPatch', 'redFractal', 'corrAns', 'outcomes']
+
+
+def columnType(values):
+    """ This function infers the dtype of a block file column
+
+    Input:
+        values: list of cell values
+
+    Return:
+        dtype: 'int', 'float' or 'str'
+    """
+
+    try:
+        numbers = [float(x) for x in values]
+    except (TypeError, ValueError):
+        return 'str'
+    if all(x == int(x) for x in numbers):
+        return 'int'
+    return 'float'
+
+
+def blockLabels(key):
+    """ This function derives the condition labels from the path of a block file
+
+    Input:
+        key: normalized block key (e.g. blockFiles/set_1/main_unc/leftBlue/GB_LB_1.xlsx)
+
+    Return:
+        labels: dictionary with set, phase, condition and contingency
+    """
+
+    parts = key.split('/')
+    setPart = [x for x in parts if x.startswith('set_')][0]
+    phase = parts[parts.index(setPart) + 1]
+    if phase.endswith('_safe'):
+        condition = 'safe'
+    elif phase.endswith('_unc'):
+        condition = 'unc'
+    else:
+        condition = 'PD'
+    if 'leftBlue' in parts:
+        contingency = 'leftBlue'
+    elif 'rightBlue' in parts:
+        contingency = 'rightBlue'
+    else:
+        contingency = None
+    return {'set': int(setPart.split('_')[1]), 'phase': phase, 'condition': condition,
+            'contingency': contingency}
+
+
+def describeBlock(path, baseDir):
+    """ This function summarizes a single block file
+
+    Input:
+        path: path to block file
+        baseDir: directory that contains blockFiles
+
+    Return:
+        key: normalized block key
+        entry: dictionary with labels, nRows, columns, sha1, mtime and size
+    """
+
+    conditions = readConditions(path)
+    if len(conditions) > 0:
+        names = list(conditions[0].keys())
+    else:
+        names = []
+    key = blockKey(path, baseDir)
+    entry = blockLabels(key)
+    entry['nRows'] = len(conditions)
+    entry['columns'] = dict((name, columnType([x[name] for x in conditions])) for name in names)
+    entry['sha1'] = hashFile(path)
+    entry['mtime'] = os.path.getmtime(path)
+    entry['size'] = os.path.getsize(path)
+    return key, entry
+
+
+def describeSet(args):
+    """ This function summarizes all block files of a set (process pool worker)
+
+    Input:
+        args: tuple of set directory and base directory
+
+    Return:
+        entries: list of (key, entry) tuples
+    """
+
+    (setDir, baseDir) = args
+    entries = []
+    for root, dirs, files in os.walk(setDir):
+        for fileName in sorted(files):
+            if fileName.endswith('.xlsx') and not fileName.startswith('~$'):
+                entries.append(describeBlock(os.path.join(root, fileName), baseDir))
+    return entries
+
+
+def buildManifest(blockDir='blockFiles', manifestFile=None, nProcesses=None):
+    """ This function builds the manifest of all block files
+
+    Input:
+        blockDir: directory that contains the set_* folders
+        manifestFile: path of the manifest (default: blockDir/manifest.json)
+        nProcesses: number of worker processes (None: all cores; 1: no pool)
+
+    Return:
+        manifest: dictionary with blocks (key -> entry) and sets (set -> phase -> contingency -> keys)
+    """
+
+    if manifestFile is None:
+        manifestFile = os.path.join(blockDir, 'manifest.json')
+    baseDir = os.path.dirname(os.path.abspath(blockDir))
+    setDirs = [(os.path.join(blockDir, x), baseDir) for x in sorted(os.listdir(blockDir)) if x.startswith('set_')]
+
+    if nProcesses == 1:
+        results = [describeSet(x) for x in setDirs]
+    else:
+        pool = Pool(nProcesses)
+        try:
+            results = pool.map(describeSet, setDirs)
+        finally:
+            pool.close()
+            pool.join()
+
+    blocks = {}
+    for entries in results:
+        for (key, entry) in entries:
+            blocks[key] = entry
+    manifest = {'blocks': blocks, 'sets': indexSets(blocks)}
+    writeManifest(manifest, manifestFile)
+    return manifest
+
+
+def writeManifest(manifest, manifestFile):
+    """ This function writes the manifest
+
+    Input:
+        manifest: block manifest
+        manifestFile: path of the manifest
+
+    Return: ~
+    """
+
+    with open(manifestFile, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def indexSets(blocks):
+    """ This function creates the lookup table set -> phase -> contingency -> blocks
+
+    Input:
+        blocks: dictionary of manifest entries
+
+    Return:
+        sets: nested dictionary with sorted lists of block keys
+    """
+
+    sets = {}
+    for key in sorted(blocks):
+        entry = blocks[key]
+        phases = sets.setdefault(str(entry['set']), {})
+        contingencies = phases.setdefault(entry['phase'], {})
+        contingencies.setdefault(str(entry['contingency']), []).append(key)
+    return sets
+
+
+def updateManifest(manifest, blockDir):
+    """ This function updates the entries of changed, added and removed block files
+
+    Files whose mtime or size changed are hashed; only files with new content
+    are read again. Entries that only have a new mtime are updated in place.
+
+    Input:
+        manifest: block manifest
+        blockDir: directory that contains the set_* folders
+
+    Return:
+        changed: indicates if the manifest has been updated
+    """
+
+    baseDir = os.path.dirname(os.path.abspath(blockDir))
+    blocks = manifest['blocks']
+    changed = False
+    seen = set()
+    for path in findBlockFiles(blockDir):
+        key = blockKey(path, baseDir)
+        seen.add(key)
+        entry = blocks.get(key)
+        mtime = os.path.getmtime(path)
+        size = os.path.getsize(path)
+        if entry is not None and entry['mtime'] == mtime and entry.get('size') == size:
+            continue
+        if entry is not None and entry.get('size') == size and hashFile(path) == entry['sha1']:
+            entry['mtime'] = mtime
+        else:
+            (key, blocks[key]) = describeBlock(path, baseDir)
+        changed = True
+    for key in [x for x in blocks if x not in seen]:
+        del blocks[key]
+        changed = True
+    if changed:
+        manifest['sets'] = indexSets(blocks)
+    return changed
+
+
+def loadManifest(blockDir='blockFiles', manifestFile=None):
+    """ This function loads the manifest and builds (without pool) or updates it if necessary
+
+    Input:
+        blockDir: directory that contains the set_* folders
+        manifestFile: path of the manifest (default: blockDir/manifest.json)
+
+    Return:
+        manifest: block manifest
+    """
+
+    if manifestFile is None:
+        manifestFile = os.path.join(blockDir, 'manifest.json')
+    if not os.path.isfile(manifestFile):
+        return buildManifest(blockDir, manifestFile, nProcesses=1)
+    with open(manifestFile) as f:
+        manifest = json.load(f)
+    if updateManifest(manifest, blockDir):
+        writeManifest(manifest, manifestFile)
+    return manifest
+
+
+def selectBlocks(manifest, set, phase, contingency=None):
+    """ This function returns the block files of a set and task phase
+
+    Input:
+        manifest: block manifest
+        set: participant specific outcome set
+        phase: task phase (e.g. main_safe, main_unc, pract_PD)
+        contingency: leftBlue, rightBlue or None for all blocks of the phase
+
+    Return:
+        blockList: list of paths to block files
+    """
+
+    contingencies = manifest['sets'][str(set)][phase]
+    if contingency is not None:
+        return list(contingencies[contingency])
+    blockList = []
+    for name in sorted(contingencies):
+        blockList.extend(contingencies[name])
+    return blockList
+
+
+def checkSet(manifest, set, session, nTrials, nTrialsPatches, nBlocksSafe, nBlocksUnc):
+    """ This function checks that all blocks required by a session exist and are valid
+
+    Missing files, changed files and blocks with an unexpected number of rows or
+    columns are collected and reported at once before the session starts.
+
+    Input:
+        manifest: block manifest
+        set: participant specific outcome set
+        session: 1 = practice; 2 = main condition; 3 = digit-span
+        nTrials: number of trials per bandit block
+        nTrialsPatches: number of trials per perceptual decision block
+        nBlocksSafe: number of blocks in safe condition
+        nBlocksUnc: number of blocks in uncertainty condition
+
+    Return: ~
+    """
+
+    if session == 1:
+        required = {'pract_PD': None, 'pract_safe': None, 'pract_unc': None}
+    elif session == 2:
+        required = {'main_safe': nBlocksSafe, 'main_PD': None, 'main_unc': nBlocksUnc}
+    else:
+        return
+
+    problems = []
+    if str(set) not in manifest['sets']:
+        raise ValueError('Block set %s is not in the block manifest' % set)
+    phases = manifest['sets'][str(set)]
+    for phase in sorted(required):
+        if phase not in phases:
+            problems.append('%s: missing' % phase)
+            continue
+        blockList = selectBlocks(manifest, set, phase)
+        if required[phase] is not None and len(blockList) < required[phase]:
+            problems.append('%s: %d blocks, %d required' % (phase, len(blockList), required[phase]))
+        for key in blockList:
+            entry = manifest['blocks'][key]
+            if not os.path.isfile(key):
+                problems.append('%s: file missing' % key)
+                continue
+            if os.path.getmtime(key) != entry['mtime'] and hashFile(key) != entry['sha1']:
+                problems.append('%s: file changed since manifest was built' % key)
+            missingColumns = [x for x in expectedColumns if x not in entry['columns']]
+            if len(missingColumns) > 0:
+                problems.append('%s: missing columns %s' % (key, ', '.join(missingColumns)))
+            if entry['condition'] == 'PD':
+                if entry['nRows'] < nTrialsPatches:
+                    problems.append('%s: %d rows, %d required' % (key, entry['nRows'], nTrialsPatches))
+            elif entry['nRows'] != nTrials:
+                problems.append('%s: %d rows, %d expected' % (key, entry['nRows'], nTrials))
+
+    if len(problems) > 0:
+        raise ValueError('Invalid block files for set %s:\n%s' % (set, '\n'.join(problems)))
+
+
+if __name__ == '__main__':
+
+    # Build manifest of all sets in parallel
+    if len(sys.argv) > 1:
+        blockDir = sys.argv[1]
+    else:
+        blockDir = 'blockFiles'
+    manifest = buildManifest(blockDir)
+    print('%d blocks in %d sets' % (len(manifest['blocks']), len(manifest['sets'])))
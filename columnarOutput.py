@@ -0,0 +1,278 @@
+from __future__ import division
+import os
+import json
+import numpy as np
+
+# Typed columnar output of the task data
+#
+# The rows of the experiment handler (or of the streamed trial log) are stored
+# as typed columns in a directory. Numeric columns get a fixed dtype (bool,
+# smallest integer type or float64 with NaN for missing values; decimal numbers
+# that were stored as text, e.g. contrast, are parsed). All other columns (keys,
+# loop names, block paths, ...) are categorical: integer codes plus a list of
+# categories, with code -1 for missing values. The columns are written in
+# compressed chunks of rows (chunk_0000.npz, ...) and described in meta.json.
+#
+# The reader does not need PsychoPy. On first access the chunks are expanded
+# once into one .npy file per column, which is then memory-mapped.
+
+formatVersion = 1
+
+try:
+    textTypes = (str, unicode)  # Python 2
+except NameError:
+    textTypes = (str,)
+
+
+def isMissing(value):
+    """ This function indicates if a data value is missing (None, empty string or NaN) """
+
+    if value is None or (isinstance(value, textTypes) and value == ''):
+        return True
+    return isinstance(value, float) and value != value
+
+
+def numericValue(value):
+    """ This function converts a data value to a number
+
+    Input:
+        value: data value
+
+    Return:
+        number: bool, int or float (None if the value is not numeric)
+    """
+
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return float(value)
+    if isinstance(value, textTypes):
+        if value.strip().lstrip('+-').isdigit():
+            return None  # integer text (IDs, digit sequences) stays categorical
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+def categoryValue(value):
+    """ This function converts a data value to the text of its category (lists are json-encoded) """
+
+    if isinstance(value, textTypes):
+        return value
+    if isinstance(value, (list, tuple, dict)):
+        return json.dumps(value, default=str, sort_keys=True)
+    return str(value)
+
+
+def smallestType(values, types):
+    """ This function returns the first integer dtype that holds all values
+
+    Input:
+        values: list of integers
+        types: candidate dtypes in increasing size
+
+    Return:
+        dtype: numpy dtype
+    """
+
+    low = min(values) if len(values) > 0 else 0
+    high = max(values) if len(values) > 0 else 0
+    for dtype in types:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(types[-1])
+
+
+def encodeColumn(values):
+    """ This function converts the values of a column into a typed array
+
+    Input:
+        values: list of data values (one per row)
+
+    Return:
+        array: typed values (codes for categorical columns)
+        categories: list of categories (None for numeric columns)
+    """
+
+    present = [x for x in values if not isMissing(x)]
+    numbers = [numericValue(x) for x in present]
+    if all(x is not None for x in numbers):
+        if len(present) == len(values) and all(isinstance(x, bool) for x in numbers) and len(numbers) > 0:
+            return np.array(numbers, dtype=bool), None
+        if len(present) == len(values) and all(isinstance(x, int) for x in numbers):
+            return np.array(numbers, dtype=smallestType(numbers, (np.int8, np.int16, np.int32, np.int64))), None
+        array = np.full(len(values), np.nan)
+        array[[i for i, x in enumerate(values) if not isMissing(x)]] = numbers
+        return array, None
+
+    texts = [None if isMissing(x) else categoryValue(x) for x in values]
+    categories = sorted(set(x for x in texts if x is not None))
+    index = dict((x, i) for i, x in enumerate(categories))
+    codes = [-1 if x is None else index[x] for x in texts]
+    return np.array(codes, dtype=smallestType([-1, len(categories)], (np.int8, np.int16, np.int32))), categories
+
+
+def writeColumns(path, rows, chunkRows=4096):
+    """ This function writes data rows as typed columns in compressed chunks
+
+    Input:
+        path: output directory
+        rows: list of dictionaries of data columns (e.g. thisExp.entries)
+        chunkRows: number of rows per chunk
+
+    Return:
+        meta: dictionary with number of rows, chunks and column descriptions
+    """
+
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    names = []
+    for row in rows:
+        for name in row:
+            if name not in names:
+                names.append(name)
+
+    columns = []
+    arrays = []
+    for i, name in enumerate(names):
+        (array, categories) = encodeColumn([row.get(name) for row in rows])
+        columns.append({'name': name, 'file': 'c%04d' % i, 'dtype': array.dtype.str, 'categories': categories})
+        arrays.append(array)
+
+    chunks = []
+    for start in range(0, max(len(rows), 1), chunkRows):
+        chunkFile = 'chunk_%04d.npz' % len(chunks)
+        np.savez_compressed(os.path.join(path, chunkFile),
+                            **dict((column['file'], array[start:start + chunkRows]) for column, array in zip(columns, arrays)))
+        chunks.append({'file': chunkFile, 'nRows': min(chunkRows, len(rows) - start)})
+
+    meta = {'version': formatVersion, 'nRows': len(rows), 'chunks': chunks, 'columns': columns}
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=1)
+    return meta
+
+
+def writeTrialLogColumns(logPath, path, chunkRows=4096):
+    """ This function converts a streamed trial log into typed columns (checkpoint rows are skipped)
+
+    Input:
+        logPath: path of trial log
+        path: output directory
+        chunkRows: number of rows per chunk
+
+    Return:
+        meta: dictionary with number of rows, chunks and column descriptions
+    """
+
+    from trialLog import readTrialLog
+    rows = [row for row in readTrialLog(logPath) if 'checkpoint' not in row and 'resumed' not in row]
+    return writeColumns(path, rows, chunkRows)
+
+
+class ColumnTable(object):
+    """ This class gives memory-mapped access to the columns of a columnar output
+
+    Input:
+        path: directory of columnar output
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            self.meta = json.load(f)
+        self.nRows = self.meta['nRows']
+        self.columns = dict((column['name'], column) for column in self.meta['columns'])
+        self.names = [column['name'] for column in self.meta['columns']]
+        self.expanded = {}
+
+    def __len__(self):
+        return self.nRows
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def expand(self, column):
+        """ This function writes the chunks of a column into one .npy file (once)
+
+        Input:
+            column: column description
+
+        Return:
+            columnPath: path of .npy file
+        """
+
+        columnPath = os.path.join(self.path, column['file'] + '.npy')
+        if not os.path.exists(columnPath):
+            parts = []
+            for chunk in self.meta['chunks']:
+                with np.load(os.path.join(self.path, chunk['file'])) as chunkData:
+                    parts.append(chunkData[column['file']])
+            temporaryPath = columnPath + '.%d.tmp.npy' % os.getpid()
+            np.save(temporaryPath, np.concatenate(parts).astype(column['dtype']))
+            os.rename(temporaryPath, columnPath)  # readers never see partial files
+        return columnPath
+
+    def __getitem__(self, name):
+        """ This function returns a column as memory-mapped array (codes for categorical columns)
+
+        Input:
+            name: column name
+
+        Return:
+            array: read-only memory-mapped array
+        """
+
+        if name not in self.expanded:
+            self.expanded[name] = np.load(self.expand(self.columns[name]), mmap_mode='r')
+        return self.expanded[name]
+
+    def categories(self, name):
+        """ This function returns the categories of a categorical column (None for numeric columns) """
+
+        return self.columns[name]['categories']
+
+    def decode(self, name):
+        """ This function returns the values of a column (categorical columns as object array, None = missing)
+
+        Input:
+            name: column name
+
+        Return:
+            values: numpy array
+        """
+
+        categories = self.categories(name)
+        if categories is None:
+            return np.asarray(self[name])
+        lookup = np.array(list(categories) + [None], dtype=object)
+        return lookup[np.asarray(self[name])]  # code -1 selects the last entry (None)
+
+    def toDict(self, names=None):
+        """ This function returns decoded columns
+
+        Input:
+            names: column names (None = all)
+
+        Return:
+            columns: dictionary (name -> values)
+        """
+
+        return dict((name, self.decode(name)) for name in (names or self.names))
+
+
+def openColumns(path):
+    """ This function opens a columnar output for reading (PsychoPy is not required)
+
+    Input:
+        path: directory of columnar output
+
+    Return:
+        table: ColumnTable instance
+    """
+
+    return ColumnTable(path)
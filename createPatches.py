@@ -1,24 +1,24 @@
 import numpy as np
-from psychopy import core
-import random
+from routineEngine import Routine, stimulus, response, runRoutine
+from eyeTracking import fixationMiss
 
 
-def createPatches(experimentStructure, stimuliStructure, patchClock, targetPatch,
-trials, whichLoop, thisDifference, contrast, routineTimer, globalClock, tracker):
+def createPatches(experimentStructure, stimuliStructure, patchClock, thisTrial,
+trials, whichLoop, thisDifference, routineTimer, globalClock, tracker, performance):
     """ This function creates the Gabor-patches
     
     Input:
         experimentStructure: all general experimental properties 
         stimuliStructure: all general stimulus properties
         patchClock: clock object instance for patch timing
-        targetPatch: position of the patch that should be identified (from xls block files)
+        thisTrial: compiled trial record (from xls block files)
         trials: trial handler Psychopy object instance
         whichLoop: indicates required task phase
         thisDifference: Not used anymore 
-        contrast: presented contrast difference (from xls block files)
         routineTimer: timer to control presentation times
         globalClock: clock to control timing during fMRI
         tracker: eye-tracker object instance
+        performance: running performance of current block
         
     Return:
         decision1: decision1 object instance
@@ -32,92 +32,56 @@ trials, whichLoop, thisDifference, contrast, routineTimer, globalClock, tracker)
 
     # Create some shortnames
     expInfo         = experimentStructure['expInfo']
-    cBal            = expInfo['cBal']
     globalClock     = experimentStructure['globalClock']
-    NOT_STARTED     = experimentStructure['NOT_STARTED']
-    STARTED         = experimentStructure['STARTED']
-    FINISHED        = experimentStructure['FINISHED']
-    STOPPED         = experimentStructure['STOPPED']
-    event           = experimentStructure['event']
-    whichVersion    = experimentStructure['whichVersion']
     patch1          = stimuliStructure['patch1']
     patch2          = stimuliStructure['patch2']
-    endExpNow       = experimentStructure['endExpNow']
     event           = experimentStructure['event']
     win             = experimentStructure['win']
     useEyeTracker   = experimentStructure['useEyeTracker']
     fixationCross   = stimuliStructure['fixationCross']
     fixCrossTiming  = stimuliStructure['fixCrossTiming']
-    jitter          = stimuliStructure['jitter']
     stimulusTiming  = stimuliStructure['stimulusTiming']
-    
+    decision1Keys   = experimentStructure['decision1Keys']
+    contrast        = thisTrial.PU
+    targetPatchKey  = thisTrial.targetPatchKey
 
     #------Prepare to start Routine "trial"-------
-    t = 0
-    patchClock.reset()  # clock 
-    frameN = -1
-    
-    # Draw jitter for current trial
-    currentJitter = random.uniform(0,jitter)
+    # Jitter of current trial was drawn when the block was loaded
+    currentJitter = thisTrial.patchJitter
     fixCrossTiming = fixCrossTiming + currentJitter
     
-    # Routine timer for presentation timing
-    routineTimer.add(fixCrossTiming + stimulusTiming)
-    
     # Set mean opacity of patches
     meanOpacity = 0.5
     
-    contrast = float(contrast)
-    if cBal == '1':
-        if targetPatch == 'left':
-            patch1.setPos([-6,0])
-            patch2.setPos([6,0])
-        elif targetPatch == 'right':
-            patch1.setPos([6,0])
-            patch2.setPos([-6,0])
-    elif cBal == '2':
-        if targetPatch == 'left':
-            patch1.setPos([6,0])
-            patch2.setPos([-6,0])
-        elif targetPatch == 'right':
-            patch1.setPos([-6,0])
-            patch2.setPos([6,0])
-            
-    # Get correct keys 
-    if whichVersion == 1:
-        targetPatchKey   = targetPatch
-    elif whichVersion == 2:
-        if targetPatch == 'left':
-            targetPatchKey = '3'
-        elif targetPatch == 'right':
-            targetPatchKey = '1'
-            
-    # Compute delta contrast and state
-    if targetPatch == 'left':
-        deltaContrast = contrast*-1
-        state         = 0
-    elif targetPatch == 'right':
-        deltaContrast = contrast
-        state         = 1
+    # Prebuilt patches with baked-in opacity (if texture cache is used)
+    gaborCache = stimuliStructure.get('gaborCache')
+    if gaborCache is not None:
+        (patch1, patch2) = gaborCache.patchPair(contrast)
+    
+    # Positions, keys, delta contrast and state were resolved when the block was compiled
+    patch1.setPos(thisTrial.patch1Pos)
+    patch2.setPos(thisTrial.patch2Pos)
+    deltaContrast = thisTrial.deltaContrast
+    state         = thisTrial.state
     
     # Set opacity of patches
     opacityPatch1 = (meanOpacity + contrast/2)
     opacityPatch2 = (meanOpacity - contrast/2)
-    patch1.setOpacity(opacityPatch1)
-    patch2.setOpacity(opacityPatch2)
+    if gaborCache is None:
+        patch1.setOpacity(opacityPatch1)
+        patch2.setOpacity(opacityPatch2)
     
     decision1 = event.BuilderKeyResponse()  # create an object of type KeyResponse
-    decision1.status = NOT_STARTED
     
-    # Keep track of which components have finished
-    trialComponents = []
-    trialComponents.append(patch1)
-    trialComponents.append(patch2)
-    trialComponents.append(decision1)
-    trialComponents.append(fixationCross)
-    for thisComponent in trialComponents:
-        if hasattr(thisComponent, 'status'):
-            thisComponent.status = NOT_STARTED
+    # Components of the routine (fixation cross is shown throughout, patches and response after fixation)
+    fixationComponent = stimulus(fixationCross, 0.0, fixCrossTiming + stimulusTiming)
+    patchComponent    = stimulus(patch1, fixCrossTiming, fixCrossTiming + stimulusTiming)
+    trialRoutine = Routine(experimentStructure,
+                           [patchComponent,
+                            stimulus(patch2, fixCrossTiming, fixCrossTiming + stimulusTiming),
+                            response(decision1, fixCrossTiming, fixCrossTiming + stimulusTiming, decision1Keys),
+                            fixationComponent],
+                           fixCrossTiming + stimulusTiming, name='patches')
             
 #-------Start Routine "trial"-------
 
@@ -130,97 +94,36 @@ trials, whichLoop, thisDifference, contrast, routineTimer, globalClock, tracker)
     # drift correction (needed?)
     # keyboard = libinput.Keyboard(keylist=['space'], timeout=None)
 
+    # Simulated participant (key press and gaze are injected at the input layer)
+    agent = experimentStructure.get('agent')
+    if agent is not None:
+        agent.decision1(thisTrial, decision1Keys, fixCrossTiming, fixCrossTiming + stimulusTiming)
+    
+    runRoutine(experimentStructure, trialRoutine, patchClock, routineTimer)
+    
+    # Check fixation on all gaze samples since fixation cross onset (sampled on a background thread)
     saccadeMiss = 0
-    continueRoutine = True
-    while continueRoutine and routineTimer.getTime() > 0:
-        
-        if useEyeTracker:
-            onesample = tracker.sample()
-            
-        if useEyeTracker:
-            if (onesample[0] > 1330 or onesample[0] < 1230)  and (onesample[1] > 770 or onesample[1] < 670):
-                saccadeMiss = 1
-        
-        # Get current time
-        t = patchClock.getTime()
-        frameN = frameN + 1  # number of completed frames (so 0 is the first frame)
-        
-        # Update/draw components on each frame
-        # *patch1* updates
-        if t >= fixCrossTiming and patch1.status == NOT_STARTED:
-            # keep track of start time/frame for later
-            patch1.tStart = t  # underestimates by a little under one frame
-            patch1.frameNStart = frameN  # exact frame index
-            patch1.setAutoDraw(True)
-        if patch1.status == STARTED and t >= (fixCrossTiming + (stimulusTiming - win.monitorFramePeriod*0.75)): #most of one frame period left
-            patch1.setAutoDraw(False)
-        
-        # *patch2* updates
-        if t >= fixCrossTiming and patch2.status == NOT_STARTED:
-            # keep track of start time/frame for later
-            patch2.tStart = t  # underestimates by a little under one frame
-            patch2.frameNStart = frameN  # exact frame index
-            patch2.setAutoDraw(True)
-        if patch2.status == STARTED and t >= (fixCrossTiming + (stimulusTiming - win.monitorFramePeriod*0.75)): #most of one frame period left
-            patch2.setAutoDraw(False)
-            
-        # *fixationCross* updates
-        if t >= 0.0 and fixationCross.status == NOT_STARTED:
-            # keep track of start time/frame for later
-            fixationCross.tStart = t  # underestimates by a little under one frame
-            fixationCross.frameNStart = frameN  # exact frame index
-            fixationCross.setAutoDraw(True)
-        if fixationCross.status == STARTED and t >= (0.0 + (fixCrossTiming + stimulusTiming - win.monitorFramePeriod*0.75)): #most of one frame period left
-            fixationCross.setAutoDraw(False)
-        
-        # *decision1* updates
-        if t >= fixCrossTiming and decision1.status == NOT_STARTED:
-            # keep track of start time/frame for later
-            decision1.tStart = t  # underestimates by a little under one frame
-            decision1.frameNStart = frameN  # exact frame index
-            decision1.status = STARTED
-            
-            # Keyboard checking is just starting
-            decision1.clock.reset()  # now t=0
-            event.clearEvents(eventType='keyboard')
-        if decision1.status == STARTED and t >= (fixCrossTiming + (stimulusTiming - win.monitorFramePeriod*0.75)): #most of one frame period left
-            decision1.status = STOPPED
-        if decision1.status == STARTED:
-            if whichVersion == 1:
-                theseKeys = event.getKeys(keyList=['left', 'right'])
-            elif whichVersion == 2:
-                theseKeys = event.getKeys(keyList=['3', '1'])
-                
-            # Check for quit:
-            if "escape" in theseKeys:
-                endExpNow = True
-            if len(theseKeys) > 0:  # at least one key was pressed
-                decision1.keys = theseKeys[-1]  # just the last key pressed
-                decision1.rt = decision1.clock.getTime()
-                
-                # Was this 'correct'?
-                if (decision1.keys == str(targetPatchKey)) or (decision1.keys == targetPatchKey):
-                    decision1.corr = 1
-                else:
-                    decision1.corr = 0
-                
-                # In current version (07/16) no reward for perceptual decision
-                decision1.reward = 0
-                
-        for thisComponent in trialComponents:
-            if hasattr(thisComponent, "status") and thisComponent.status != FINISHED:
-                continueRoutine = True
-                break  # at least one component has not yet finished
-            else:
-                continueRoutine = False
-                
-        # Check for quit (the Esc key)
-        if endExpNow or event.getKeys(keyList=["escape"]):
-            core.quit()
+    if useEyeTracker and fixationComponent.tStart is not None:
+        gazeSampler = experimentStructure['gazeSampler']
+        fixationOnset = gazeSampler.timeFunc() - patchClock.getTime() + fixationComponent.tStart
+        (gazeCenter, fixationRadius, pixelsPerDegree, fixationRule) = experimentStructure['fixationRoi']
+        saccadeMiss = fixationMiss(gazeSampler.since(fixationOnset), gazeCenter, fixationRadius, pixelsPerDegree, fixationRule)
+    
+    # Scheduled patch onset (quantized in frame-count mode) and realized durations
+    fixCrossTiming = patchComponent.startTime
+    decision1.quantError = patchComponent.startError
+    decision1.fixDuration = patchComponent.tStart - fixationComponent.tStart if patchComponent.tStart is not None else float('nan')
+    decision1.stimDuration = patchComponent.duration()
+    
+    # Was this 'correct'?
+    if decision1.keys not in ['', [], None]:
+        if decision1.keys == targetPatchKey:
+            decision1.corr = 1
+        else:
+            decision1.corr = 0
         
-        # Refresh the screen
-        if continueRoutine:  # don't flip if this routine is over or we'll get a blank screen
-            win.flip()
+        # In current version (07/16) no reward for perceptual decision
+        decision1.reward = 0
             
     # Stop eye tracking
     if useEyeTracker:
@@ -228,14 +131,15 @@ trials, whichLoop, thisDifference, contrast, routineTimer, globalClock, tracker)
         #log.write([trialnr, trialtype,endpos, t1-t0, correct])
 
     #-------Ending Routine "trial"-------
-    for thisComponent in trialComponents:
-        if hasattr(thisComponent, "setAutoDraw"):
-            thisComponent.setAutoDraw(False)
     # Check responses
     if decision1.keys in ['', [], None]:  # No response was made
        decision1.keys = None
        decision1.corr = 0 # sonst zeigt der bei miss keinen kumulierten wert float('nan')  # failed to respond (incorrectly)
        decision1.reward = 0  # failed to respond (incorrectly)
+       rt = None
+    else:
+       rt = decision1.rt
+    accPerf = performance.addDecision1(decision1.corr, decision1.reward, rt)
     
     # Store data for trials (TrialHandler)
     if (whichLoop == 'patches' or whichLoop == 'practice1' or whichLoop == 'practice2' or 
@@ -246,6 +150,7 @@ trials, whichLoop, thisDifference, contrast, routineTimer, globalClock, tracker)
         trials.addData('opacityPatch1', opacityPatch1)
         trials.addData('opacityPatch2', opacityPatch2)
         trials.addData('meanOpacity', meanOpacity)
+        trials.addData('decision1.jitter', currentJitter)
         trials.addData('decision1.keys',decision1.keys)
         if decision1.keys == 'left':
             decision1.decision = 0
@@ -256,8 +161,7 @@ trials, whichLoop, thisDifference, contrast, routineTimer, globalClock, tracker)
             trials.addData('decision1.decision',float('nan'))
         trials.addData('decision1.corr', decision1.corr)
         trials.addData('decision1.reward', decision1.reward)
-        accPerf = trials.data['decision1.reward'].sum()
-        trials.addData('decision1.accPerf', accPerf)   
+        trials.addData('decision1.accPerf', accPerf)
     
     # Currently not in use
     #elif whichLoop == 'quest':
@@ -9,6 +9,7 @@
 from psychopy import visual, core, data, event, logging, sound, gui
 from giveFeedback import giveFeedback
 from runDigitSpan import runDigitSpan
+from xlsxReader import readConditions
 import random
 import os
 from initializeComponents import initializeFractals, initializeFeedback
@@ -65,26 +66,17 @@ def digitSpanTask(experimentStructure, stimuliStructure, globalClock, filename,
         # Set up handler to look after randomisation of conditions etc
         N_Back = data.TrialHandler(nReps = 1, method = 'random', 
             extraInfo = None, originPath = -1,
-            trialList = data.importConditions(blockIndex),
+            trialList = readConditions(blockIndex),
             seed = None, autoLog = False) 
-            
-        thisTrial = N_Back.trialList[0]  # so we can initialise stimuli with some values
-        if thisTrial != None:
-                for paramName in thisTrial.keys():
-                    exec(paramName + '= thisTrial.' + paramName)
 
         myCount         = 0
         presentedDigits = []
         while True: 
          
             thisTrial = N_Back.next()
-            
-            # Abbreviate parameter names if possible (e.g. rgb = thisTrial.rgb)
-            if thisTrial != None:
-                for paramName in thisTrial.keys():
-                    exec(paramName + '= thisTrial.' + paramName)
+            stim = thisTrial['stim']
          
-            presentedDigits.append(thisTrial.stim)
+            presentedDigits.append(stim)
             
             (N_Back, decision1, thisExp, thisTrial, miss) = runDigitSpan(experimentStructure, stimuliStructure, globalClock, filename, routineTimer, text, stim, N_Back,thisExp, thisTrial)
 
@@ -128,20 +120,8 @@ def digitSpanTask(experimentStructure, stimuliStructure, globalClock, filename,
             trialList=[None],
             seed=None, name='trials')
         thisExp.addLoop(trials)  # add the loop to the experiment
-        thisTrial = trials.trialList[0]  # so we can initialise stimuli with some values
-        
-        # Abbreviate parameter names if possible (e.g. rgb = thisTrial.rgb)
-        if thisTrial != None:
-            for paramName in thisTrial.keys():
-                exec(paramName + '= thisTrial.' + paramName)
 
         for thisTrial in trials:
-            currentLoop = trials
-            
-            # Abbreviate parameter names if possible (e.g. rgb = thisTrial.rgb)
-            if thisTrial != None:
-                for paramName in thisTrial.keys():
-                    exec(paramName + '= thisTrial.' + paramName)
             
             # ------Prepare to start Routine "trial"-------
             t = 0
@@ -159,11 +139,24 @@ def digitSpanTask(experimentStructure, stimuliStructure, globalClock, filename,
                 if hasattr(thisComponent, 'status'):
                     thisComponent.status = NOT_STARTED
             
+            # Key presses are read from the keyboard reader if it is used (also keys of a simulated participant)
+            keyboard = experimentStructure.get('keyboard')
+            if keyboard is not None:
+                keyResetTime = keyboard.timeFunc()
+            
+            if experimentStructure.get('agent') is not None:
+                experimentStructure['agent'].recall(presentedDigits, backward)
+            
+            if experimentStructure.get('frameMonitor') is not None:
+                experimentStructure['frameMonitor'].setRoutine('digitSpan')
+            
             # -------Start Routine "trial"-------
             while continueRoutine:
                 # get current time
                 t = trialClock.getTime()
                 frameN = frameN + 1  # number of completed frames (so 0 is the first frame)
+                if keyboard is not None:
+                    frameKeys = [key for (key, timestamp) in keyboard.getKeys() if timestamp >= keyResetTime]
                 # Update/draw components on each frame
                 
                 # *Question* updates
@@ -183,7 +176,10 @@ def digitSpanTask(experimentStructure, stimuliStructure, globalClock, filename,
                     win.callOnFlip(AnswerFinished.clock.reset)  # t=0 on next screen flip
                     event.clearEvents(eventType='keyboard')
                 if AnswerFinished.status == STARTED:
-                    theseKeys = event.getKeys(keyList=['return'])
+                    if keyboard is not None:
+                        theseKeys = [key for key in frameKeys if key == 'return']
+                    else:
+                        theseKeys = event.getKeys(keyList=['return'])
                     
                     # check for quit:
                     if "escape" in theseKeys:
@@ -204,7 +200,10 @@ def digitSpanTask(experimentStructure, stimuliStructure, globalClock, filename,
                     win.callOnFlip(RecordAnswer.clock.reset)  # t=0 on next screen flip
                     event.clearEvents(eventType='keyboard')
                 if RecordAnswer.status == STARTED:
-                    theseKeys = event.getKeys(keyList=['0', '1', '2', '3', '4', '5', '6', '7', '8', '9'])
+                    if keyboard is not None:
+                        theseKeys = [key for key in frameKeys if key.isdigit()]
+                    else:
+                        theseKeys = event.getKeys(keyList=['0', '1', '2', '3', '4', '5', '6', '7', '8', '9'])
                     
                     # check for quit:
                     if "escape" in theseKeys:
@@ -243,11 +242,11 @@ def digitSpanTask(experimentStructure, stimuliStructure, globalClock, filename,
                         break  # at least one component has not yet finished
                 
                 # Check for quit (the Esc key)
-                if endExpNow or event.getKeys(keyList=["escape"]):
+                if endExpNow or event.getKeys(keyList=["escape"]) or (keyboard is not None and 'escape' in frameKeys):
                     core.quit()
                 
                 # Check for delete
-                if endExpNow or event.getKeys(keyList=["backspace"]):
+                if endExpNow or event.getKeys(keyList=["backspace"]) or (keyboard is not None and 'backspace' in frameKeys):
                     if len(RecordAnswer.keys) > 0:
                         RecordAnswer.keys.pop(-1)
                     
@@ -0,0 +1,175 @@
+import math
+import time
+import threading
+import numpy as np
+
+# Threaded eye-tracker acquisition
+#
+# Gaze samples are read on a dedicated thread at the native rate of the
+# tracker and stored with their timestamps in a preallocated NumPy ring
+# buffer. Fixation is checked after a routine over all samples since stimulus
+# onset at once, so a slow tracker call never delays a flip.
+
+
+class GazeBuffer(object):
+    """ This class is a preallocated ring buffer of gaze samples (time, x, y)
+
+    Only the sampling thread writes; readers copy the samples they need.
+
+    Input:
+        capacity: maximal number of stored samples
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.samples = np.zeros((capacity, 3))
+        self.count = 0
+
+    def push(self, timestamp, x, y):
+        """ This function adds a gaze sample (sampling thread only) """
+
+        self.samples[self.count % self.capacity] = (timestamp, x, y)
+        self.count = self.count + 1
+
+    def since(self, startTime):
+        """ This function returns all stored samples at or after a point in time
+
+        Input:
+            startTime: time on the clock of the sampler
+
+        Return:
+            samples: array with one row (time, x, y) per sample
+        """
+
+        count = self.count
+        if count <= self.capacity:
+            samples = self.samples[:count].copy()
+        else:
+            slot = count % self.capacity
+            samples = np.concatenate((self.samples[slot:], self.samples[:slot]))
+        return samples[samples[:, 0] >= startTime]
+
+
+class GazeSampler(object):
+    """ This class samples an eye tracker on a background thread
+
+    Input:
+        tracker: eye-tracker object instance (PyGaze EyeTracker or SimulatedTracker)
+        timeFunc: clock of the timestamps (psychopy.core.getTime)
+        rate: sampling rate in Hz
+        bufferDuration: number of seconds that are kept in the ring buffer
+    """
+
+    def __init__(self, tracker, timeFunc, rate=1000, bufferDuration=10):
+        self.tracker = tracker
+        self.timeFunc = timeFunc
+        self.rate = rate
+        self.buffer = GazeBuffer(int(rate * bufferDuration))
+        self.running = False
+        self.thread = threading.Thread(target=self.run, name='gazeSampler')
+        self.thread.daemon = True
+
+    def start(self):
+        self.running = True
+        self.thread.start()
+        return self
+
+    def run(self):
+        interval = 1.0 / self.rate
+        nextSample = time.time()
+        while self.running:
+            (x, y) = self.tracker.sample()[:2]
+            self.buffer.push(self.timeFunc(), x, y)
+            nextSample = nextSample + interval
+            delay = nextSample - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -10*interval:
+                nextSample = time.time()  # tracker is slower than the requested rate
+
+    def since(self, startTime):
+        return self.buffer.since(startTime)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+
+def fixationMiss(samples, center, radius, pixelsPerDegree, rule='box'):
+    """ This function checks if gaze left the region of interest
+
+    Input:
+        samples: array with one row (time, x, y) per sample (tracker pixels)
+        center: center of region of interest in tracker pixels
+        radius: half width (rule 'box') or radius (rule 'circle') of region of interest in degrees of visual angle
+        pixelsPerDegree: number of tracker pixels per degree of visual angle
+        rule: 'box' = a sample is outside if x and y are both outside the square (criterion of the original task);
+              'circle' = a sample is outside if its distance from the center exceeds the radius
+
+    Return:
+        saccadeMiss: 1 if at least one sample is outside the region of interest, else 0
+    """
+
+    if len(samples) == 0:
+        return 0
+    dx = np.abs(samples[:, 1] - center[0]) / pixelsPerDegree
+    dy = np.abs(samples[:, 2] - center[1]) / pixelsPerDegree
+    if rule == 'box':
+        return int(np.any((dx > radius) & (dy > radius)))
+    if rule == 'circle':
+        return int(np.any(np.hypot(dx, dy) > radius))
+    raise ValueError('unknown fixation rule %r (use box or circle)' % rule)
+
+
+class SimulatedTracker(object):
+    """ This class generates synthetic gaze in place of an eye tracker
+
+    Gaze stays at the screen center with fixational noise and occasionally
+    jumps away and back (saccades). The class has the interface of the PyGaze
+    EyeTracker that is used by the task, so that the acquisition pipeline can
+    be load-tested without hardware.
+
+    Input:
+        center: screen center in pixels
+        noise: standard deviation of fixational noise in pixels per sample
+        saccadeRate: expected number of saccades per second
+        saccadeAmplitude: saccade amplitude in pixels
+        rate: sample rate in Hz
+        seed: seed of the random number generator
+    """
+
+    def __init__(self, center=(1280, 720), noise=0.5, saccadeRate=0.2, saccadeAmplitude=200, rate=1000, seed=None):
+        self.center = center
+        self.noise = noise
+        self.saccadeProbability = saccadeRate / float(rate)
+        self.saccadeAmplitude = saccadeAmplitude
+        self.randomState = np.random.RandomState(seed)
+        self.position = list(center)
+        self.recording = False
+
+    def calibrate(self):
+        pass
+
+    def start_recording(self):
+        self.recording = True
+
+    def stop_recording(self):
+        self.recording = False
+
+    def sample(self):
+        """ This function returns the current synthetic gaze position """
+
+        randomState = self.randomState
+        if randomState.random_sample() < self.saccadeProbability:
+            # Saccade away from or back to the center
+            if self.position[0] == self.center[0] and self.position[1] == self.center[1]:
+                angle = randomState.uniform(0, 2*math.pi)
+                self.position = [self.center[0] + self.saccadeAmplitude*math.cos(angle),
+                                 self.center[1] + self.saccadeAmplitude*math.sin(angle)]
+            else:
+                self.position = list(self.center)
+        (dx, dy) = randomState.normal(0, self.noise, 2)
+        return (self.position[0] + dx, self.position[1] + dy)
+
+    def close(self):
+        pass
@@ -0,0 +1,276 @@
+from __future__ import division
+import os
+import csv
+import math
+
+# Streaming frame-interval monitor
+#
+# Every flip of the window is timed and the interval is added to fixed-size
+# histograms (plus count, mean, SD and maximum) of the current routine in the
+# current block. Memory does not grow with the session: when a block ends,
+# its statistics are appended as summary rows to a separate file
+# (filename_frames.csv, one row per routine) and merged into per-routine
+# totals of the session. The summaries are not written to the data file,
+# where they would be rows of the unfinished trial loop of the block. Quantiles are read from the histograms
+# (resolution of one bin). Frames outside of blocks (instructions, examples,
+# digit span) are attributed to the block 'session'.
+
+
+# Columns of the summary rows (times in milliseconds)
+summaryNames = ('n', 'dropped', 'mean', 'sd', 'p50', 'p95', 'p99', 'max')
+
+
+class FrameStats(object):
+    """ This class accumulates frame intervals in a fixed-size histogram
+
+    Input:
+        binWidth: width of histogram bins in seconds
+        nBins: number of bins (the last bin collects all longer intervals)
+    """
+
+    __slots__ = ('binWidth', 'counts', 'n', 'nDropped', 'mean', 'm2', 'max')
+
+    def __init__(self, binWidth, nBins):
+        self.binWidth = binWidth
+        self.counts = [0] * nBins
+        self.n = 0
+        self.nDropped = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.max = 0.0
+
+    def add(self, interval, dropped):
+        """ This function adds a frame interval
+
+        Input:
+            interval: frame interval in seconds
+            dropped: indicates if the frame was dropped
+        """
+
+        self.counts[min(int(interval / self.binWidth), len(self.counts) - 1)] += 1
+        self.n = self.n + 1
+        self.nDropped = self.nDropped + dropped
+        delta = interval - self.mean
+        self.mean = self.mean + delta / self.n
+        self.m2 = self.m2 + delta * (interval - self.mean)
+        if interval > self.max:
+            self.max = interval
+
+    def merge(self, other):
+        """ This function adds the frames of another histogram
+
+        Input:
+            other: FrameStats instance with the same bins
+        """
+
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.m2 = self.m2 + other.m2 + delta * delta * self.n * other.n / n
+        self.mean = self.mean + delta * other.n / n
+        self.n = n
+        self.nDropped = self.nDropped + other.nDropped
+        self.max = max(self.max, other.max)
+        self.counts = [x + y for x, y in zip(self.counts, other.counts)]
+
+    def quantile(self, q):
+        """ This function returns a quantile of the frame intervals
+
+        Input:
+            q: probability (e.g. 0.99)
+
+        Return:
+            interval: upper edge of the bin that contains the quantile (in seconds; nan without frames)
+        """
+
+        if self.n == 0:
+            return float('nan')
+        rank = q * self.n
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative = cumulative + count
+            if cumulative >= rank and count > 0:
+                return min((i + 1) * self.binWidth, self.max)
+        return self.max
+
+    def summary(self):
+        """ This function returns the summary of the frame intervals (times in milliseconds)
+
+        Return:
+            summary: dictionary with n, dropped, mean, sd, p50, p95, p99 and max
+        """
+
+        sd = math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else float('nan')
+        return {'n': self.n, 'dropped': self.nDropped, 'mean': self.mean * 1000 if self.n > 0 else float('nan'),
+                'sd': sd * 1000, 'p50': self.quantile(0.5) * 1000, 'p95': self.quantile(0.95) * 1000,
+                'p99': self.quantile(0.99) * 1000, 'max': self.max * 1000}
+
+
+class FrameMonitor(object):
+    """ This class times every flip of a window and attributes the frame intervals to routines and blocks
+
+    Input:
+        win: window object instance
+        timeFunc: clock of the flip times (e.g. core.getTime)
+        frameDur: expected frame duration in seconds
+        tolerance: a frame is dropped if its interval exceeds frameDur + tolerance
+        binWidth: width of histogram bins in seconds
+        maxInterval: intervals above this value fall into the last bin
+        warnFraction: fraction of dropped frames in a block above which the experimenter is warned
+        summaryFile: path of the .csv file that summary rows are appended to (None = no summary rows)
+    """
+
+    def __init__(self, win, timeFunc, frameDur, tolerance=0.004, binWidth=0.00025, maxInterval=0.1, warnFraction=0.01,
+                 summaryFile=None):
+        self.win = win
+        self.timeFunc = timeFunc
+        self.frameDur = frameDur
+        self.threshold = frameDur + tolerance
+        self.binWidth = binWidth
+        self.nBins = int(round(maxInterval / binWidth)) + 1
+        self.warnFraction = warnFraction
+        self.summaryFile = summaryFile
+        self.routine = 'other'
+        self.block = 'session'
+        self.blockStats = {}    # routine -> FrameStats of the current block
+        self.sessionStats = {}  # routine -> FrameStats of all finished blocks and frames outside of blocks
+        self.lastFlip = None
+        self.flip = None
+
+    def attach(self):
+        """ This function times every flip of the window from now on
+
+        Return:
+            monitor: the monitor itself
+        """
+
+        flip = self.win.flip
+        self.flip = flip
+
+        def monitoredFlip(*args, **kwargs):
+            result = flip(*args, **kwargs)
+            self.frame(self.timeFunc())
+            return result
+
+        self.win.flip = monitoredFlip
+        self.lastFlip = None
+        return self
+
+    def detach(self):
+        """ This function restores the flip of the window """
+
+        if self.flip is not None:
+            self.win.flip = self.flip
+            self.flip = None
+
+    def setRoutine(self, name):
+        """ This function attributes the following frames to a routine
+
+        Input:
+            name: name of routine (e.g. patches, fractals, feedback, instructions, digitSpan)
+        """
+
+        self.routine = name or 'other'
+
+    def frame(self, t):
+        """ This function adds the interval of a flip
+
+        Input:
+            t: time of the flip
+        """
+
+        if self.lastFlip is not None:
+            interval = t - self.lastFlip
+            stats = self.blockStats.get(self.routine)
+            if stats is None:
+                stats = FrameStats(self.binWidth, self.nBins)
+                self.blockStats[self.routine] = stats
+            stats.add(interval, interval > self.threshold)
+        self.lastFlip = t
+
+    def startBlock(self, name):
+        """ This function starts the frame statistics of a block (previous frames are attributed to the session)
+
+        Input:
+            name: name of block (e.g. path of block file)
+        """
+
+        self.mergeBlock()
+        self.block = name
+
+    def mergeBlock(self):
+        """ This function merges the statistics of the current block into the session totals
+
+        Return:
+            stats: statistics of the block (routine -> FrameStats)
+        """
+
+        stats = self.blockStats
+        for routine, routineStats in stats.items():
+            if routine not in self.sessionStats:
+                self.sessionStats[routine] = FrameStats(self.binWidth, self.nBins)
+            self.sessionStats[routine].merge(routineStats)
+        self.blockStats = {}
+        return stats
+
+    def writeSummary(self, block, stats):
+        """ This function appends one summary row per routine to the summary file
+
+        Input:
+            block: name of block
+            stats: statistics (routine -> FrameStats)
+
+        Return: ~
+        """
+
+        if self.summaryFile is None or len(stats) == 0:
+            return
+        newFile = not os.path.isfile(self.summaryFile) or os.path.getsize(self.summaryFile) == 0
+        with open(self.summaryFile, 'a') as f:
+            writer = csv.writer(f, lineterminator='\n')
+            if newFile:
+                writer.writerow(['block', 'routine'] + list(summaryNames))
+            for routine in sorted(stats):
+                summary = stats[routine].summary()
+                writer.writerow([block, routine] + [round(summary[name], 3) for name in summaryNames])
+
+    def endBlock(self):
+        """ This function ends a block: summary rows are written and the experimenter is warned about dropped frames
+
+        Return:
+            total: summary of all frames of the block
+        """
+
+        block = self.block
+        stats = self.mergeBlock()
+        self.block = 'session'
+        self.writeSummary(block, stats)
+
+        total = FrameStats(self.binWidth, self.nBins)
+        for routineStats in stats.values():
+            total.merge(routineStats)
+        total = total.summary()
+        if total['n'] > 0 and total['dropped'] > self.warnFraction * total['n']:
+            worst = max(stats, key=lambda routine: stats[routine].nDropped)
+            print('WARNING: %d of %d frames dropped in block %s (%.1f%%; most in %s; p99 = %.1f ms)' %(total['dropped'],
+                  total['n'], block, 100 * total['dropped'] / total['n'], worst, total['p99']))
+        return total
+
+    def endSession(self):
+        """ This function ends the session: summary rows of all routines are written and printed
+
+        Return:
+            summaries: dictionary (routine -> summary of the whole session)
+        """
+
+        self.mergeBlock()
+        self.detach()
+        self.writeSummary('session', self.sessionStats)
+        summaries = dict((routine, stats.summary()) for routine, stats in self.sessionStats.items())
+        for routine in sorted(summaries):
+            summary = summaries[routine]
+            print('frames %-16s n=%6d dropped=%5d mean=%.1fms sd=%.2f p50=%.2f p99=%.2f max=%.1f' %(routine,
+                  summary['n'], summary['dropped'], summary['mean'], summary['sd'], summary['p50'], summary['p99'],
+                  summary['max']))
+        return summaries
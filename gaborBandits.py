@@ -14,6 +14,13 @@ Written by RB. Version 07/2017
 """
 
 from __future__ import division
+
+# Headless run on a virtual clock without display (has to be installed before PsychoPy is used)
+headless = False
+if headless:
+    import headlessBackend
+    headlessBackend.install(refreshRate=60.0)
+
 from psychopy import visual, core, data, event, logging, sound, gui
 from psychopy.constants import *
 from psychopy import parallel
@@ -21,7 +28,6 @@ import numpy as np
 from numpy import sin, cos, tan, log, log10, pi, average, sqrt, std, deg2rad, rad2deg, linspace, asarray
 from numpy.random import random, randint, normal, shuffle
 import os
-import glob
 import random
 from initializeComponents import initializeFixationCross, initializeQuestProcedure, initializePatches
 from initializeComponents import initializeFractals, initializeFeedback
@@ -33,11 +39,23 @@ from fractalsExample import fractalsExample
 from taskLoop import taskLoop
 from runTask import runTask 
 from digitSpanTask import digitSpanTask
-from psychopy.hardware.emulator import launchScan
+from blockCache import openBlockCache
+from blockManifest import loadManifest, checkSet, selectBlocks
+from trialRecords import decisionKeys, jitterGenerator
+from routineEngine import toFrames
+from keyboardReader import openKeyboardReader
+from eyeTracking import GazeSampler, SimulatedTracker
+from scannerTrigger import openTriggerListener
+from gaborTextures import GaborCache
+from stimulusPool import stimulusPool
+from instructionRenderer import InstructionRenderer
+from keyboardReader import openPipeKeyboard
+from responseAgents import createAgent, PipeKeys
+from trialLog import TrialLog, streamEntries
+from sessionCheckpoint import SessionCheckpoint, loadCheckpoint
+from columnarOutput import writeColumns, writeTrialLogColumns
+from frameMonitor import FrameMonitor
 import sys  
-import matplotlib
-matplotlib.use('Qt4Agg')
-import pylab
 reload(sys)  
 sys.setdefaultencoding('utf8')
 
@@ -59,6 +77,29 @@ cBal                = u'1'         # 1 = high contrast patch, 2 = low contrast p
 winFeedback         = "+ 1 Punkt" 
 neutralFeedback     = "+ 0 Punkte"
 useEyeTracker       = False
+useSimulatedTracker = False        # True = synthetic 1000 Hz gaze instead of eye tracker (test without hardware)
+trackerRate         = 1000         # sampling rate of eye tracker in Hz
+gazeCenter          = (1280, 720)  # fixation cross in tracker pixels
+fixationRadius      = 1.0          # half width (box) or radius (circle) of fixation region in degrees of visual angle
+pixelsPerDegree     = 50.0         # tracker pixels per degree of visual angle (depends on screen and viewing distance)
+fixationRule        = 'box'        # fixation break: 'box' = x and y both outside the square (original criterion); 'circle' = outside the radius
+missPolicy          = 'end'        # missed trials: 'end' = repeat at end of block; 'after' = repeat after missDelay trials
+missDelay           = 3            # number of trials before a missed trial is repeated (missPolicy 'after')
+maxRepeats          = None         # give up a missed trial after this number of repeats (None = repeat until answered)
+triggerSource       = 'parallel'   # fMRI trigger: 'parallel' = parallel port; 'emulator' = software scanner
+scannerTR           = 2.0          # repetition time of software scanner in seconds
+scannerSpeedUp      = 1.0          # software scanner runs this many times faster than real time
+keyboardDevice      = None         # Linux input device for background keyboard reader (e.g. '/dev/input/event3'; None = PsychoPy event module)
+useFrameTiming      = False        # True = present durations and jitter as integer numbers of frames
+responseAgent       = None         # simulated participant: None = real participant; 'random', 'learning' or 'replay'
+replayFile          = None         # data file (.csv) of a session that is replayed by the 'replay' agent
+usePatchTextures    = False        # True = prebuilt Gabor textures with baked-in opacity instead of setOpacity per trial
+rasterizeInstructions = True       # True = instruction screens are drawn once into cached buffer images
+streamTrialLog      = True         # True = every data row is also appended to a crash-safe trial log (filename_trials.jsonl)
+columnarOutput      = True         # True = data are also written as typed columns in compressed chunks (filename_columns)
+savePsydat          = True         # False = no .psydat pickle of the experiment handler (e.g. with columnarOutput)
+frameDropWarning    = 0.01         # warn the experimenter after a block with more than this fraction of dropped frames
+resumeSession       = None         # trial log of an interrupted main session (session 2) that is continued at the next block (None = new session)
 
 # Control timing
 if whichVersion == 1:
@@ -109,9 +150,28 @@ elif session == 3:
 thisExp = data.ExperimentHandler(name = expName, version = '',
     extraInfo = expInfo, runtimeInfo = None,
     originPath = None,
-    savePickle = True, saveWideText = True,autoLog = False,
+    savePickle = savePsydat, saveWideText = True,autoLog = False,
     dataFileName = filename)  
 
+# State of an interrupted session at its last checkpoint
+if resumeSession != None:
+    resumeState = loadCheckpoint(resumeSession)
+    if resumeState == None:
+        # Appending a new session to the log (without resumed marker) would duplicate rows in ingestData
+        raise ValueError('trial log %s has no checkpoint and cannot be resumed (set resumeSession = None to start a new session)' % resumeSession)
+else:
+    resumeState = None
+
+# Stream data rows to trial log on a background thread (a resumed session continues its log)
+if streamTrialLog:
+    if resumeSession != None:
+        trialLog = TrialLog(resumeSession)
+    else:
+        trialLog = TrialLog(filename + '_trials.jsonl')
+    streamEntries(thisExp, trialLog)
+else:
+    trialLog = None
+
 # Initialize window object
 win = visual.Window(size=(1280, 1024), monitor='testMonitor', fullscr=True, units='deg', colorSpace='rgb')
 
@@ -121,14 +181,44 @@ endExpNow = False
 # Create eyetracker object and calibrate
 # --------------------------------------
 if useEyeTracker:
-    tracker = eyetracker.EyeTracker(win, eyedatafile='eyetracking_log')
+    if useSimulatedTracker or responseAgent != None:
+        tracker = SimulatedTracker(center=gazeCenter, rate=trackerRate)
+    else:
+        tracker = eyetracker.EyeTracker(win, eyedatafile='eyetracking_log')
     tracker.calibrate()
     tracker.start_recording()
+    
+    # Sample gaze on a background thread
+    gazeSampler = GazeSampler(tracker, core.getTime, trackerRate).start()
 else:
     tracker = 0
+    gazeSampler = None
+
+# Start background keyboard reader (reaction times from key press timestamps)
+if keyboardDevice != None:
+    keyboard = openKeyboardReader(keyboardDevice, core.getTime)
+else:
+    keyboard = None
+
+# Simulated participant (key presses and gaze are injected at the input layer)
+if responseAgent != None:
+    if headless:
+        agentKeys = headlessBackend.keyboard
+    else:
+        (keyboard, keyWriter) = openPipeKeyboard(core.getTime)
+        agentKeys = PipeKeys(keyWriter, core.getTime)
+    agent = createAgent(responseAgent, agentKeys, core.getTime, replayFile, gazeCenter=gazeCenter)
+    if useEyeTracker:
+        gazeSampler.stop()
+        gazeSampler = agent.gaze
+else:
+    agent = None
 
-# Frame rate
-expInfo['frameRate'] = win.getActualFrameRate()
+# Frame rate (a resumed session uses the frame rate measured at the start of the interrupted session)
+if resumeState != None:
+    expInfo['frameRate'] = resumeState['expInfo']['frameRate']
+else:
+    expInfo['frameRate'] = win.getActualFrameRate()
 print('frame rate: %f' %(expInfo['frameRate']))
 if expInfo['frameRate'] != None:
     frameDur = 1.0/round(expInfo['frameRate'])
@@ -136,6 +226,15 @@ else:
     frameDur = 1.0/60.0
 win._refreshThreshold = frameDur+0.004 # we want to allow 4ms tolerance
 
+# Frame-interval statistics per routine and block in constant memory (instead of recording all intervals)
+frameMonitor = FrameMonitor(win, core.getTime, frameDur, tolerance=0.004, warnFraction=frameDropWarning,
+                            summaryFile=filename + '_frames.csv').attach()
+
+# Frame-count timing: durations are converted to frames of the measured frame duration
+if useFrameTiming:
+    print('frame timing: fixation %d frames, jitter up to %d frames, stimulus %d frames (%.2f ms per frame)' %(toFrames(fixCrossTiming, frameDur),
+    toFrames(jitter, frameDur), toFrames(stimulusTiming, frameDur), frameDur*1000))
+
 # Set the log module to report warnings to the std output window (default is errors only)
 logging.console.setLevel(logging.WARNING)
 
@@ -143,18 +242,56 @@ logging.console.setLevel(logging.WARNING)
 (fixationCross) = initializeFixationCross(win)
 (questClock) = initializeQuestProcedure(win)
 (patchClock, patch1, patch2) = initializePatches(win, expInfo)
+if usePatchTextures:
+    gaborCache = GaborCache(win, cacheDir=os.path.join('blockFiles', 'cache', 'textures'))
+else:
+    gaborCache = None
 (fractalClock, fractal1, fractal2) = initializeFractals(win, expInfo)
 (feedbackClock, feedbackText) = initializeFeedback(win, expInfo)
 
+# Instruction screens (rasterized on first use or in idle frames of the previous screen)
+if rasterizeInstructions:
+    instructionRenderer = InstructionRenderer(win)
+else:
+    instructionRenderer = None
+
 # Imaging clock: will be reset in response to first fMRI impulse
 globalClock = core.Clock()
 
+# Listen for TR pulses of the scanner in the background
+if whichVersion == 2:
+    triggerListener = openTriggerListener(triggerSource, globalClock, scannerTR, scannerSpeedUp, filename + '_triggers.csv')
+else:
+    triggerListener = None
+
+# Open compiled block files (rebuilt automatically if a workbook changed)
+blockCache = openBlockCache('blockFiles')
+
+# Check that all blocks of this session exist and are valid before we start
+blockManifest = loadManifest('blockFiles')
+checkSet(blockManifest, set, session, nTrials, nTrialsPatches, nBlocksSafe, nBlocksUnc)
+
+# Response keys of both decisions (depend on task version)
+(decision1Keys, decision2Keys) = decisionKeys(whichVersion)
+
+# Seeded generator for the jitter schedules (one schedule is drawn per block)
+(jitterRandomState, expInfo['jitterSeed']) = jitterGenerator(ID, session)
+
+# Checkpoints at block boundaries (restores generators and completed parts of a resumed session)
+checkpoint = SessionCheckpoint(expInfo, jitterRandomState, trialLog, resumeState)
+
 # Create some useful structures 
 # -----------------------------
 experimentStructure = {'expInfo': expInfo, 'thisExp': thisExp,
 'globalClock': globalClock, 'NOT_STARTED': NOT_STARTED, 'STARTED': STARTED, 'FINISHED': FINISHED,
 'STOPPED': STOPPED,'endExpNow': endExpNow, 'event': event, 'win': win, 'whichVersion': whichVersion,
-'useEyeTracker': useEyeTracker}
+'useEyeTracker': useEyeTracker, 'blockCache': blockCache, 'decision1Keys': decision1Keys,
+'decision2Keys': decision2Keys, 'useFrameTiming': useFrameTiming, 'frameDur': frameDur,
+'jitterGenerator': jitterRandomState, 'missPolicy': missPolicy, 'missDelay': missDelay,
+'maxRepeats': maxRepeats, 'keyboard': keyboard, 'gazeSampler': gazeSampler,
+'fixationRoi': (gazeCenter, fixationRadius, pixelsPerDegree, fixationRule), 'triggerListener': triggerListener,
+'instructionRenderer': instructionRenderer, 'agent': agent, 'checkpoint': checkpoint,
+'frameMonitor': frameMonitor}
 
 outcomeStructure = {'reward': reward, 'noReward': noReward, 'winFeedback': winFeedback,
 'neutralFeedback': neutralFeedback}
@@ -162,7 +299,7 @@ outcomeStructure = {'reward': reward, 'noReward': noReward, 'winFeedback': winFe
 stimuliStructure = {'patch1': patch1, 'patch2': patch2, 'fractal1': fractal1, 'fractal2': fractal2,
 'fixationCross': fixationCross, 'fixCrossTiming': fixCrossTiming, 'jitter': jitter,
 'stimulusTiming': stimulusTiming, 'questClock': questClock, 'patchClock': patchClock,
-'fractalClock': fractalClock, 'feedbackClock': feedbackClock}
+'fractalClock': fractalClock, 'feedbackClock': feedbackClock, 'gaborCache': gaborCache}
 
 # Instructions
 # -------------
@@ -212,12 +349,13 @@ if session == 1:
     
     header = 'Ende der Übung'
     mainText = ("""In diesem Block hast Du %1.0f Mal richtig geantwortet!""" %(accPerf))
-    simpleInstructions(experimentStructure, header, 0.1, [0, 0.6], mainText, 0.08, [0, 0.0])
-    
-    header = '2. Übung'
-    mainText = ("""In dieser Übung sollst Du wieder entscheiden, welches Bild %sr ist. """
+    nextHeader = '2. Übung'
+    nextText   = ("""In dieser Übung sollst Du wieder entscheiden, welches Bild %sr ist. """
     """Diesmal bekommst Du allerdings kein Feedback zu Deiner Antwort.""" %(targetWord2))
-    simpleInstructions(experimentStructure, header, 0.1, [0, 0.6], mainText, 0.08, [0, 0.0])
+    simpleInstructions(experimentStructure, header, 0.1, [0, 0.6], mainText, 0.08, [0, 0.0],
+                       nextScreen=(nextHeader, 0.1, [0, 0.6], nextText, 0.08, [0, 0.0]))
+    
+    simpleInstructions(experimentStructure, nextHeader, 0.1, [0, 0.6], nextText, 0.08, [0, 0.0])
     
     whichLoop = 'patches'
     blockIndex = """blockFiles/set_%1d/pract_PD/GB_runPatches2.xlsx""" %(set)    
@@ -319,12 +457,13 @@ if session == 1:
     
     header = 'Ende der Übung'
     mainText = ("""In diesem Block hast Du %1.0f Punkte gesammelt!\n\n""" %(accPerf))
-    simpleInstructions(experimentStructure, header, 0.1, [0, 0.6], mainText, 0.08, [0, 0.0])
-    
-    header = '4. Übung'
-    mainText = ("""Diese Übung ist die letzte Übung bevor der Versuch startet. Du hast genau die gleiche """
+    nextHeader = '4. Übung'
+    nextText   = ("""Diese Übung ist die letzte Übung bevor der Versuch startet. Du hast genau die gleiche """
     """Aufgabe wie in der letzten Übung, allerdings sind die Bilder in der ersten Stufe schwieriger von einander zu unterscheiden.""")
-    simpleInstructions(experimentStructure, header, 0.1, [0, 0.6], mainText, 0.08, [0, 0.0])
+    simpleInstructions(experimentStructure, header, 0.1, [0, 0.6], mainText, 0.08, [0, 0.0],
+                       nextScreen=(nextHeader, 0.1, [0, 0.6], nextText, 0.08, [0, 0.0]))
+    
+    simpleInstructions(experimentStructure, nextHeader, 0.1, [0, 0.6], nextText, 0.08, [0, 0.0])
     
     whichLoop = 'practice4'
     blockIndex = """blockFiles/set_%d/pract_unc/leftBlue/GB_LB_1.xlsx""" %(set)
@@ -344,64 +483,81 @@ if session == 1:
     
     header = 'Ende der Übung'
     mainText = ("""In diesem Block hast Du %1.0f Punkte gesammelt!\n\n""" %(accPerf))
-    simpleInstructions(experimentStructure, header, 0.1, [0, 0.6], mainText, 0.08, [0, 0.0])
+    nextHeader = ' '
+    nextText   = """Du hast den Übungsteil jetzt abgeschlossen. Wende Dich bitte an den Versuchsleiter."""
+    simpleInstructions(experimentStructure, header, 0.1, [0, 0.6], mainText, 0.08, [0, 0.0],
+                       nextScreen=(nextHeader, 0.1, [0, 0.6], nextText, 0.08, [0, 0.0]))
     
-    header = ' '
-    mainText = """Du hast den Übungsteil jetzt abgeschlossen. Wende Dich bitte an den Versuchsleiter."""
-    simpleInstructions(experimentStructure, header, 0.1, [0, 0.6], mainText, 0.08, [0, 0.0])
+    simpleInstructions(experimentStructure, nextHeader, 0.1, [0, 0.6], nextText, 0.08, [0, 0.0])
     
 elif session == 2:
     
     # Main task
     #----------
     
-    # First part: "economic decision making"
-    leftBlue  = glob.glob('blockFiles/set_%1.0f/main_safe/leftBlue/*.xlsx' %(set))
-    rightBlue = glob.glob('blockFiles/set_%1.0f/main_safe/rightBlue/*.xlsx' %(set))
-    blockList = (leftBlue + rightBlue)
-    shuffle(blockList)
-    print(blockList)    
-    
-    header = 'Entscheidungsaufgabe Teil 1'
-    mainText = ("""Ab jetzt erhälst Du Punkte für Deine Entscheidungen. Die Punkte werden am Ende des Experiments in Geld umgerechnet. """
-    """Du fängst mit %1.0f Blöcken an, in denen Du den Kontrast der Bilder einfach unterscheiden kannst. """ %(nBlocksSafe))
-    simpleInstructions(experimentStructure, header, 0.1, [0, 0.6], mainText, 0.08, [0, 0.0])
+    # Resumed session: completed parts are skipped, the interrupted part continues with the next block
+    if resumeState != None:
+        header = 'Fortsetzung'
+        mainText = 'Die Aufgabe wird an der Stelle fortgesetzt, an der sie unterbrochen wurde. Weiter mit Enter.'
+        simpleInstructions(experimentStructure, header, 0.1, [0, 0.6], mainText, 0.08, [0, 0.0])
     
+    # First part: "economic decision making"
     conditionName = 'main_safe'
     nBlocks = nBlocksSafe
-    (score1, rew1) = taskLoop(set, nBlocks, whichVersion, globalClock, experimentStructure, outcomeStructure, stimuliStructure, data,
-    feedbackText, nTrials, tracker, blockList, expInfo, conditionName, targetWord)
+    if checkpoint.isComplete(conditionName):
+        (score1, rew1) = checkpoint.result(conditionName)
+    else:
+        blockList = []
+        if not checkpoint.isStarted(conditionName):
+            leftBlue  = selectBlocks(blockManifest, set, 'main_safe', 'leftBlue')
+            rightBlue = selectBlocks(blockManifest, set, 'main_safe', 'rightBlue')
+            blockList = (leftBlue + rightBlue)
+            shuffle(blockList)
+            print(blockList)    
+            
+            header = 'Entscheidungsaufgabe Teil 1'
+            mainText = ("""Ab jetzt erhälst Du Punkte für Deine Entscheidungen. Die Punkte werden am Ende des Experiments in Geld umgerechnet. """
+            """Du fängst mit %1.0f Blöcken an, in denen Du den Kontrast der Bilder einfach unterscheiden kannst. """ %(nBlocksSafe))
+            simpleInstructions(experimentStructure, header, 0.1, [0, 0.6], mainText, 0.08, [0, 0.0])
+        
+        (score1, rew1) = taskLoop(set, nBlocks, whichVersion, globalClock, experimentStructure, outcomeStructure, stimuliStructure, data,
+        feedbackText, nTrials, tracker, blockList, expInfo, conditionName, targetWord)
     
     # Second part: "perceptual decision making"
-    header = 'Kontrastentscheidungen'
-    mainText = ("""In dieser Aufgabe siehst Du ausschließlich die Bilder aus der Entscheidungsaufgabe. Wie in der Übung am Anfang, sollst Du angeben, """
-    """welches Bild %sr ist.""" %(targetWord2))
-    simpleInstructions(experimentStructure, header, 0.1, [0, 0.6], mainText, 0.08, [0, 0.0])
-    
-    whichLoop = 'patches'
-    blockIndex = """blockFiles/set_%d/main_PD/GB_runPatches1.xlsx""" %(set)
-    showFeedback = 0
-    accPerf = runPatches(experimentStructure, stimuliStructure, data, feedbackText, patchClock,
-    whichLoop, conditionName, showFeedback, nTrialsPatches, blockIndex, globalClock, tracker)
-    
-    header = 'Ende Kontrastentscheidungen'
-    mainText = ("""In diesem Block hast Du %1.0f Mal richtig geantwortet!""" %(accPerf))
-    simpleInstructions(experimentStructure, header, 0.1, [0, 0.6], mainText, 0.08, [0, 0.0])
-    
-    # Third part: "economic decision making under perceptual uncertainty"
-    header = 'Entscheidungsaufgabe Teil 2'
-    mainText = ("""Jetzt kommt der zweite Teil der Entscheidungsaufgabe. Du sollst wieder probieren, möglichst viele Punkte zu verdienen. """
+    nextHeader = 'Entscheidungsaufgabe Teil 2'
+    nextText   = ("""Jetzt kommt der zweite Teil der Entscheidungsaufgabe. Du sollst wieder probieren, möglichst viele Punkte zu verdienen. """
     """Dabei kannst Du die Kontraste manchmal nur schwer von einander unterscheiden. Insgesamt durchläufst Du %1.0f Blöcke.""" %(nBlocksUnc))
-    simpleInstructions(experimentStructure, header, 0.1, [0, 0.6], mainText, 0.08, [0, 0.0])
-    
-    leftBlue  = glob.glob('blockFiles/set_%1.0f/main_unc/leftBlue/*.xlsx' %(set))
-    rightBlue = glob.glob('blockFiles/set_%1.0f/main_unc/rightBlue/*.xlsx' %(set))
-    blockList = (leftBlue + rightBlue)
-    shuffle(blockList)
-    print(blockList)
+    if not checkpoint.isComplete('main_PD'):
+        header = 'Kontrastentscheidungen'
+        mainText = ("""In dieser Aufgabe siehst Du ausschließlich die Bilder aus der Entscheidungsaufgabe. Wie in der Übung am Anfang, sollst Du angeben, """
+        """welches Bild %sr ist.""" %(targetWord2))
+        simpleInstructions(experimentStructure, header, 0.1, [0, 0.6], mainText, 0.08, [0, 0.0])
+        
+        whichLoop = 'patches'
+        blockIndex = """blockFiles/set_%d/main_PD/GB_runPatches1.xlsx""" %(set)
+        showFeedback = 0
+        accPerf = runPatches(experimentStructure, stimuliStructure, data, feedbackText, patchClock,
+        whichLoop, conditionName, showFeedback, nTrialsPatches, blockIndex, globalClock, tracker)
+        checkpoint.partDone('main_PD', accPerf)
+        
+        header = 'Ende Kontrastentscheidungen'
+        mainText = ("""In diesem Block hast Du %1.0f Mal richtig geantwortet!""" %(accPerf))
+        simpleInstructions(experimentStructure, header, 0.1, [0, 0.6], mainText, 0.08, [0, 0.0],
+                           nextScreen=(nextHeader, 0.1, [0, 0.6], nextText, 0.08, [0, 0.0]))
     
+    # Third part: "economic decision making under perceptual uncertainty"
     conditionName = 'main_unc'
     nBlocks = nBlocksUnc
+    blockList = []
+    if not checkpoint.isStarted(conditionName):
+        simpleInstructions(experimentStructure, nextHeader, 0.1, [0, 0.6], nextText, 0.08, [0, 0.0])
+        
+        leftBlue  = selectBlocks(blockManifest, set, 'main_unc', 'leftBlue')
+        rightBlue = selectBlocks(blockManifest, set, 'main_unc', 'rightBlue')
+        blockList = (leftBlue + rightBlue)
+        shuffle(blockList)
+        print(blockList)
+    
     (score2, rew2) = taskLoop(set,nBlocks, whichVersion, globalClock, experimentStructure, outcomeStructure, stimuliStructure, data,
     feedbackText, nTrials, tracker, blockList, expInfo, conditionName, targetWord)
     
@@ -483,42 +639,40 @@ elif session == 3:
     mainText = "Vielen Dank für Deine Teilnahme!"
     simpleInstructions(experimentStructure, header, 0.1, [0, 0.6], mainText, 0.08, [0, 0.0])
 
+# Frame timing of the session (summary rows per routine in filename_frames.csv; e.g. for fMRI and EEG applications)
+frameMonitor.endSession()
+
 # Close window
 win.close()
 
+# Stop trigger listener
+if triggerListener != None:
+    triggerListener.stop()
+
+# Stop keyboard reader
+if keyboard != None:
+    keyboard.stop()
+
+# Write remaining rows of trial log
+if streamTrialLog:
+    trialLog.close()
+
+# Typed columnar copy of the data (from the trial log, which also holds the rows before a resume)
+if columnarOutput:
+    if streamTrialLog:
+        writeTrialLogColumns(trialLog.path, filename + '_columns')
+    else:
+        writeColumns(filename + '_columns', thisExp.entries)
+
 # Deactivate eyetracker
 if useEyeTracker:
+    gazeSampler.stop()
     tracker.close()
 
-# Plot dropped frames (this can be useful for fMRI and EEG applications)
-intervalsMS = pylab.array(win.frameIntervals)*1000
-m=pylab.mean(intervalsMS)
-sd=pylab.std(intervalsMS)
-distString= "Mean=%.1fms, s.d.=%.2f, 99%%CI(frame)=%.2f-%.2f" %(m,sd,m-2.58*sd,m+2.58*sd)
-nTotal=len(intervalsMS)
-nDropped=sum(intervalsMS>(1.5*m))
-
-if nDropped >= 1:
-    droppedString = "Dropped/Frames = %i/%i = %.3f%%" %(nDropped,nTotal, 100*nDropped/float(nTotal))
-
-    # Plot the frameintervals
-    pylab.figure(figsize=[12,8])
-    pylab.subplot(1,2,1)
-    pylab.plot(intervalsMS, '-')
-    pylab.ylabel('t (ms)')
-    pylab.xlabel('frame N')
-    pylab.title(droppedString)
-
-    # Plot histogram of the frameintervals
-    pylab.subplot(1,2,2)
-    pylab.hist(intervalsMS, 50, normed=0, histtype='stepfilled')
-    pylab.xlabel('t (ms)')
-    pylab.ylabel('n frames')
-    pylab.title(distString)
-    pylab.show()
-
-else:
-    print('No dropped frames')
+# Usage of stimulus pool
+poolStats = stimulusPool(win).stats()
+print('stimulus pool: %d hits, %d misses, %d stimuli, %d decoded images (%.1f MB)' %(poolStats['hits'],
+poolStats['misses'], poolStats['stims'], poolStats['images'], poolStats['textureBytes']/1e6))
 
 # end task
 core.quit()
@@ -0,0 +1,225 @@
+import os
+from blockCache import replaceFile
+from collections import OrderedDict
+import numpy as np
+
+# Precomputed Gabor-patch textures
+#
+# Instead of setting the opacity of the two Gabor-patches on every trial, the
+# grating of each opacity is built once as a NumPy texture (opacity baked into
+# the luminance, which is equivalent to alpha blending on the mid-grey
+# background of the task). The grating is constant along its bars, so a
+# texture is one row scaled by the opacity and tiled. Only the unit row is
+# stored on disk (one small file per sf, size and texRes; the contrasts of the
+# blocks are continuous, so textures per contrast would fill the disk), and
+# the GPU stimuli that hold the textures are built on first use and kept in a
+# bounded LRU cache. A trial then only selects prebuilt stimuli and sets their
+# positions.
+
+
+def gaborRow(sf, size, texRes):
+    """ This function synthesizes one row of the grating of a Gabor-patch with unit contrast
+
+    Input:
+        sf: spatial frequency in cycles per unit
+        size: size of patch in units
+        texRes: resolution of texture (power of two)
+
+    Return:
+        row: array of texRes values in [-1, 1]
+    """
+
+    cycles = sf * size
+    phase = (np.arange(texRes) / float(texRes) - 0.5) * cycles
+    return np.sin(2*np.pi*phase).astype(np.float32)
+
+
+def gaborTexture(sf, size, texRes, contrast, row=None):
+    """ This function synthesizes the grating of a Gabor-patch
+
+    The raisedCos mask is not part of the texture (it is applied by the stimulus).
+
+    Input:
+        sf: spatial frequency in cycles per unit
+        size: size of patch in units
+        texRes: resolution of texture (power of two)
+        contrast: contrast (opacity) of patch
+        row: unit row as returned by gaborRow (None = synthesized)
+
+    Return:
+        texture: texRes x texRes array with values in [-contrast, contrast]
+    """
+
+    if row is None:
+        row = gaborRow(sf, size, texRes)
+    return np.tile(np.float32(contrast) * row, (texRes, 1))
+
+
+def textureKey(sf, size, texRes):
+    """ This function returns the cache key of the unit row of a grating
+
+    Input:
+        sf: spatial frequency in cycles per unit
+        size: size of patch in units
+        texRes: resolution of texture
+
+    Return:
+        key: file name of the row in the on-disk cache
+    """
+
+    return 'gabor_sf%g_size%g_res%d.npy' % (sf, size, texRes)
+
+
+class TextureStore(object):
+    """ This class returns Gabor textures from the unit row (kept in memory and in the on-disk cache)
+
+    Input:
+        sf: spatial frequency in cycles per unit
+        size: size of patch in units
+        texRes: resolution of texture
+        cacheDir: directory of on-disk cache (None = memory only)
+    """
+
+    def __init__(self, sf, size, texRes, cacheDir=None):
+        self.sf = sf
+        self.size = size
+        self.texRes = texRes
+        self.cacheDir = cacheDir
+        self.row = None
+        self.nSynthesized = 0
+        self.nLoaded = 0
+        if cacheDir is not None and not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir)
+
+    def unitRow(self):
+        """ This function returns the unit row of the grating (loaded or synthesized once)
+
+        Return:
+            row: array of texRes values in [-1, 1]
+        """
+
+        if self.row is not None:
+            return self.row
+        path = None if self.cacheDir is None else os.path.join(self.cacheDir, textureKey(self.sf, self.size, self.texRes))
+        if path is not None and os.path.exists(path):
+            self.row = np.load(path)
+            self.nLoaded = self.nLoaded + 1
+        else:
+            self.row = gaborRow(self.sf, self.size, self.texRes)
+            self.nSynthesized = self.nSynthesized + 1
+            if path is not None:
+                tmpPath = path + '.%d.tmp.npy' % os.getpid()
+                np.save(tmpPath, self.row)
+                replaceFile(tmpPath, path)
+        return self.row
+
+    def get(self, contrast):
+        """ This function returns the texture of a contrast
+
+        Input:
+            contrast: contrast (opacity) of patch
+
+        Return:
+            texture: texRes x texRes array
+        """
+
+        return gaborTexture(self.sf, self.size, self.texRes, contrast, self.unitRow())
+
+
+class GaborCache(object):
+    """ This class keeps prebuilt Gabor-patch stimuli in a bounded LRU cache
+
+    Stimuli are keyed by (patch, opacity), so that both patches of a trial are
+    separate stimuli even if they have the same opacity. Stimuli are built
+    when a trial first needs them.
+
+    Input:
+        win: window object instance
+        sf: spatial frequency in cycles per cm
+        size: size of patch in cm
+        texRes: resolution of texture
+        capacity: maximal number of stimuli (GPU textures) that are kept
+        cacheDir: directory of on-disk texture cache (None = memory only)
+        meanOpacity: mean opacity of both patches
+    """
+
+    def __init__(self, win, sf=0.4, size=10, texRes=512, capacity=64, cacheDir=None, meanOpacity=0.5):
+        self.win = win
+        self.size = size
+        self.texRes = texRes
+        self.capacity = capacity
+        self.meanOpacity = meanOpacity
+        self.store = TextureStore(sf, size, texRes, cacheDir)
+        self.stims = OrderedDict()
+        self.nHits = 0
+        self.nMisses = 0
+
+    def opacities(self, contrast):
+        """ This function returns the opacities of both patches
+
+        Input:
+            contrast: contrast difference of current trial
+
+        Return:
+            opacityPatch1: opacity of first patch
+            opacityPatch2: opacity of second patch
+        """
+
+        return (self.meanOpacity + contrast/2), (self.meanOpacity - contrast/2)
+
+    def stim(self, patch, opacity):
+        """ This function returns the stimulus of a patch with baked-in opacity
+
+        Input:
+            patch: 1 = first patch; 2 = second patch
+            opacity: opacity of patch
+
+        Return:
+            stim: GratingStim with prebuilt texture
+        """
+
+        key = (patch, round(opacity, 6))
+        stim = self.stims.pop(key, None)
+        if stim is None:
+            self.nMisses = self.nMisses + 1
+            from psychopy import visual
+            stim = visual.GratingStim(win=self.win, name='patch%d' % patch, units='cm',
+                tex=self.store.get(key[1]), mask='raisedCos',
+                ori=0, pos=[0,0], size=self.size, sf=1.0/self.size, phase=0.0,
+                color=[1,1,1], colorSpace='rgb', opacity=1.0,
+                texRes=self.texRes, interpolate=True, depth=-1.0)
+            while len(self.stims) >= self.capacity:
+                self.stims.popitem(last=False)  # least recently used stimulus releases its texture
+        else:
+            self.nHits = self.nHits + 1
+        self.stims[key] = stim
+        return stim
+
+    def patchPair(self, contrast):
+        """ This function returns both patches of a trial
+
+        Input:
+            contrast: contrast difference of current trial
+
+        Return:
+            patch1: stimulus of first patch
+            patch2: stimulus of second patch
+        """
+
+        (opacityPatch1, opacityPatch2) = self.opacities(contrast)
+        return self.stim(1, opacityPatch1), self.stim(2, opacityPatch2)
+
+    def prepareBlock(self, records):
+        """ This function prepares the cache for a block
+
+        Only the unit row of the grating is loaded here; the stimuli of a trial
+        are built on first use (before the fixation cross of the trial), so
+        that the start of the block is not delayed.
+
+        Input:
+            records: compiled trial records of the block
+        """
+
+        self.store.unitRow()
+        self.nHits = 0
+        self.nMisses = 0
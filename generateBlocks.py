@@ -0,0 +1,304 @@
+from __future__ import division
+import os
+import sys
+import zipfile
+import numpy as np
+from multiprocessing import Pool
+from xml.sax.saxutils import escape
+from blockCache import blockDtype, writeBlockCache
+
+# Generator for new participant sets of block files
+#
+# A set consists of the perceptual decision blocks (pract_PD, main_PD) and
+# the bandit blocks (pract_safe, pract_unc, main_safe, main_unc) for both
+# contingencies. In leftBlue blocks the blue fractal is rewarded when the
+# target patch is on the left and the red fractal when it is on the right;
+# rightBlue blocks use the reverse mapping. The correct fractal is rewarded
+# with probability pReward, otherwise the other fractal is rewarded.
+#
+# All blocks of a set are drawn at once with a generator that is seeded with
+# the pair (base seed, set number), so that the streams of different sets and
+# base seeds do not overlap. Sets are generated in parallel and written to the
+# block cache format and/or the legacy .xlsx layout. Generated sets are kept
+# in blockFiles/generated, apart from the sets of the participants, and
+# existing sets are never overwritten.
+
+maxContrast = 0.08  # maximum contrast difference (PU) of the uncertainty condition
+pReward = 0.8       # reward probability of the correct fractal
+
+# (phase, contingency, file name, number of trials, contrast condition)
+setLayout = [('pract_PD', None, 'GB_runPatches1.xlsx', 100, 'unc'),
+             ('pract_PD', None, 'GB_runPatches2.xlsx', 100, 'unc'),
+             ('pract_safe', 'leftBlue', 'GB_LB_1.xlsx', 25, 'safe'),
+             ('pract_safe', 'rightBlue', 'GB_RB_1.xlsx', 25, 'safe'),
+             ('pract_unc', 'leftBlue', 'GB_LB_1.xlsx', 25, 'unc'),
+             ('pract_unc', 'rightBlue', 'GB_RB_1.xlsx', 25, 'unc'),
+             ('main_PD', None, 'GB_runPatches1.xlsx', 100, 'unc')]
+setLayout += [('main_safe', 'leftBlue', 'GB_LB_%d.xlsx' % (i + 1), 25, 'safe') for i in range(3)]
+setLayout += [('main_safe', 'rightBlue', 'GB_RB_%d.xlsx' % (i + 1), 25, 'safe') for i in range(3)]
+setLayout += [('main_unc', 'leftBlue', 'GB_LB_%d.xlsx' % (i + 1), 25, 'unc') for i in range(6)]
+setLayout += [('main_unc', 'rightBlue', 'GB_RB_%d.xlsx' % (i + 1), 25, 'unc') for i in range(6)]
+
+# Column order of the legacy .xlsx files
+banditColumns = ['PU', 'targetPatch', 'redFractal', 'corrAns', 'outcomes']
+patchesColumns = ['targetPatch', 'PU', 'corrAns', 'redFractal', 'outcomes']
+
+
+def balancedSides(rng, nBlocks, nRows):
+    """ This function draws target patch sides that are balanced within each block
+
+    Input:
+        rng: random number generator
+        nBlocks: number of blocks
+        nRows: number of trials per block
+
+    Return:
+        left: boolean array (nBlocks x nRows), True if target patch is on the left
+    """
+
+    # Half of the trials are left (the extra trial of odd blocks is random)
+    nLeft = nRows // 2 + (rng.random_sample(nBlocks) < (nRows % 2) / 2.0)
+    order = np.argsort(rng.random_sample((nBlocks, nRows)), axis=1)
+    return order < nLeft[:, np.newaxis]
+
+
+def generateSet(setNumber, seed):
+    """ This function generates all blocks of a participant set
+
+    Input:
+        setNumber: number of the set
+        seed: base seed (the generator is seeded with base seed and set number)
+
+    Return:
+        blocks: list of (phase, contingency, file name, structured array with blockDtype)
+    """
+
+    rng = np.random.RandomState([seed, setNumber])
+
+    patchesRows = [x for x in setLayout if x[0].endswith('_PD')]
+    banditRows = [x for x in setLayout if not x[0].endswith('_PD')]
+    nPatches = patchesRows[0][3]
+    nBandit = banditRows[0][3]
+
+    # Perceptual decision blocks: contrast differences and sides only
+    patches = np.zeros((len(patchesRows), nPatches), dtype=blockDtype)
+    patches['PU'] = rng.uniform(0, maxContrast, patches.shape)
+    patches['targetPatch'] = np.where(balancedSides(rng, len(patchesRows), nPatches), 'left', 'right')
+    patches['redFractal'] = '0'
+    patches['corrAns'] = '0'
+
+    # Bandit blocks: contrast, sides, fractal positions, correct answers and outcomes
+    safe = np.array([x[4] == 'safe' for x in banditRows])[:, np.newaxis]
+    leftBlue = np.array([x[1] == 'leftBlue' for x in banditRows])[:, np.newaxis]
+    bandit = np.zeros((len(banditRows), nBandit), dtype=blockDtype)
+    bandit['PU'] = np.where(safe, maxContrast, rng.uniform(0, maxContrast, bandit.shape))
+    left = balancedSides(rng, len(banditRows), nBandit)
+    redUp = rng.random_sample(bandit.shape) < 0.5
+    blueCorrect = left == leftBlue
+    bandit['targetPatch'] = np.where(left, 'left', 'right')
+    bandit['redFractal'] = np.where(redUp, 'up', 'down')
+    bandit['corrAns'] = np.where(blueCorrect != redUp, 'up', 'down')
+    bandit['outcomes'] = rng.random_sample(bandit.shape) < pReward
+
+    blocks = []
+    for i, row in enumerate(patchesRows):
+        blocks.append((row[0], row[1], row[2], patches[i]))
+    for i, row in enumerate(banditRows):
+        blocks.append((row[0], row[1], row[2], bandit[i]))
+    return blocks
+
+
+def blockPath(blockDir, setNumber, phase, contingency, fileName):
+    """ This function returns the path of a block file within a set
+
+    Input:
+        blockDir: directory that contains the set_* folders
+        setNumber: number of the set
+        phase: task phase
+        contingency: leftBlue, rightBlue or None
+        fileName: name of block file
+
+    Return:
+        path: path to block file
+    """
+
+    parts = [blockDir, 'set_%d' % setNumber, phase]
+    if contingency is not None:
+        parts.append(contingency)
+    parts.append(fileName)
+    return '/'.join(parts)
+
+
+def writeXlsx(path, columns, rows):
+    """ This function writes a block in the legacy .xlsx layout
+
+    As in the existing block files, all cells are stored as shared strings.
+
+    Input:
+        path: path to .xlsx file
+        columns: column names
+        rows: list of rows (lists of strings)
+
+    Return: ~
+    """
+
+    sharedStrings = []
+    stringIndex = {}
+    sheetRows = []
+    for r, row in enumerate([columns] + rows):
+        cells = []
+        for c, value in enumerate(row):
+            if value not in stringIndex:
+                stringIndex[value] = len(sharedStrings)
+                sharedStrings.append(value)
+            cells.append('<c r="%s%d" t="s"><v>%d</v></c>' % (chr(65 + c), r + 1, stringIndex[value]))
+        sheetRows.append('<row r="%d">%s</row>' % (r + 1, ''.join(cells)))
+
+    main = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+    rel = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+    header = '<?xml version="1.0" encoding="UTF-8"?>\n'
+    files = {}
+    files['[Content_Types].xml'] = (header +
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>')
+    files['_rels/.rels'] = (header +
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="%s/officeDocument" Target="xl/workbook.xml"/></Relationships>' % rel)
+    files['xl/workbook.xml'] = (header +
+        '<workbook xmlns="%s" xmlns:r="%s"><sheets><sheet name="Sheet1" r:id="rId3" sheetId="1"/></sheets></workbook>' % (main, rel))
+    files['xl/_rels/workbook.xml.rels'] = (header +
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="%s/sharedStrings" Target="sharedStrings.xml"/>'
+        '<Relationship Id="rId2" Type="%s/styles" Target="styles.xml"/>'
+        '<Relationship Id="rId3" Type="%s/worksheet" Target="worksheets/sheet1.xml"/></Relationships>' % (rel, rel, rel))
+    files['xl/styles.xml'] = (header +
+        '<styleSheet xmlns="%s"><fonts count="1"><font><sz val="11.0"/><name val="Calibri"/></font></fonts>'
+        '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs></styleSheet>' % main)
+    files['xl/sharedStrings.xml'] = (header +
+        '<sst xmlns="%s" count="%d" uniqueCount="%d">%s</sst>' % (main, sum(len(x) for x in rows) + len(columns),
+        len(sharedStrings), ''.join('<si><t>%s</t></si>' % escape(x) for x in sharedStrings)))
+    files['xl/worksheets/sheet1.xml'] = (header +
+        '<worksheet xmlns="%s"><sheetData>%s</sheetData></worksheet>' % (main, ''.join(sheetRows)))
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    archive = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+    try:
+        for name in sorted(files):
+            archive.writestr(name, files[name])
+    finally:
+        archive.close()
+
+
+def blockToRows(block, columns):
+    """ This function converts a generated block into rows of strings
+
+    Input:
+        block: structured array with blockDtype
+        columns: column order of the .xlsx file
+
+    Return:
+        rows: list of rows (lists of strings)
+    """
+
+    strings = {'PU': [repr(float(x)) for x in block['PU']],
+               'targetPatch': block['targetPatch'].tolist(),
+               'redFractal': block['redFractal'].tolist(),
+               'corrAns': block['corrAns'].tolist(),
+               'outcomes': [str(x) for x in block['outcomes'].tolist()]}
+    return [list(x) for x in zip(*[strings[name] for name in columns])]
+
+
+def generateSetJob(args):
+    """ This function generates a set and writes .xlsx files if requested (process pool worker)
+
+    Input:
+        args: tuple of set number, seed, block directory and xlsx flag
+
+    Return:
+        setNumber: number of the set
+        blocks: list of (phase, contingency, file name, structured array with blockDtype)
+    """
+
+    (setNumber, seed, blockDir, writeLegacy) = args
+    blocks = generateSet(setNumber, seed)
+    if writeLegacy:
+        for (phase, contingency, fileName, block) in blocks:
+            if phase.endswith('_PD'):
+                columns = patchesColumns
+            else:
+                columns = banditColumns
+            writeXlsx(blockPath(blockDir, setNumber, phase, contingency, fileName), columns, blockToRows(block, columns))
+    return setNumber, blocks
+
+
+def generateSets(setNumbers, seed=0, blockDir='blockFiles/generated', cacheDir=None, writeLegacy=False, nProcesses=None):
+    """ This function generates participant sets in parallel
+
+    Input:
+        setNumbers: numbers of the sets that should be generated
+        seed: base seed (each set is seeded with base seed and set number)
+        blockDir: directory of the set_* folders (used for .xlsx files and block keys)
+        cacheDir: directory of the block cache that is written (None: no cache)
+        writeLegacy: indicates if .xlsx files should be written
+        nProcesses: number of worker processes (None: all cores; 1: no pool)
+
+    Return:
+        index: block cache index of the generated sets
+    """
+
+    # Existing sets (e.g. the sets of the participants) are not overwritten
+    if writeLegacy:
+        existing = [x for x in setNumbers if os.path.exists(os.path.join(blockDir, 'set_%d' % x))]
+        if len(existing) > 0:
+            raise ValueError('Sets %s already exist in %s' % (', '.join(str(x) for x in existing), blockDir))
+
+    jobs = [(setNumber, seed, blockDir, writeLegacy) for setNumber in setNumbers]
+    if nProcesses == 1:
+        results = [generateSetJob(x) for x in jobs]
+    else:
+        pool = Pool(nProcesses)
+        try:
+            results = pool.map(generateSetJob, jobs, chunksize=max(1, len(jobs) // 64))
+        finally:
+            pool.close()
+            pool.join()
+
+    # Generated blocks have no source workbook, so mtime and hash are empty
+    blocks = []
+    index = {}
+    offset = 0
+    for (setNumber, setBlocks) in results:
+        for (phase, contingency, fileName, block) in setBlocks:
+            key = blockPath(blockDir, setNumber, phase, contingency, fileName)
+            index[key] = {'offset': offset, 'nRows': len(block), 'mtime': None, 'sha1': None}
+            blocks.append(block)
+            offset = offset + len(block)
+    if cacheDir is not None:
+        writeBlockCache(cacheDir, blocks, index)
+    return index
+
+
+if __name__ == '__main__':
+
+    # Usage: python generateBlocks.py firstSet lastSet [blockDir] [--xlsx]
+    writeLegacy = '--xlsx' in sys.argv
+    args = [x for x in sys.argv[1:] if x != '--xlsx']
+    firstSet, lastSet = int(args[0]), int(args[1])
+    if len(args) > 2:
+        blockDir = args[2]
+    else:
+        blockDir = 'blockFiles/generated'
+    cacheDir = os.path.join(blockDir, 'cache')
+    index = generateSets(range(firstSet, lastSet + 1), blockDir=blockDir, cacheDir=cacheDir, writeLegacy=writeLegacy)
+    print('%d blocks written to %s' % (len(index), cacheDir))
@@ -0,0 +1,330 @@
+import sys
+import types
+import numpy as np
+
+# Headless null-window backend
+#
+# The backend replaces the PsychoPy window, stimuli, clocks and keyboard with
+# objects that run against a virtual clock. Every flip advances the virtual
+# time by one simulated refresh (optionally with jitter or dropped frames),
+# so the frame loops of the task run as fast as Python allows and a session
+# does not need a display. install() must be called before the window is
+# created; key presses are pushed into the virtual keyboard.
+
+NOT_STARTED = 0
+
+
+class VirtualTime(object):
+    """ This class holds the simulated time of the process in seconds """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def getTime(self):
+        return self.now
+
+    def advance(self, duration):
+        self.now = self.now + duration
+
+    def wait(self, secs, hogCPUperiod=0.2):
+        self.advance(max(0.0, secs))
+
+
+virtualTime = VirtualTime()
+
+
+class VirtualClock(object):
+    """ This class is a clock on the virtual time (interface of core.Clock) """
+
+    def __init__(self):
+        self._timeAtLastReset = virtualTime.now
+
+    def getTime(self):
+        return virtualTime.now - self._timeAtLastReset
+
+    def reset(self, newT=0.0):
+        self._timeAtLastReset = virtualTime.now + newT
+
+    def add(self, t):
+        self._timeAtLastReset = self._timeAtLastReset + t
+
+
+class VirtualCountdownTimer(VirtualClock):
+    """ This class is a countdown timer on the virtual time (interface of core.CountdownTimer)
+
+    Input:
+        start: initial value of the countdown in seconds
+    """
+
+    def __init__(self, start=0):
+        self._timeAtLastReset = virtualTime.now + start
+
+    def getTime(self):
+        return self._timeAtLastReset - virtualTime.now
+
+    def reset(self, t=0.0):
+        self._timeAtLastReset = virtualTime.now + t
+
+
+class NullStaticPeriod(object):
+    """ This class replaces core.StaticPeriod (the period passes in virtual time) """
+
+    def __init__(self, win=None, screenHz=None, name='StaticPeriod'):
+        self.win = win
+        self.name = name
+        self.endTime = None
+
+    def start(self, duration):
+        self.endTime = virtualTime.now + duration
+
+    def complete(self):
+        if self.endTime is not None and virtualTime.now < self.endTime:
+            virtualTime.now = self.endTime
+        return 1
+
+
+class NullWindow(object):
+    """ This class replaces visual.Window without drawing
+
+    Flips run the functions of callOnFlip, count the draws of autoDraw
+    stimuli, record frame intervals and advance the virtual time.
+
+    Input:
+        size: window size in pixels
+        refreshRate: simulated refresh rate in Hz
+        jitter: standard deviation of flip timing noise in seconds
+        dropRate: probability that a flip misses its refresh (frame is shown one refresh late)
+        seed: seed of the random number generator of jitter and dropped frames
+        params: other Window parameters (ignored)
+    """
+
+    def __init__(self, size=(1280, 1024), refreshRate=60.0, jitter=0.0, dropRate=0.0, seed=None, units='norm',
+                 color=(0, 0, 0), colorSpace='rgb', **params):
+        self.size = np.array(size)
+        self.units = units
+        self.color = color
+        self.colorSpace = colorSpace
+        self.refreshRate = refreshRate
+        self.monitorFramePeriod = 1.0 / refreshRate
+        self._refreshThreshold = 1.2 / refreshRate
+        self.jitter = jitter
+        self.dropRate = dropRate
+        self.randomState = np.random.RandomState(seed)
+        self.recordFrameIntervals = False
+        self.frameIntervals = []
+        self.nDroppedFrames = 0
+        self.frameN = 0
+        self.mouseVisible = False
+        self._toDraw = []
+        self._toCall = []
+        self.vsyncTime = virtualTime.now
+        self.lastFrameT = virtualTime.now
+
+    def flip(self, clearBuffer=True):
+        """ This function ends the current frame and advances the virtual time to the next refresh
+
+        Return:
+            flipTime: virtual time of the flip
+        """
+
+        for stim in self._toDraw:
+            stim.draw()
+        for (function, args, kwargs) in self._toCall:
+            function(*args, **kwargs)
+        self._toCall = []
+
+        # Next refresh (one refresh later if the frame is dropped)
+        self.vsyncTime = max(self.vsyncTime, virtualTime.now) + self.monitorFramePeriod
+        if self.dropRate > 0 and self.randomState.random_sample() < self.dropRate:
+            self.vsyncTime = self.vsyncTime + self.monitorFramePeriod
+        flipTime = self.vsyncTime
+        if self.jitter > 0:
+            flipTime = flipTime + abs(self.randomState.normal(0, self.jitter))
+        virtualTime.now = flipTime
+
+        if self.recordFrameIntervals:
+            interval = flipTime - self.lastFrameT
+            self.frameIntervals.append(interval)
+            if interval > self._refreshThreshold:
+                self.nDroppedFrames = self.nDroppedFrames + 1
+        self.lastFrameT = flipTime
+        self.frameN = self.frameN + 1
+        return flipTime
+
+    def setRecordFrameIntervals(self, value=True):
+        self.recordFrameIntervals = value
+        self.lastFrameT = virtualTime.now
+
+    def callOnFlip(self, function, *args, **kwargs):
+        self._toCall.append((function, args, kwargs))
+
+    def getActualFrameRate(self, nIdentical=10, nMaxFrames=100, nWarmUpFrames=10, threshold=1):
+        return self.refreshRate
+
+    def clearBuffer(self):
+        pass
+
+    def setMouseVisible(self, visibility):
+        self.mouseVisible = visibility
+
+    def logOnFlip(self, msg, level, obj=None):
+        pass
+
+    def close(self):
+        self._toDraw = []
+
+
+class NullStim(object):
+    """ This class replaces the visual stimuli (TextStim, ImageStim, GratingStim, BufferImageStim)
+
+    All parameters are stored as attributes, and set* methods (setPos,
+    setText, setOpacity, ...) set the corresponding attribute.
+
+    Input:
+        win: window object instance
+        params: stimulus parameters
+    """
+
+    def __init__(self, win=None, **params):
+        self.win = win
+        self.name = params.pop('name', '')
+        self.pos = params.pop('pos', (0, 0))
+        self.opacity = params.pop('opacity', 1.0)
+        self.__dict__.update(params)
+        self.autoDraw = False
+        self.status = NOT_STARTED
+        self.nDraws = 0
+
+    def __getattr__(self, name):
+        if name.startswith('set') and len(name) > 3:
+            attribute = name[3].lower() + name[4:]
+
+            def setter(value, *args, **kwargs):
+                setattr(self, attribute, value)
+            return setter
+        raise AttributeError(name)
+
+    def setAutoDraw(self, value, log=None):
+        toDraw = self.win._toDraw
+        if value and self not in toDraw:
+            toDraw.append(self)
+        elif not value and self in toDraw:
+            toDraw.remove(self)
+        self.autoDraw = value
+
+    def draw(self, win=None):
+        self.nDraws = self.nDraws + 1
+
+
+class VirtualKeyboard(object):
+    """ This class replaces the keyboard functions of psychopy.event
+
+    Key presses are scheduled at virtual times and become visible to
+    getKeys once the virtual time has reached them.
+    """
+
+    def __init__(self):
+        self.pressed = []
+
+    def press(self, key, t=None):
+        """ This function schedules a key press
+
+        Input:
+            key: key name
+            t: virtual time of the key press (None = now)
+        """
+
+        self.pressed.append((key, virtualTime.now if t is None else t))
+
+    def getKeys(self, keyList=None, timeStamped=False, modifiers=False):
+        now = virtualTime.now
+        keys = []
+        remaining = []
+        for (key, t) in self.pressed:
+            if t <= now and (keyList is None or key in keyList):
+                keys.append((key, t))
+            else:
+                remaining.append((key, t))
+        self.pressed = remaining
+        keys.sort(key=lambda keyEvent: keyEvent[1])
+        if timeStamped:
+            if hasattr(timeStamped, 'getTime'):
+                offset = virtualTime.now - timeStamped.getTime()
+                return [[key, t - offset] for (key, t) in keys]
+            return [[key, t] for (key, t) in keys]
+        return [key for (key, t) in keys]
+
+    def clearEvents(self, eventType=None):
+        now = virtualTime.now
+        self.pressed = [(key, t) for (key, t) in self.pressed if t > now]
+
+
+class NullKeyResponse(object):
+    """ This class replaces event.BuilderKeyResponse (its clock runs on the virtual time) """
+
+    def __init__(self):
+        self.status = NOT_STARTED
+        self.keys = []
+        self.rt = []
+        self.clock = VirtualClock()
+
+
+keyboard = VirtualKeyboard()
+
+
+def psychopyModule(name):
+    """ This function returns a PsychoPy module (a null module if it cannot be imported without display)
+
+    Input:
+        name: name of module (e.g. 'visual')
+
+    Return:
+        module: module object that is patched by install
+    """
+
+    fullName = 'psychopy.' + name
+    try:
+        __import__(fullName)
+        return sys.modules[fullName]
+    except Exception:  # e.g. no display for pyglet
+        import psychopy
+        module = types.ModuleType(fullName)
+        sys.modules[fullName] = module
+        setattr(psychopy, name, module)
+        return module
+
+
+def install(refreshRate=60.0, jitter=0.0, dropRate=0.0, seed=None):
+    """ This function replaces window, stimuli, clocks and keyboard of PsychoPy by the headless backend
+
+    Input:
+        refreshRate: simulated refresh rate in Hz
+        jitter: standard deviation of flip timing noise in seconds
+        dropRate: probability of a dropped frame per flip
+        seed: seed of the random number generator of jitter and dropped frames
+
+    Return:
+        keyboard: virtual keyboard (key presses are pushed with keyboard.press)
+    """
+
+    def Window(*args, **params):
+        params.pop('fullscr', None)
+        return NullWindow(refreshRate=refreshRate, jitter=jitter, dropRate=dropRate, seed=seed, **params)
+
+    visual = psychopyModule('visual')
+    visual.Window = Window
+    for stimType in ('TextStim', 'ImageStim', 'GratingStim', 'BufferImageStim', 'ShapeStim', 'Rect'):
+        setattr(visual, stimType, NullStim)
+
+    core = psychopyModule('core')
+    core.Clock = VirtualClock
+    core.CountdownTimer = VirtualCountdownTimer
+    core.StaticPeriod = NullStaticPeriod
+    core.getTime = virtualTime.getTime
+    core.wait = virtualTime.wait
+
+    event = psychopyModule('event')
+    event.getKeys = keyboard.getKeys
+    event.clearEvents = keyboard.clearEvents
+    event.BuilderKeyResponse = NullKeyResponse
+    return keyboard
@@ -0,0 +1,309 @@
+from __future__ import division
+import os
+import sys
+import csv
+import json
+import sqlite3
+from multiprocessing import Pool
+from blockCache import hashFile
+
+# Ingest of the task output into one analysis store
+#
+# The data files below data/ (training, main, GB_dspan) are parsed in parallel
+# by a process pool and appended to a single SQLite database. Columns that all
+# analyses use are normalized into typed columns (keys without list brackets,
+# empty or 'nan' values as NULL, integer counters as INTEGER); all other
+# non-empty values of a row are kept as JSON in the column 'extra'. Rows are
+# indexed by participant, session, condition (name of the trial loop) and block.
+#
+# Every ingested file is recorded with mtime, size and content hash. Files
+# with unchanged mtime and size are skipped without reading them; a changed
+# file with the same hash only updates its mtime, otherwise its rows are
+# replaced. Trial logs (_trials.jsonl) are only ingested if the session has
+# no .csv file (e.g. the session was interrupted). A resumed session appends
+# its rows to the log of the interrupted session but writes its own .csv file
+# (with a new date). Rows of a log after the resume are therefore only kept if
+# no .csv file of the same participant and session was ingested.
+#
+# As in blockManifest.py, the process pool should be started from the command
+# line (python ingestData.py), because on Windows every worker process
+# re-imports the main script.
+
+# (store column, data column, type)
+normalizedColumns = [('participant', 'participant', 'text'), ('session', 'session', 'integer'),
+                     ('condition', None, 'text'), ('block', 'block', 'text'),
+                     ('blockNumber', 'blockNumber', 'integer'), ('whichLoop', 'whichLoop', 'text'),
+                     ('trialIndex', 'trialIndex', 'integer'), ('repeat', 'repeat', 'integer'),
+                     ('missIndex', 'missIndex', 'integer'), ('givenUp', 'givenUp', 'integer'),
+                     ('decision1_keys', 'decision1.keys', 'key'), ('decision1_corr', 'decision1.corr', 'real'),
+                     ('decision1_rt', 'decision1.rt', 'real'), ('decision2_keys', 'decision2.keys', 'key'),
+                     ('decision2_corr', 'decision2.corr', 'real'), ('decision2_rt', 'decision2.rt', 'real'),
+                     ('decision2_color', 'decision2.color', 'text'), ('decision2_reward', 'decision2.reward', 'real'),
+                     ('decision1_trigger_1', 'decision1.trigger_1', 'real'), ('decision1_trigger_2', 'decision1.trigger_2', 'real'),
+                     ('decision2_trigger_1', 'decision2.trigger_1', 'real'), ('decision2_trigger_2', 'decision2.trigger_2', 'real'),
+                     ('feedback_trigger_1', 'feedback.trigger_1', 'real'), ('feedback_trigger_2', 'feedback.trigger_2', 'real'),
+                     ('contrast', 'contrast', 'real')]
+sqlTypes = {'text': 'TEXT', 'key': 'TEXT', 'integer': 'INTEGER', 'real': 'REAL'}
+missingValues = ('', 'nan', 'NaN', 'None', '[]')
+
+
+def normalizeValue(value, valueType):
+    """ This function converts a data value into the type of a store column
+
+    Input:
+        value: value of data file (text in .csv files)
+        valueType: 'text', 'key', 'integer' or 'real'
+
+    Return:
+        value: normalized value (None if missing)
+    """
+
+    if value is None:
+        return None
+    if isinstance(value, list):
+        value = value[0] if len(value) == 1 else json.dumps(value)
+    if not isinstance(value, (int, float)):
+        value = str(value).strip()
+        if valueType == 'key' and value.startswith('[') and value.endswith(']'):
+            value = value[1:-1].strip().strip('\'"')  # PsychoPy writes key lists as ['up']
+        if value in missingValues:
+            return None
+    try:
+        if valueType == 'integer':
+            return int(float(value))
+        if valueType == 'real':
+            value = float(value)
+            return None if value != value else value
+    except ValueError:
+        return None
+    if isinstance(value, float) and value != value:
+        return None
+    return str(value)
+
+
+def loopName(row):
+    """ This function returns the name of the trial loop of a row (condition)
+
+    Input:
+        row: dictionary of data columns
+
+    Return:
+        name: loop name (from the PsychoPy loop columns, whichLoop or dspanCond)
+    """
+
+    for name, value in row.items():
+        if name.endswith('.thisN') and value not in (None, ''):
+            return name[:-len('.thisN')]
+    for name in ('dspanCond', 'whichLoop'):
+        if row.get(name) not in (None, ''):
+            return str(row[name])
+    return None
+
+
+def normalizeRow(row):
+    """ This function converts a data row into a row of the store
+
+    Input:
+        row: dictionary of data columns
+
+    Return:
+        values: list of normalized values (in the order of normalizedColumns) and extra columns as JSON
+    """
+
+    values = []
+    used = set()
+    for (storeName, dataName, valueType) in normalizedColumns:
+        if dataName is None:
+            values.append(loopName(row))
+        else:
+            values.append(normalizeValue(row.get(dataName), valueType))
+            used.add(dataName)
+    extra = dict((name, value) for name, value in row.items()
+                 if name not in used and name != '' and value not in (None, ''))
+    values.append(json.dumps(extra, sort_keys=True, default=str))
+    return values
+
+
+def readRows(path):
+    """ This function reads the rows of a data file
+
+    Input:
+        path: path to .csv data file or trial log (_trials.jsonl)
+
+    Return:
+        rows: list of dictionaries of data columns
+        nOriginal: number of rows before the first resume of a trial log (all rows of a .csv file)
+    """
+
+    if path.endswith('.jsonl'):
+        from trialLog import readTrialLog
+        rows = []
+        nOriginal = None
+        for row in readTrialLog(path):
+            if 'resumed' in row and nOriginal is None:
+                nOriginal = len(rows)
+            elif 'checkpoint' not in row and 'resumed' not in row:
+                rows.append(row)
+        return rows, len(rows) if nOriginal is None else nOriginal
+    with open(path) as f:
+        rows = [row for row in csv.DictReader(f) if any(value not in (None, '') for value in row.values())]
+    return rows, len(rows)
+
+
+def parseFile(path):
+    """ This function hashes, reads and normalizes a data file (process pool worker)
+
+    Input:
+        path: path to data file
+
+    Return:
+        path: path to data file
+        sha1: content hash
+        rows: list of normalized rows (None if the file cannot be read)
+        nOriginal: number of rows before the first resume of a trial log
+    """
+
+    sha1 = hashFile(path)
+    try:
+        (rows, nOriginal) = readRows(path)
+        rows = [normalizeRow(row) for row in rows]
+    except (csv.Error, ValueError, UnicodeDecodeError) as error:
+        print('%s cannot be read: %s' % (path, error))
+        (rows, nOriginal) = (None, None)
+    return path, sha1, rows, nOriginal
+
+
+def findDataFiles(dataDir='data'):
+    """ This function finds the data files of all sessions
+
+    Input:
+        dataDir: directory of task output
+
+    Return:
+        paths: sorted list of .csv data files and of trial logs without .csv file
+    """
+
+    paths = []
+    for root, dirs, files in os.walk(dataDir):
+        for fileName in files:
+            path = os.path.join(root, fileName)
+            if fileName.endswith('_frames.csv') or fileName.endswith('_triggers.csv'):
+                continue  # frame timing summaries (frameMonitor.py) and TR pulse times (scannerTrigger.py)
+            elif fileName.endswith('.csv'):
+                paths.append(path)
+            elif fileName.endswith('_trials.jsonl') and not os.path.exists(path[:-len('_trials.jsonl')] + '.csv'):
+                paths.append(path)
+    return sorted(paths)
+
+
+def openStore(storeFile):
+    """ This function opens the analysis store (tables and indices are created if necessary)
+
+    Input:
+        storeFile: path of SQLite database
+
+    Return:
+        connection: sqlite3 connection
+    """
+
+    connection = sqlite3.connect(storeFile)
+    columns = ', '.join('%s %s' % (storeName, sqlTypes[valueType]) for (storeName, dataName, valueType) in normalizedColumns)
+    connection.execute('CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime REAL, size INTEGER, sha1 TEXT, nRows INTEGER)')
+    connection.execute('CREATE TABLE IF NOT EXISTS trials (file TEXT, row INTEGER, %s, extra TEXT)' % columns)
+    connection.execute('CREATE INDEX IF NOT EXISTS trialsKey ON trials (participant, session, condition, block)')
+    connection.execute('CREATE INDEX IF NOT EXISTS trialsFile ON trials (file)')
+    connection.commit()
+    return connection
+
+
+def ingestData(dataDir='data', storeFile=None, nProcesses=None):
+    """ This function adds new and changed data files to the analysis store
+
+    Input:
+        dataDir: directory of task output
+        storeFile: path of SQLite database (default: dataDir/analysis.sqlite)
+        nProcesses: number of worker processes (None: all cores; 1: no pool)
+
+    Return:
+        counts: dictionary with number of ingested, unchanged, touched (same hash) and unreadable files and ingested rows
+    """
+
+    if storeFile is None:
+        storeFile = os.path.join(dataDir, 'analysis.sqlite')
+    connection = openStore(storeFile)
+    known = dict((path, (mtime, size, sha1, nRows)) for (path, mtime, size, sha1, nRows) in
+                 connection.execute('SELECT path, mtime, size, sha1, nRows FROM files'))
+
+    # Files with unchanged mtime and size are not read (trial logs are read again if a .csv file
+    # changed, because it may belong to a session that was resumed from the log)
+    counts = {'ingested': 0, 'unchanged': 0, 'touched': 0, 'unreadable': 0, 'rows': 0}
+    candidates = []
+    stats = {}
+    paths = findDataFiles(dataDir)
+    for path in paths:
+        key = path.replace(os.sep, '/')
+        stats[key] = os.stat(path)
+        if not (key in known and known[key][:2] == (stats[key].st_mtime, stats[key].st_size)):
+            candidates.append(path)
+    if any(x.endswith('.csv') for x in candidates):
+        candidates.extend(x for x in paths if x.endswith('.jsonl') and x not in candidates)
+    counts['unchanged'] = len(paths) - len(candidates)
+
+    if nProcesses == 1 or len(candidates) < 2:
+        results = (parseFile(x) for x in candidates)
+        pool = None
+    else:
+        pool = Pool(nProcesses)
+        results = pool.imap_unordered(parseFile, candidates)
+
+    # Rows of a file are written in one transaction with its entry in the files table
+    placeholders = ', '.join(['?'] * (len(normalizedColumns) + 3))
+
+    def storeFileRows(key, sha1, rows):
+        fileStat = stats[key]
+        with connection:
+            if key in known and known[key][2] == sha1 and known[key][3] == len(rows):
+                connection.execute('UPDATE files SET mtime = ?, size = ? WHERE path = ?',
+                                   (fileStat.st_mtime, fileStat.st_size, key))
+                counts['touched'] = counts['touched'] + 1
+                return
+            connection.execute('DELETE FROM trials WHERE file = ?', (key,))
+            connection.executemany('INSERT INTO trials VALUES (%s)' % placeholders,
+                                   ([key, i] + values for i, values in enumerate(rows)))
+            connection.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)',
+                               (key, fileStat.st_mtime, fileStat.st_size, sha1, len(rows)))
+        counts['ingested'] = counts['ingested'] + 1
+        counts['rows'] = counts['rows'] + len(rows)
+
+    try:
+        logs = []
+        for (path, sha1, rows, nOriginal) in results:
+            if rows is None:
+                counts['unreadable'] = counts['unreadable'] + 1
+            elif path.endswith('.jsonl'):
+                logs.append((path, sha1, rows, nOriginal))
+            else:
+                storeFileRows(path.replace(os.sep, '/'), sha1, rows)
+
+        # Rows of resumed sessions are kept from their .csv file (key: participant and session)
+        csvSessions = set(connection.execute("SELECT DISTINCT participant, session FROM trials WHERE file LIKE '%.csv'"))
+        for (path, sha1, rows, nOriginal) in logs:
+            if nOriginal < len(rows) and (rows[nOriginal][0], rows[nOriginal][1]) in csvSessions:
+                rows = rows[:nOriginal]
+            storeFileRows(path.replace(os.sep, '/'), sha1, rows)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        connection.close()
+    return counts
+
+
+if __name__ == '__main__':
+
+    # Usage: python ingestData.py [dataDir] [storeFile]
+    dataDir = sys.argv[1] if len(sys.argv) > 1 else 'data'
+    storeFile = sys.argv[2] if len(sys.argv) > 2 else None
+    counts = ingestData(dataDir, storeFile)
+    print('%d files ingested (%d rows), %d unchanged, %d touched, %d unreadable' % (counts['ingested'], counts['rows'],
+          counts['unchanged'], counts['touched'], counts['unreadable']))
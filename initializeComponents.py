@@ -1,7 +1,9 @@
 from psychopy import visual, core
+from stimulusPool import stimulusPool
 import inspect
 
 # Collection of functions to initialize different task component objects
+# (fractals and example stimuli are shared through the stimulus pool of the window)
 
 def initializeFixationCross(win):
     """ This function initializes the fixation cross object
@@ -75,19 +77,20 @@ def initializeFractals(win, expInfo):
     """
     
     fractalClock = core.Clock()
-    fixation1 = visual.TextStim(win=win, ori=0, name='fixation1',
+    pool = stimulusPool(win)
+    fixation1 = pool.get('fractalFixation', visual.TextStim, win=win, ori=0, name='fixation1',
         text='+',    font='Arial',
         pos=[0, 0], height=0.1, wrapWidth=None,
         color='white', colorSpace='rgb', opacity=1,
         depth=0.0)
-    fractal1 = visual.ImageStim(win=win, name='fractal11',units='cm', 
-        image='blueFractal.jpg', mask=None,
+    fractal1 = pool.get('fractal1', visual.ImageStim, win=win, name='fractal11',units='cm', 
+        image=pool.image('blueFractal.jpg'), mask=None,
         ori=0, pos=[0,0], size=[9.6, 6],
         color=[1,1,1], colorSpace='rgb', opacity=1,
         flipHoriz=False, flipVert=False,
         texRes=128, interpolate=True, depth=-1.0)
-    fractal2 = visual.ImageStim(win=win, name='fractal22',units='cm', 
-        image='redFractal.jpg', mask=None,
+    fractal2 = pool.get('fractal2', visual.ImageStim, win=win, name='fractal22',units='cm', 
+        image=pool.image('redFractal.jpg'), mask=None,
         ori=0, pos=[0,0], size=[9.6, 6],
         color=[1,1,1], colorSpace='rgb', opacity=1,
         flipHoriz=False, flipVert=False,
@@ -160,20 +163,28 @@ def initializePatchesExample(win, exampleText, positionPatch1, positionPatch2):
         exampleText: exampleText object instance
     """
     patchExampleClock = core.Clock()
-    examplePatch1 = visual.GratingStim(win=win, name='examplePatch1',units='cm',
+    pool = stimulusPool(win)
+    examplePatch1 = pool.get('examplePatch1', visual.GratingStim, win=win, name='examplePatch1',units='cm',
         tex=u'sin', mask=u'raisedCos',
         ori=0, pos=positionPatch1, size=10, sf=0.4, phase=0.0,
         color=[1,1,1], colorSpace='rgb', opacity=0.7,
         texRes=512, interpolate=True, depth=-1.0)
-    examplePatch2 = visual.GratingStim(win=win, name='examplePatch2',units='cm',
+    examplePatch2 = pool.get('examplePatch2', visual.GratingStim, win=win, name='examplePatch2',units='cm',
         tex=u'sin', mask=u'raisedCos',
         ori=0, pos=positionPatch2, size=10, sf=0.4, phase=0.0,
         color=[1,1,1], colorSpace='rgb', opacity=0.5,
         texRes=512, interpolate=True, depth=-1.0)
-    exampleText = visual.TextStim(win=win, ori=0, name='mainText',
-        text=exampleText,font=u'Arial', pos=[0, 0.6], height=0.08,
+    text = exampleText
+    exampleText = pool.get('patchExampleText', visual.TextStim, win=win, ori=0, name='mainText',
+        text=text,font=u'Arial', pos=[0, 0.6], height=0.08,
         wrapWidth=1.5, color=u'white', colorSpace='rgb', opacity=1,
         depth=-4.0, units = "norm")
+    
+    # Pooled instances of earlier calls keep their previous positions and text
+    examplePatch1.setPos(positionPatch1)
+    examplePatch2.setPos(positionPatch2)
+    if exampleText.text != text:
+        exampleText.setText(text)
     return(patchExampleClock, examplePatch1, examplePatch2, exampleText)
         
 def initializeFractalsExample(win, fractalText):
@@ -191,28 +202,32 @@ def initializeFractalsExample(win, fractalText):
     """
     
     fractalExampleClock = core.Clock()
-    fixation1 = visual.TextStim(win=win, ori=0, name='fixation1',
+    pool = stimulusPool(win)
+    fixation1 = pool.get('fractalFixation', visual.TextStim, win=win, ori=0, name='fixation1',
         text='+',    font='Arial',
         pos=[0, 0], height=0.1, wrapWidth=None,
         color='white', colorSpace='rgb', opacity=1,
         depth=0.0)
-    exampleFractal1 = visual.ImageStim(win=win, name='fractal11',units='cm', 
-        image='blueFractal.jpg', mask=None,
+    # Example fractals are the fractals of the task (same image, size and depth)
+    exampleFractal1 = pool.get('fractal1', visual.ImageStim, win=win, name='fractal11',units='cm', 
+        image=pool.image('blueFractal.jpg'), mask=None,
         ori=0, pos=[0,0], size=[9.6, 6],
         color=[1,1,1], colorSpace='rgb', opacity=1,
         flipHoriz=False, flipVert=False,
         texRes=128, interpolate=True, depth=-1.0)
-    exampleFractal2 = visual.ImageStim(win=win, name='fractal22',units='cm', 
-        image='redFractal.jpg', mask=None,
+    exampleFractal2 = pool.get('fractal2', visual.ImageStim, win=win, name='fractal22',units='cm', 
+        image=pool.image('redFractal.jpg'), mask=None,
         ori=0, pos=[0,0], size=[9.6, 6],
         color=[1,1,1], colorSpace='rgb', opacity=1,
         flipHoriz=False, flipVert=False,
         texRes=128, interpolate=True, depth=-2.0)
-    exampleText = visual.TextStim(win=win, ori=0, name='text',
+    exampleText = pool.get('fractalExampleText', visual.TextStim, win=win, ori=0, name='text',
         text=fractalText, font=u'Arial',
         pos=[0, 0.8], height=0.08, wrapWidth=1.5,
         color=u'white', colorSpace='rgb', opacity=1,
         depth=-4.0, units = "norm")
+    if exampleText.text != fractalText:
+        exampleText.setText(fractalText)
     return(fractalExampleClock, exampleFractal1, exampleFractal2, exampleText) 
    
 def initializeFeedbackExample(win, feedbackText, exampleText):
@@ -0,0 +1,121 @@
+from collections import OrderedDict, deque
+from initializeComponents import initializeSimpleInstructions
+
+# Pre-rasterized instruction screens
+#
+# Header and main text of an instruction screen are laid out and drawn once
+# into a buffer image (BufferImageStim). Showing the screen again only draws
+# that image. Screens are kept in a bounded LRU cache, and screens that are
+# announced in advance are rasterized in idle frames of the current screen.
+
+
+def screenKey(header, headerSize, headerPosition, mainText, mainSize, mainPosition):
+    """ This function returns the cache key of an instruction screen
+
+    Input:
+        header: header for instructions
+        headerSize: height of header on the screen
+        headerPosition: position of header on the screen
+        mainText: instructions text
+        mainSize: height of instructions text on the screen
+        mainPosition: position of the instructions text on the screen
+
+    Return:
+        key: hashable description of the screen
+    """
+
+    return (header, headerSize, tuple(headerPosition), mainText, mainSize, tuple(mainPosition))
+
+
+class InstructionRenderer(object):
+    """ This class rasterizes instruction screens into cached buffer images
+
+    Input:
+        win: window object instance
+        capacity: maximal number of cached screens
+    """
+
+    def __init__(self, win, capacity=8):
+        self.win = win
+        self.capacity = capacity
+        self.screens = OrderedDict()
+        self.pending = deque()
+        self.nHits = 0
+        self.nMisses = 0
+        self.nPrefetched = 0
+
+    def rasterize(self, key):
+        """ This function draws a screen into a buffer image
+
+        Input:
+            key: screen key
+
+        Return:
+            screen: BufferImageStim of the screen
+        """
+
+        from psychopy import visual
+        (header, headerSize, headerPosition, mainText, mainSize, mainPosition) = key
+        (instructionsClock, headerStim, mainStim) = initializeSimpleInstructions(self.win, header, headerSize,
+            list(headerPosition), mainText, mainSize, list(mainPosition))
+        screen = visual.BufferImageStim(self.win, stim=[headerStim, mainStim])
+        self.win.clearBuffer()  # the rasterized screen must not appear on the current frame
+        while len(self.screens) >= self.capacity:
+            self.screens.popitem(last=False)
+        self.screens[key] = screen
+        return screen
+
+    def screen(self, header, headerSize, headerPosition, mainText, mainSize, mainPosition):
+        """ This function returns the buffer image of a screen (rasterized on first request)
+
+        Input:
+            header: header for instructions
+            headerSize: height of header on the screen
+            headerPosition: position of header on the screen
+            mainText: instructions text
+            mainSize: height of instructions text on the screen
+            mainPosition: position of the instructions text on the screen
+
+        Return:
+            screen: BufferImageStim of the screen
+        """
+
+        key = screenKey(header, headerSize, headerPosition, mainText, mainSize, mainPosition)
+        screen = self.screens.pop(key, None)
+        if screen is None:
+            self.nMisses = self.nMisses + 1
+            return self.rasterize(key)
+        self.nHits = self.nHits + 1
+        self.screens[key] = screen
+        return screen
+
+    def prefetch(self, header, headerSize, headerPosition, mainText, mainSize, mainPosition):
+        """ This function announces a screen that is rasterized in the next idle frame
+
+        Input:
+            header: header for instructions
+            headerSize: height of header on the screen
+            headerPosition: position of header on the screen
+            mainText: instructions text
+            mainSize: height of instructions text on the screen
+            mainPosition: position of the instructions text on the screen
+        """
+
+        key = screenKey(header, headerSize, headerPosition, mainText, mainSize, mainPosition)
+        if key not in self.screens and key not in self.pending:
+            self.pending.append(key)
+
+    def renderPending(self):
+        """ This function rasterizes one announced screen (called in idle frames)
+
+        Return:
+            rendered: True if a screen was rasterized
+        """
+
+        while len(self.pending) > 0:
+            key = self.pending.popleft()
+            if key not in self.screens:
+                self.rasterize(key)
+                self.nPrefetched = self.nPrefetched + 1
+                return True
+        return False
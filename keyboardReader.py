@@ -0,0 +1,212 @@
+import os
+import time
+import threading
+import numpy as np
+
+# Background keyboard input
+#
+# Key presses are read on a background thread from a key source (evdev on
+# Linux or a pipe for testing) and pushed with their timestamps into a
+# single-producer/single-consumer ring buffer. The frame loop only drains the
+# buffer, and reaction times are computed from the event timestamps instead of
+# the time of the frame at which the keyboard was polled.
+
+# PsychoPy key names of evdev key codes
+evdevKeyNames = {'KEY_LEFT': 'left', 'KEY_RIGHT': 'right', 'KEY_UP': 'up', 'KEY_DOWN': 'down',
+                 'KEY_ESC': 'escape', 'KEY_ENTER': 'return', 'KEY_KPENTER': 'return', 'KEY_SPACE': 'space',
+                 'KEY_BACKSPACE': 'backspace'}
+for digit in range(10):
+    evdevKeyNames['KEY_%d' % digit] = str(digit)
+    evdevKeyNames['KEY_KP%d' % digit] = str(digit)
+
+
+class KeyRingBuffer(object):
+    """ This class is a fixed-size ring buffer for one writing and one reading thread
+
+    The writer only advances 'head' and the reader only advances 'tail', so no
+    lock is required. If the buffer is full, new events are dropped and counted.
+
+    Input:
+        capacity: maximal number of buffered key events
+    """
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.keys = [None] * capacity
+        self.times = np.zeros(capacity)
+        self.head = 0
+        self.tail = 0
+        self.nDropped = 0
+
+    def push(self, key, timestamp):
+        """ This function adds a key event (writing thread only)
+
+        Input:
+            key: key name
+            timestamp: time of key press
+        """
+
+        if self.head - self.tail >= self.capacity:
+            self.nDropped = self.nDropped + 1
+            return
+        slot = self.head % self.capacity
+        self.keys[slot] = key
+        self.times[slot] = timestamp
+        self.head = self.head + 1
+
+    def drain(self):
+        """ This function removes and returns all buffered key events (reading thread only)
+
+        Return:
+            events: list of (key, timestamp)
+        """
+
+        head = self.head
+        events = []
+        while self.tail < head:
+            slot = self.tail % self.capacity
+            events.append((self.keys[slot], self.times[slot]))
+            self.tail = self.tail + 1
+        return events
+
+
+class EvdevSource(object):
+    """ This class reads key presses from a Linux input device (requires the evdev package)
+
+    Event timestamps of the kernel (wall clock) are converted to the clock of
+    the reader with an offset that is measured when the source is opened.
+
+    Input:
+        devicePath: path of input device (e.g. /dev/input/event3)
+        timeFunc: clock of the reader
+    """
+
+    def __init__(self, devicePath, timeFunc):
+        import evdev
+        self.evdev = evdev
+        self.device = evdev.InputDevice(devicePath)
+        self.clockOffset = time.time() - timeFunc()
+
+    def events(self):
+        """ This function yields key presses as (key, timestamp) """
+
+        for thisEvent in self.device.read_loop():
+            if thisEvent.type != self.evdev.ecodes.EV_KEY or thisEvent.value != 1:
+                continue  # only key down events
+            keyCode = self.evdev.ecodes.KEY.get(thisEvent.code)
+            if isinstance(keyCode, list):
+                keyCode = keyCode[0]
+            key = evdevKeyNames.get(keyCode, str(keyCode).replace('KEY_', '').lower())
+            yield key, thisEvent.timestamp() - self.clockOffset
+
+    def close(self):
+        self.device.close()
+
+
+class PipeSource(object):
+    """ This class reads key presses from a pipe (stand-in for a keyboard in tests)
+
+    Every line contains a key name and optionally a timestamp on the clock of
+    the reader; without timestamp, the time of reading is used.
+
+    Input:
+        readFd: file descriptor of the reading end of the pipe
+        timeFunc: clock of the reader
+    """
+
+    def __init__(self, readFd, timeFunc):
+        self.pipe = os.fdopen(readFd, 'r')
+        self.timeFunc = timeFunc
+
+    def events(self):
+        """ This function yields key presses as (key, timestamp) """
+
+        for line in iter(self.pipe.readline, ''):
+            fields = line.split()
+            if len(fields) == 0:
+                continue
+            if len(fields) > 1:
+                yield fields[0], float(fields[1])
+            else:
+                yield fields[0], self.timeFunc()
+
+    def close(self):
+        self.pipe.close()
+
+
+class KeyboardReader(object):
+    """ This class reads key presses of a key source on a background thread
+
+    Input:
+        source: key source (EvdevSource or PipeSource)
+        timeFunc: clock of the timestamps (psychopy.core.getTime)
+        capacity: size of ring buffer
+    """
+
+    def __init__(self, source, timeFunc, capacity=256):
+        self.source = source
+        self.timeFunc = timeFunc
+        self.buffer = KeyRingBuffer(capacity)
+        self.thread = threading.Thread(target=self.run, name='keyboardReader')
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        try:
+            for (key, timestamp) in self.source.events():
+                self.buffer.push(key, timestamp)
+        except (IOError, OSError, ValueError):
+            pass  # source was closed
+
+    def getKeys(self):
+        """ This function returns all key presses since the last call
+
+        Return:
+            events: list of (key, timestamp)
+        """
+
+        return self.buffer.drain()
+
+    def clearEvents(self):
+        """ This function discards all buffered key presses """
+
+        self.buffer.drain()
+
+    def stop(self):
+        self.source.close()
+
+
+def openKeyboardReader(devicePath, timeFunc, capacity=256):
+    """ This function starts a keyboard reader on a Linux input device
+
+    Input:
+        devicePath: path of input device (e.g. /dev/input/event3)
+        timeFunc: clock of the timestamps (psychopy.core.getTime)
+        capacity: size of ring buffer
+
+    Return:
+        keyboard: running keyboard reader
+    """
+
+    return KeyboardReader(EvdevSource(devicePath, timeFunc), timeFunc, capacity).start()
+
+
+def openPipeKeyboard(timeFunc, capacity=256):
+    """ This function starts a keyboard reader on a pipe
+
+    Input:
+        timeFunc: clock of the timestamps
+        capacity: size of ring buffer
+
+    Return:
+        keyboard: running keyboard reader
+        writer: file object to write key presses to (one key per line)
+    """
+
+    (readFd, writeFd) = os.pipe()
+    keyboard = KeyboardReader(PipeSource(readFd, timeFunc), timeFunc, capacity).start()
+    writer = os.fdopen(writeFd, 'w', 1)
+    return keyboard, writer
@@ -0,0 +1,185 @@
+from __future__ import division
+import sys
+import timeit
+import numpy as np
+from multiprocessing import Pool, RawArray, cpu_count
+from blockManifest import loadManifest, selectBlocks
+from batchSimulator import loadBlocks, simulate
+
+# Parallel batch simulation across sets and parameter settings
+#
+# The blocks of all requested sets are read once from the block cache and
+# copied into shared memory (RawArray). Worker processes map the shared
+# buffers as NumPy arrays without copying, so no worker reads the block files
+# again. Each job (parameter setting x set x phase) has its own seed that is
+# drawn from the base seed in job order, so results do not depend on the
+# number of processes or on which worker runs a job. The results of all jobs
+# are gathered into one column per variable (one row per participant and block).
+#
+# As in blockManifest.py, the process pool should be started from the command
+# line (python parallelSimulation.py), because on Windows every worker process
+# re-imports the main script.
+
+blockFields = [('PU', 'd', np.float64), ('targetLeft', 'b', np.int8), ('redUp', 'b', np.int8),
+               ('corrUp', 'b', np.int8), ('outcomes', 'b', np.int8)]
+resultFields = ['points', 'decision1Corr', 'decision2Corr', 'misses', 'givenUp']
+
+workerBlocks = {}  # block arrays of the worker process (views into shared memory)
+
+
+def shareBlocks(manifest, sets, phases=('main_safe', 'main_unc'), blockDir='blockFiles'):
+    """ This function loads the blocks of all sets and phases into shared memory
+
+    Input:
+        manifest: block manifest
+        sets: participant specific outcome sets
+        phases: task phases that are simulated
+        blockDir: directory that contains blockFiles
+
+    Return:
+        sharedBlocks: dictionary with shared buffers (name -> RawArray), shape (blocks, trials)
+                      and row index ((set, phase) -> list of block rows)
+    """
+
+    blockList = []
+    index = {}
+    for set in sets:
+        for phase in phases:
+            setBlocks = selectBlocks(manifest, set, phase)
+            index[(set, phase)] = list(range(len(blockList), len(blockList) + len(setBlocks)))
+            blockList.extend(setBlocks)
+
+    blocks = loadBlocks(blockList, blockDir)
+    shape = blocks['PU'].shape
+    buffers = {}
+    for (name, typeCode, dtype) in blockFields:
+        buffers[name] = RawArray(typeCode, int(np.prod(shape)))
+        np.frombuffer(buffers[name], dtype=dtype).reshape(shape)[:] = blocks[name]
+    return {'buffers': buffers, 'shape': shape, 'index': index}
+
+
+def initWorker(buffers, shape):
+    """ This function maps the shared block buffers in a worker process
+
+    Input:
+        buffers: dictionary with shared buffers (name -> RawArray)
+        shape: shape of block arrays (blocks, trials)
+
+    Return: ~
+    """
+
+    workerBlocks.clear()
+    for (name, typeCode, dtype) in blockFields:
+        workerBlocks[name] = np.frombuffer(buffers[name], dtype=dtype).reshape(shape)
+
+
+def simulationJob(args):
+    """ This function simulates one parameter setting in the blocks of one set and phase (process pool worker)
+
+    Input:
+        args: tuple of job index, block rows, number of participants, simulation parameters and seed
+
+    Return:
+        jobIndex: index of the job
+        results: dictionary with arrays of shape (participants, blocks) (see simulate)
+    """
+
+    (jobIndex, rows, nParticipants, params, seed) = args
+    blocks = dict((name, workerBlocks[name][rows]) for name in workerBlocks)
+    for name in ('targetLeft', 'redUp', 'corrUp'):
+        blocks[name] = blocks[name].astype(bool)
+    return jobIndex, simulate(blocks, nParticipants, seed=seed, **params)
+
+
+def runSimulations(sharedBlocks, nParticipants, parameterSets=({},), seed=0, nProcesses=None):
+    """ This function simulates all parameter settings in all sets and phases in parallel
+
+    Input:
+        sharedBlocks: shared block data (shareBlocks)
+        nParticipants: number of simulated participants per set, phase and parameter setting
+        parameterSets: list of dictionaries with parameters of simulate
+        seed: base seed (one seed per job is drawn from it)
+        nProcesses: number of worker processes (None: all cores; 1: no pool)
+
+    Return:
+        columns: dictionary with one array per variable (one row per participant and block):
+                 parameterSet, set, phase, participant, block and the results of simulate
+    """
+
+    keys = sorted(sharedBlocks['index'])
+    jobs = [(p, key) for p in range(len(parameterSets)) for key in keys]
+    seeds = np.random.RandomState(seed).randint(2**31 - 1, size=len(jobs))
+    args = [(i, sharedBlocks['index'][key], nParticipants, parameterSets[p], int(seeds[i]))
+            for i, (p, key) in enumerate(jobs)]
+
+    if nProcesses == 1:
+        initWorker(sharedBlocks['buffers'], sharedBlocks['shape'])
+        results = [simulationJob(x) for x in args]
+    else:
+        pool = Pool(nProcesses, initializer=initWorker, initargs=(sharedBlocks['buffers'], sharedBlocks['shape']))
+        try:
+            results = pool.map(simulationJob, args, chunksize=max(1, len(args) // (4 * (nProcesses or cpu_count()))))
+        finally:
+            pool.close()
+            pool.join()
+    results = dict(results)
+
+    # Gather results of all jobs into columns
+    parts = dict((name, []) for name in ['parameterSet', 'set', 'phase', 'participant', 'block'] + resultFields)
+    for i, (p, (set, phase)) in enumerate(jobs):
+        (n, nBlocks) = results[i]['points'].shape
+        parts['parameterSet'].append(np.full(n * nBlocks, p, dtype=np.int32))
+        parts['set'].append(np.full(n * nBlocks, int(set), dtype=np.int32))
+        parts['phase'].append(np.full(n * nBlocks, phase, dtype='U9'))
+        parts['participant'].append(np.repeat(np.arange(n, dtype=np.int32), nBlocks))
+        parts['block'].append(np.tile(np.arange(nBlocks, dtype=np.int32), n))
+        for name in resultFields:
+            parts[name].append(results[i][name].ravel())
+    return dict((name, np.concatenate(parts[name])) for name in parts)
+
+
+def scalingReport(sharedBlocks, nParticipants, processCounts=None, **params):
+    """ This function measures throughput and scaling efficiency of the parallel simulation
+
+    Input:
+        sharedBlocks: shared block data (shareBlocks)
+        nParticipants: number of simulated participants per set and phase
+        processCounts: numbers of worker processes (default: 1, 2, 4, ... up to all cores)
+        params: other parameters of runSimulations
+
+    Return:
+        report: list of (number of processes, seconds, trials/sec, scaling efficiency)
+    """
+
+    if processCounts is None:
+        processCounts = [1]
+        while processCounts[-1] * 2 <= cpu_count():
+            processCounts.append(processCounts[-1] * 2)
+        if processCounts[-1] != cpu_count():
+            processCounts.append(cpu_count())
+
+    nTrials = int(np.prod(sharedBlocks['shape'])) * nParticipants * len(params.get('parameterSets', ({},)))
+    report = []
+    print('%9s %10s %14s %11s' % ('processes', 'seconds', 'trials/sec', 'efficiency'))
+    for nProcesses in processCounts:
+        startTime = timeit.default_timer()
+        runSimulations(sharedBlocks, nParticipants, nProcesses=nProcesses, **params)
+        duration = timeit.default_timer() - startTime
+        if len(report) == 0:
+            baseline = duration * processCounts[0]
+        efficiency = baseline / (duration * nProcesses)
+        report.append((nProcesses, duration, nTrials / duration, efficiency))
+        print('%9d %10.2f %14.0f %10.0f%%' % (nProcesses, duration, nTrials / duration, efficiency * 100))
+    return report
+
+
+if __name__ == '__main__':
+
+    # Usage: python parallelSimulation.py [nParticipants] [blockDir]
+    nParticipants = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    blockDir = sys.argv[2] if len(sys.argv) > 2 else 'blockFiles'
+    manifest = loadManifest(blockDir)
+    sets = sorted(manifest['sets'], key=int)
+    sharedBlocks = shareBlocks(manifest, sets, blockDir=blockDir)
+    print('%d sets, %d blocks in shared memory' % (len(sets), sharedBlocks['shape'][0]))
+    scalingReport(sharedBlocks, nParticipants)
@@ -0,0 +1,114 @@
+# Running performance of a block
+#
+# Rewards, correct responses, misses and reaction times are accumulated
+# trial by trial, so that the accumulated performance that is stored after
+# every trial does not require a sum over the data columns. Rewards are
+# accumulated as floats like the sums over the data columns, so that the
+# reward computation of taskLoop.py (Python 2 division) stays a true division.
+
+
+class BlockPerformance(object):
+    """ This class accumulates the performance of the current block in O(1) per trial
+
+    Attributes:
+        decision1Reward: accumulated reward of perceptual decisions
+        decision1Corr: number of correct perceptual decisions
+        decision2Reward: accumulated reward of economic decisions
+        decision2Corr: number of correct economic decisions
+        nTrials: number of completed trials (including misses)
+        nMisses: number of missed trials
+    """
+
+    __slots__ = ('decision1Reward', 'decision1Corr', 'decision1RtSum', 'decision1RtCount',
+                 'decision2Reward', 'decision2Corr', 'decision2RtSum', 'decision2RtCount',
+                 'nTrials', 'nMisses')
+
+    def __init__(self):
+        self.decision1Reward = 0.0
+        self.decision1Corr = 0
+        self.decision1RtSum = 0.0
+        self.decision1RtCount = 0
+        self.decision2Reward = 0.0
+        self.decision2Corr = 0
+        self.decision2RtSum = 0.0
+        self.decision2RtCount = 0
+        self.nTrials = 0
+        self.nMisses = 0
+
+    def addDecision1(self, corr, reward, rt):
+        """ This function adds the perceptual decision of the current trial
+
+        Input:
+            corr: indicates if response was correct
+            reward: obtained reward
+            rt: reaction time (None if no response was made)
+
+        Return:
+            decision1Reward: accumulated reward of perceptual decisions
+        """
+
+        self.decision1Corr = self.decision1Corr + corr
+        self.decision1Reward = self.decision1Reward + reward
+        if rt is not None and rt == rt:
+            self.decision1RtSum = self.decision1RtSum + rt
+            self.decision1RtCount = self.decision1RtCount + 1
+        return self.decision1Reward
+
+    def addDecision2(self, corr, reward, rt):
+        """ This function adds the economic decision of the current trial
+
+        Input:
+            corr: indicates if response was correct (nan if no response was made)
+            reward: obtained reward
+            rt: reaction time (nan if no response was made)
+
+        Return:
+            decision2Reward: accumulated reward of economic decisions
+        """
+
+        if corr == 1:
+            self.decision2Corr = self.decision2Corr + 1
+        self.decision2Reward = self.decision2Reward + reward
+        if rt is not None and rt == rt:
+            self.decision2RtSum = self.decision2RtSum + rt
+            self.decision2RtCount = self.decision2RtCount + 1
+        return self.decision2Reward
+
+    def endTrial(self, missIndex):
+        """ This function counts the current trial
+
+        Input:
+            missIndex: indicates if current trial was missed
+
+        Return: ~
+        """
+
+        self.nTrials = self.nTrials + 1
+        self.nMisses = self.nMisses + missIndex
+
+    def meanRt(self, decision):
+        """ This function returns the mean reaction time of a decision
+
+        Input:
+            decision: 1 = perceptual decision; 2 = economic decision
+
+        Return:
+            meanRt: mean reaction time (nan if no response was made)
+        """
+
+        if decision == 1:
+            (rtSum, rtCount) = (self.decision1RtSum, self.decision1RtCount)
+        else:
+            (rtSum, rtCount) = (self.decision2RtSum, self.decision2RtCount)
+        if rtCount == 0:
+            return float('nan')
+        return rtSum / rtCount
+
+    def accPerf(self):
+        """ This function returns the accumulated performance of the block
+
+        Return:
+            accPerf: sum of perceptual and economic rewards (float)
+        """
+
+        return self.decision1Reward + self.decision2Reward
@@ -0,0 +1,385 @@
+import csv
+import threading
+import numpy as np
+
+# Simulated participants
+#
+# A response agent is told about every trial (stimulus, response window and
+# feedback) and injects key presses with simulated reaction times into the
+# input layer of the task: the virtual keyboard of the headless backend or a
+# pipe keyboard. Fixation breaks are injected as gaze samples. Misses and
+# fixation breaks exercise the repeat logic and the saccadeMiss path.
+
+
+class PipeKeys(object):
+    """ This class writes scheduled key presses into a pipe keyboard at their time
+
+    Input:
+        writer: file object of the pipe keyboard (openPipeKeyboard)
+        timeFunc: clock of the keyboard reader
+    """
+
+    def __init__(self, writer, timeFunc):
+        self.writer = writer
+        self.timeFunc = timeFunc
+        self.lock = threading.Lock()
+
+    def press(self, key, t=None):
+        if t is None:
+            t = self.timeFunc()
+        timer = threading.Timer(max(0.0, t - self.timeFunc()), self.write, (key, t))
+        timer.daemon = True
+        timer.start()
+
+    def write(self, key, t):
+        with self.lock:
+            self.writer.write('%s %.6f\n' % (key, t))
+            self.writer.flush()
+
+
+class AgentGaze(object):
+    """ This class generates the gaze samples of a simulated participant (interface of GazeSampler)
+
+    Gaze stays at the fixation cross except during fixation breaks of the agent.
+
+    Input:
+        timeFunc: clock of the samples
+        center: fixation cross in tracker pixels
+        amplitude: horizontal and vertical distance of gaze from the center during a fixation break in pixels
+        rate: sampling rate in Hz
+    """
+
+    def __init__(self, timeFunc, center=(1280, 720), amplitude=200, rate=250):
+        self.timeFunc = timeFunc
+        self.center = center
+        self.amplitude = amplitude
+        self.rate = rate
+        self.breaks = []  # (start, end) of fixation breaks
+
+    def fixationBreak(self, start, duration):
+        self.breaks.append((start, start + duration))
+
+    def since(self, startTime):
+        """ This function returns the samples from a point in time until now
+
+        Input:
+            startTime: time on the clock of the samples
+
+        Return:
+            samples: array with one row (time, x, y) per sample
+        """
+
+        times = np.arange(startTime, self.timeFunc(), 1.0 / self.rate)
+        samples = np.zeros((len(times), 3))
+        samples[:, 0] = times
+        samples[:, 1] = self.center[0]
+        samples[:, 2] = self.center[1]
+        for (start, end) in self.breaks:
+            samples[(times >= start) & (times < end), 1:] += self.amplitude  # diagonal, outside of box and circle
+        self.breaks = [(start, end) for (start, end) in self.breaks if end > startTime]
+        return samples
+
+    def stop(self):
+        pass
+
+
+class ResponseAgent(object):
+    """ This class is the interface of all simulated participants
+
+    Subclasses choose the keys of both decisions (choosePatch, chooseFractal)
+    and may learn from feedback (learn). Reaction times are ex-Gaussian.
+
+    Input:
+        keys: input layer with press(key, t) (virtual keyboard or PipeKeys)
+        timeFunc: clock of the input layer
+        rtMu: mean of the Gaussian part of the reaction times in seconds
+        rtSigma: standard deviation of the Gaussian part in seconds
+        rtTau: mean of the exponential part in seconds
+        missRate: probability of not responding to a decision
+        saccadeRate: probability of breaking fixation during the patches (followed by a miss)
+        readingTime: time until instructions and examples are confirmed in seconds
+        gazeCenter: fixation cross in tracker pixels
+        seed: seed of the random number generator
+    """
+
+    def __init__(self, keys, timeFunc, rtMu=0.45, rtSigma=0.08, rtTau=0.15, missRate=0.02, saccadeRate=0.0,
+                 readingTime=1.0, gazeCenter=(1280, 720), seed=None):
+        self.keys = keys
+        self.timeFunc = timeFunc
+        self.rtMu = rtMu
+        self.rtSigma = rtSigma
+        self.rtTau = rtTau
+        self.missRate = missRate
+        self.saccadeRate = saccadeRate
+        self.readingTime = readingTime
+        self.randomState = np.random.RandomState(seed)
+        self.gaze = AgentGaze(timeFunc, gazeCenter)
+        self.nResponses = 0
+        self.nMisses = 0
+        self.nFixationBreaks = 0
+
+    def responseTime(self):
+        """ This function draws a reaction time in seconds """
+
+        randomState = self.randomState
+        return max(0.1, randomState.normal(self.rtMu, self.rtSigma) + randomState.exponential(self.rtTau))
+
+    def respond(self, key, onset, offset):
+        """ This function presses a key in a response window (or misses)
+
+        Input:
+            key: key that is pressed
+            onset: start of response window relative to now in seconds
+            offset: end of response window relative to now in seconds
+
+        Return:
+            rt: reaction time (None = miss)
+        """
+
+        rt = self.responseTime()
+        if key is None or self.randomState.random_sample() < self.missRate or onset + rt >= offset:
+            self.nMisses = self.nMisses + 1
+            return None
+        self.keys.press(key, self.timeFunc() + onset + rt)
+        self.nResponses = self.nResponses + 1
+        return rt
+
+    def startBlock(self):
+        """ This function is called before the first trial of a block """
+
+        pass
+
+    def choosePatch(self, thisTrial, decision1Keys):
+        """ This function returns the key of the perceptual decision (None = no response) """
+
+        raise NotImplementedError
+
+    def chooseFractal(self, thisTrial, decision2Keys):
+        """ This function returns the key of the economic decision (None = no response) """
+
+        raise NotImplementedError
+
+    def learn(self, thisTrial, key, reward):
+        """ This function updates the agent after feedback """
+
+        pass
+
+    def decision1(self, thisTrial, decision1Keys, onset, offset):
+        """ This function responds to the Gabor-patches
+
+        Input:
+            thisTrial: compiled trial record
+            decision1Keys: valid keys of the perceptual decision
+            onset: patch onset relative to now in seconds
+            offset: end of response window relative to now in seconds
+        """
+
+        if self.randomState.random_sample() < self.saccadeRate:
+            self.gaze.fixationBreak(self.timeFunc() + onset + self.randomState.uniform(0, offset - onset), 0.1)
+            self.nFixationBreaks = self.nFixationBreaks + 1
+            self.nMisses = self.nMisses + 1
+            return
+        self.respond(self.choosePatch(thisTrial, decision1Keys), onset, offset)
+
+    def decision2(self, thisTrial, decision2Keys, onset, offset):
+        """ This function responds to the fractals
+
+        Input:
+            thisTrial: compiled trial record
+            decision2Keys: valid keys of the economic decision
+            onset: fractal onset relative to now in seconds
+            offset: end of response window relative to now in seconds
+        """
+
+        self.respond(self.chooseFractal(thisTrial, decision2Keys), onset, offset)
+
+    def feedback(self, thisTrial, key, reward):
+        """ This function passes the outcome of the economic decision to the agent
+
+        Input:
+            thisTrial: compiled trial record
+            key: pressed key (None = miss)
+            reward: obtained reward
+        """
+
+        if key is not None:
+            self.learn(thisTrial, key, reward)
+
+    def confirm(self, key, onset=0.0):
+        """ This function confirms an instruction screen or example
+
+        Input:
+            key: required key
+            onset: start of the response window relative to now in seconds
+        """
+
+        self.keys.press(key, self.timeFunc() + onset + self.readingTime * (0.5 + self.randomState.random_sample()))
+
+    def recall(self, digits, backward, onset=0.0, span=7):
+        """ This function types the digits of a digit-span trial and confirms with return
+
+        Input:
+            digits: presented digits
+            backward: True = digits are recalled in reverse order
+            onset: start of the response window relative to now in seconds
+            span: number of digits the agent can remember
+        """
+
+        digits = [str(digit) for digit in (digits[::-1] if backward else digits)]
+        if len(digits) > span:
+            digits[span:] = [str(self.randomState.randint(10)) for digit in digits[span:]]
+        t = self.timeFunc() + onset
+        for digit in digits:
+            t = t + self.responseTime()
+            self.keys.press(digit, t)
+        self.keys.press('return', t + self.responseTime())
+
+
+class RandomAgent(ResponseAgent):
+    """ This class responds with random keys """
+
+    def choosePatch(self, thisTrial, decision1Keys):
+        return decision1Keys[self.randomState.randint(len(decision1Keys))]
+
+    def chooseFractal(self, thisTrial, decision2Keys):
+        return decision2Keys[self.randomState.randint(len(decision2Keys))]
+
+
+class LearningAgent(ResponseAgent):
+    """ This class perceives the contrast difference with noise and learns fractal values by reinforcement learning
+
+    The perceived target side (the key of the perceptual decision) is the
+    state; the value of each fractal color in each state is learned with a
+    delta rule and choices follow a softmax.
+
+    Input:
+        keys: input layer with press(key, t)
+        timeFunc: clock of the input layer
+        perceptualNoise: standard deviation of perceived contrast difference
+        learningRate: learning rate of the delta rule
+        beta: inverse temperature of the softmax
+        params: parameters of ResponseAgent
+    """
+
+    def __init__(self, keys, timeFunc, perceptualNoise=0.03, learningRate=0.2, beta=5.0, **params):
+        ResponseAgent.__init__(self, keys, timeFunc, **params)
+        self.perceptualNoise = perceptualNoise
+        self.learningRate = learningRate
+        self.beta = beta
+        self.values = {}
+        self.state = None
+
+    def startBlock(self):
+        self.values = {}  # reward contingencies change between blocks
+
+    def choosePatch(self, thisTrial, decision1Keys):
+        perceived = thisTrial.PU + self.randomState.normal(0, self.perceptualNoise)
+        if perceived > 0:
+            key = thisTrial.targetPatchKey
+        else:
+            key = [otherKey for otherKey in decision1Keys if otherKey != thisTrial.targetPatchKey][0]
+        self.state = key
+        return key
+
+    def chooseFractal(self, thisTrial, decision2Keys):
+        valueRed = self.values.get((self.state, 'red'), 0.5)
+        valueBlue = self.values.get((self.state, 'blue'), 0.5)
+        pRed = 1.0 / (1.0 + np.exp(-self.beta * (valueRed - valueBlue)))
+        if self.randomState.random_sample() < pRed:
+            return thisTrial.redFractalKey
+        return thisTrial.blueFractalKey
+
+    def learn(self, thisTrial, key, reward):
+        color = 'red' if key == thisTrial.redFractalKey else 'blue'
+        value = self.values.get((self.state, color), 0.5)
+        self.values[(self.state, color)] = value + self.learningRate * (reward - value)
+
+
+class ReplayAgent(ResponseAgent):
+    """ This class replays the responses of a recorded session
+
+    Every presented trial (including repeats) takes the next row of the
+    script. Rows without key are misses. After the last row the agent
+    responds randomly.
+
+    Input:
+        keys: input layer with press(key, t)
+        timeFunc: clock of the input layer
+        script: list of dictionaries with 'decision1.keys', 'decision1.rt', 'decision2.keys', 'decision2.rt'
+        params: parameters of ResponseAgent
+    """
+
+    def __init__(self, keys, timeFunc, script, **params):
+        params.setdefault('missRate', 0.0)
+        ResponseAgent.__init__(self, keys, timeFunc, **params)
+        self.script = script
+        self.nextRow = 0
+        self.row = None
+
+    @classmethod
+    def fromCsv(cls, path, keys, timeFunc, **params):
+        """ This function creates a replay agent from the data file of a session
+
+        Input:
+            path: path to .csv data file
+            keys: input layer with press(key, t)
+            timeFunc: clock of the input layer
+            params: parameters of ResponseAgent
+
+        Return:
+            agent: replay agent
+        """
+
+        with open(path) as f:
+            script = [row for row in csv.DictReader(f) if row.get('decision1.keys', '') != '']
+        return cls(keys, timeFunc, script, **params)
+
+    def replay(self, keyName, rtName, onset, offset):
+        key = self.row.get(keyName)
+        if key in (None, '', 'None', 'nan'):
+            self.nMisses = self.nMisses + 1
+            return
+        rt = float(self.row.get(rtName) or 'nan')
+        if rt != rt:
+            rt = self.responseTime()  # reaction time was not recorded
+        self.keys.press(key, self.timeFunc() + onset + min(rt, offset - onset - 0.001))
+        self.nResponses = self.nResponses + 1
+
+    def decision1(self, thisTrial, decision1Keys, onset, offset):
+        if self.nextRow >= len(self.script):
+            self.row = None
+            self.respond(decision1Keys[self.randomState.randint(len(decision1Keys))], onset, offset)
+            return
+        self.row = self.script[self.nextRow]
+        self.nextRow = self.nextRow + 1
+        self.replay('decision1.keys', 'decision1.rt', onset, offset)
+
+    def decision2(self, thisTrial, decision2Keys, onset, offset):
+        if self.row is None:
+            self.respond(decision2Keys[self.randomState.randint(len(decision2Keys))], onset, offset)
+            return
+        self.replay('decision2.keys', 'decision2.rt', onset, offset)
+
+
+agentTypes = {'random': RandomAgent, 'learning': LearningAgent}
+
+
+def createAgent(agentType, keys, timeFunc, replayFile=None, **params):
+    """ This function creates a simulated participant
+
+    Input:
+        agentType: 'random', 'learning' or 'replay'
+        keys: input layer with press(key, t) (virtual keyboard or PipeKeys)
+        timeFunc: clock of the input layer
+        replayFile: data file that is replayed (agentType 'replay')
+        params: parameters of the agent
+
+    Return:
+        agent: response agent
+    """
+
+    if agentType == 'replay':
+        return ReplayAgent.fromCsv(replayFile, keys, timeFunc, **params)
+    if agentType not in agentTypes:
+        raise ValueError('unknown response agent %r (use random, learning or replay)' % agentType)
+    return agentTypes[agentType](keys, timeFunc, **params)
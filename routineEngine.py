@@ -0,0 +1,322 @@
+import math
+
+# Frame-scheduled routine engine
+#
+# A routine is a declarative list of components with onset and offset times
+# (in seconds relative to routine start). When the routine is built, the
+# onsets and offsets are turned into one sorted list of events with their
+# expected frame indices, so that the frame loop only compares the current
+# time with the next pending event and polls the keyboards that are active
+# (or drains the buffer of the background keyboard reader).
+
+# Event actions
+START = 0
+STOP = 1
+
+
+class Component(object):
+    """ This class describes one component of a routine
+
+    Input:
+        item: stimulus object instance or keyboard response object instance
+        onset: start time in seconds relative to routine start
+        offset: stop time in seconds relative to routine start (None = until routine ends)
+        keyList: keys that are checked (only for keyboard responses; None = no key checking)
+        isResponse: indicates if component is a keyboard response
+        forceEnd: indicates if a key press ends the routine
+
+    Attributes (set when the routine is built and run):
+        startFrame, stopFrame: frame indices of start and stop
+        startTime: scheduled start time (quantized to frames in frame-count mode)
+        startError: quantization error of start time in seconds (nan in time mode)
+        tStart, tStop: realized start and stop time on the routine clock
+        resetTime: time at which the response clock was reset (on the clock of the keyboard reader)
+    """
+
+    __slots__ = ('item', 'onset', 'offset', 'keyList', 'isResponse', 'forceEnd', 'startFrame', 'stopFrame',
+                 'startTime', 'startError', 'tStart', 'tStop', 'resetTime')
+
+    def __init__(self, item, onset, offset, keyList, isResponse, forceEnd):
+        self.item = item
+        self.onset = onset
+        self.offset = offset
+        self.keyList = keyList
+        self.isResponse = isResponse
+        self.forceEnd = forceEnd
+        self.startFrame = None
+        self.stopFrame = None
+        self.startTime = onset
+        self.startError = float('nan')
+        self.tStart = None
+        self.tStop = None
+        self.resetTime = None
+
+    def duration(self):
+        """ This function returns the realized presentation duration (nan if component was not shown)
+
+        Return:
+            duration: realized duration in seconds
+        """
+
+        if self.tStart is None or self.tStop is None:
+            return float('nan')
+        return self.tStop - self.tStart
+
+
+def stimulus(stim, onset, offset=None):
+    """ This function creates a stimulus component that is drawn between onset and offset
+
+    Input:
+        stim: stimulus object instance
+        onset: start time in seconds
+        offset: stop time in seconds (None = until routine ends)
+
+    Return:
+        component: routine component
+    """
+
+    return Component(stim, onset, offset, None, False, False)
+
+
+def response(keyResponse, onset, offset=None, keyList=None, forceEnd=False):
+    """ This function creates a keyboard response component
+
+    Input:
+        keyResponse: keyboard response object instance (event.BuilderKeyResponse)
+        onset: start time in seconds
+        offset: stop time in seconds (None = until routine ends)
+        keyList: keys that are checked (None = no key checking)
+        forceEnd: indicates if a key press ends the routine
+
+    Return:
+        component: routine component
+    """
+
+    return Component(keyResponse, onset, offset, keyList, True, forceEnd)
+
+
+def frameIndex(eventTime, framePeriod):
+    """ This function returns the index of the first frame at or after an event time
+
+    Input:
+        eventTime: event time in seconds
+        framePeriod: duration of one frame in seconds
+
+    Return:
+        frameIndex: index of frame (0 is the first frame)
+    """
+
+    return max(0, int(math.ceil(round(eventTime / framePeriod, 6))))
+
+
+def toFrames(duration, frameDur):
+    """ This function converts a duration to the nearest integer number of frames
+
+    Input:
+        duration: duration in seconds
+        frameDur: measured duration of one frame in seconds
+
+    Return:
+        nFrames: number of frames
+    """
+
+    return max(0, int(round(duration / frameDur)))
+
+
+class Routine(object):
+    """ This class holds the precomputed event schedule of a routine
+
+    In time mode, components are started and stopped when the routine clock
+    passes their onsets and offsets. Offsets are shifted by most of one frame
+    period (0.75), as in the Builder-generated loops, so that a stimulus is not
+    drawn for an extra frame. In frame-count mode (experimentStructure
+    'useFrameTiming'), onsets, offsets and the duration are converted to
+    integer numbers of frames of the measured frame duration ('frameDur') and
+    components are switched by flip count.
+
+    Input:
+        experimentStructure: all general experimental properties
+        components: list of routine components
+        duration: duration of the routine in seconds (None = until all components
+                  have finished or a response ends the routine)
+        name: name of the routine (frame intervals are attributed to it by the frame monitor)
+    """
+
+    def __init__(self, experimentStructure, components, duration=None, name=None):
+        self.components = components
+        self.duration = duration
+        self.name = name
+        self.frameTiming = experimentStructure.get('useFrameTiming', False)
+        if self.frameTiming:
+            framePeriod = experimentStructure['frameDur']
+        else:
+            framePeriod = experimentStructure['win'].monitorFramePeriod
+        self.framePeriod = framePeriod
+
+        # Open-ended routines only end through a response
+        self.openEnded = False
+        events = []
+        for (order, component) in enumerate(components):
+            if self.frameTiming:
+                component.startFrame = toFrames(component.onset, framePeriod)
+                component.startTime = component.startFrame*framePeriod
+                component.startError = component.startTime - component.onset
+                events.append((component.startFrame, START, order, component))
+            else:
+                component.startFrame = frameIndex(component.onset, framePeriod)
+                events.append((component.onset, START, order, component))
+            if component.offset is None:
+                self.openEnded = True
+            elif self.frameTiming:
+                component.stopFrame = max(component.startFrame, toFrames(component.offset, framePeriod))
+                events.append((component.stopFrame, STOP, order, component))
+            else:
+                stopTime = max(component.onset, component.offset - framePeriod*0.75)
+                component.stopFrame = max(component.startFrame, frameIndex(stopTime, framePeriod))
+                events.append((stopTime, STOP, order, component))
+        events.sort(key=lambda thisEvent: thisEvent[:3])
+
+        # Events are triggered by time (time mode) or by frame index (frame-count mode)
+        self.eventTriggers = [thisEvent[0] for thisEvent in events]
+        self.eventActions = [thisEvent[1] for thisEvent in events]
+        self.eventComponents = [thisEvent[3] for thisEvent in events]
+        self.eventFrames = [thisEvent[3].startFrame if thisEvent[1] == START else thisEvent[3].stopFrame for thisEvent in events]
+
+
+def runRoutine(experimentStructure, routine, clock, routineTimer=None, onFrame=None):
+    """ This function runs the frame loop of a routine
+
+    Input:
+        experimentStructure: all general experimental properties
+        routine: routine with precomputed event schedule
+        clock: clock object instance for routine timing (is reset here)
+        routineTimer: timer to control presentation times (only used in time mode if the routine has a duration)
+        onFrame: function that is called on every frame with current time and frame index
+
+    If experimentStructure contains a running keyboard reader ('keyboard'),
+    key presses are drained from its buffer once per frame and reaction times
+    are computed from the key press timestamps.
+
+    Return:
+        nFrames: number of frames of the routine
+    """
+
+    # Create some shortnames
+    NOT_STARTED     = experimentStructure['NOT_STARTED']
+    STARTED         = experimentStructure['STARTED']
+    STOPPED         = experimentStructure['STOPPED']
+    endExpNow       = experimentStructure['endExpNow']
+    event           = experimentStructure['event']
+    win             = experimentStructure['win']
+    eventTriggers   = routine.eventTriggers
+    eventActions    = routine.eventActions
+    eventComponents = routine.eventComponents
+    nEvents         = len(eventTriggers)
+    openEnded       = routine.openEnded
+    frameTiming     = routine.frameTiming
+    keyboard        = experimentStructure.get('keyboard')
+    frameMonitor    = experimentStructure.get('frameMonitor')
+
+    #------Prepare to start routine-------
+    if frameMonitor is not None:
+        frameMonitor.setRoutine(routine.name)
+    for component in routine.components:
+        component.item.status = NOT_STARTED
+        component.tStart = None
+        component.tStop = None
+    timed = routine.duration is not None and routineTimer is not None and not frameTiming
+    if timed:
+        routineTimer.add(routine.duration)
+    activeResponses = []
+    nextEvent = 0
+    frameN = -1
+    clock.reset()
+
+    #-------Start routine-------
+    continueRoutine = True
+    while continueRoutine and (not timed or routineTimer.getTime() > 0):
+
+        # Get current time
+        t = clock.getTime()
+        frameN = frameN + 1  # number of completed frames (so 0 is the first frame)
+        if onFrame is not None:
+            onFrame(t, frameN)
+
+        # Start and stop components whose event time (or frame) has been reached
+        while nextEvent < nEvents and (frameN if frameTiming else t) >= eventTriggers[nextEvent]:
+            component = eventComponents[nextEvent]
+            item = component.item
+            if eventActions[nextEvent] == START:
+                # keep track of start time/frame for later
+                component.tStart = t
+                item.tStart = t  # underestimates by a little under one frame
+                item.frameNStart = frameN  # exact frame index
+                if component.isResponse:
+                    item.status = STARTED
+                    # keyboard checking is just starting
+                    item.clock.reset()  # now t=0
+                    if keyboard is not None:
+                        component.resetTime = keyboard.timeFunc()
+                        keyboard.clearEvents()
+                    event.clearEvents(eventType='keyboard')
+                    if component.keyList is not None:
+                        activeResponses.append(component)
+                else:
+                    item.setAutoDraw(True)
+            else:
+                component.tStop = t
+                if component.isResponse:
+                    item.status = STOPPED
+                    if component in activeResponses:
+                        activeResponses.remove(component)
+                else:
+                    item.setAutoDraw(False)
+            nextEvent = nextEvent + 1
+
+        # Check keyboard responses
+        if keyboard is not None:
+            # Key presses since the last frame with their timestamps
+            for (key, timestamp) in keyboard.getKeys():
+                if key == 'escape':
+                    endExpNow = True
+                for component in activeResponses:
+                    if key in component.keyList and timestamp >= component.resetTime:
+                        item = component.item
+                        item.keys = key  # just the last key pressed
+                        item.rt = timestamp - component.resetTime
+                        if component.forceEnd:
+                            # a response ends the routine
+                            continueRoutine = False
+        else:
+            for component in activeResponses:
+                theseKeys = event.getKeys(keyList=component.keyList)
+                if len(theseKeys) > 0:  # at least one key was pressed
+                    item = component.item
+                    item.keys = theseKeys[-1]  # just the last key pressed
+                    item.rt = item.clock.getTime()
+                    if component.forceEnd:
+                        # a response ends the routine
+                        continueRoutine = False
+
+        # Routine is over when all components have finished
+        if continueRoutine and not openEnded and nextEvent == nEvents:
+            continueRoutine = False
+
+        # Check for quit (the Esc key; also polled in PsychoPy if a keyboard reader is used, e.g. a pipe keyboard)
+        if endExpNow or event.getKeys(keyList=["escape"]):
+            from psychopy import core  # imported here, so that the engine runs on a simulated window without PsychoPy
+            core.quit()
+
+        # Refresh the screen
+        if continueRoutine:  # don't flip if this routine is over or we'll get a blank screen
+            win.flip()
+
+    #-------Ending routine-------
+    t = clock.getTime()
+    for component in routine.components:
+        if component.tStart is not None and component.tStop is None:
+            component.tStop = t
+        if not component.isResponse:
+            component.item.setAutoDraw(False)
+
+    return frameN + 1
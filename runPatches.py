@@ -4,6 +4,9 @@ from numpy import average
 from createPatches import createPatches
 from psychopy import core
 from giveFeedback import giveFeedback
+from blockCache import importBlock, blockConditions
+from trialRecords import compileTrials, drawJitter
+from performanceAccumulator import BlockPerformance
 
 def runPatches(experimentStructure, stimuliStructure, data, feedbackText, patchClock, whichLoop,
 conditionName, showFeedback, nTrialsPatches, blockIndex, globalClock, tracker):
@@ -30,42 +33,44 @@ conditionName, showFeedback, nTrialsPatches, blockIndex, globalClock, tracker):
     # Create some shortnames
     expInfo = experimentStructure['expInfo']
     thisExp = experimentStructure['thisExp']
+    frameMonitor = experimentStructure.get('frameMonitor')
+    if frameMonitor is not None:
+        frameMonitor.startBlock(blockIndex)
     
     trialIndexes = 0 # store indexed trials for summary
     
     # Set up handler to look after randomisation of conditions etc
+    block = importBlock(experimentStructure, data, blockIndex)
     trials = data.TrialHandler(nReps=1, method='sequential', 
         extraInfo=expInfo, originPath=None,
-        trialList=data.importConditions(blockIndex),
+        trialList=blockConditions(block),
         seed=None, name=conditionName)
     thisExp.addLoop(trials)  # add the loop to the experiment
-    thisTrial = trials.trialList[0]  # so we can initialise stimuli with some values
     
-    # Abbreviate parameter names if possible (e.g. rgb=thisTrial.rgb)
-    if thisTrial != None:
-        for paramName in thisTrial.keys():
-            exec(paramName + '= thisTrial.' + paramName)
+    # Compile trial records once per block (keys, positions, jitter schedule and patch textures are prepared here)
+    records = compileTrials(block, experimentStructure['whichVersion'], expInfo['cBal'])
+    drawJitter(records, experimentStructure['jitterGenerator'], stimuliStructure['jitter'])
+    if stimuliStructure.get('gaborCache') is not None:
+        stimuliStructure['gaborCache'].prepareBlock(records)
     
     # Loop over trials
     routineTimer = core.CountdownTimer()
+    performance = BlockPerformance()
     myCount = 0 
-    for thisTrial in trials:
-        currentLoop = trials
-        if thisTrial != None:
-            for paramName in thisTrial.keys():
-                exec(paramName + '= thisTrial.' + paramName)
+    for trial in trials:
+        thisTrial = records[trials.thisIndex]
         
         if whichLoop == 'patches':
             thisDifference = float('nan')
             
         # First stage of the task
-        (decision1, trials, routineTimer, globalClock, decision1.timestamp, fixCrossTiming, saccadeMiss) = createPatches(experimentStructure, stimuliStructure, patchClock, targetPatch,
-        trials, whichLoop, thisDifference, PU,routineTimer, globalClock, tracker)
+        (decision1, trials, routineTimer, globalClock, decision1.timestamp, fixCrossTiming, saccadeMiss) = createPatches(experimentStructure, stimuliStructure, patchClock, thisTrial,
+        trials, whichLoop, thisDifference, routineTimer, globalClock, tracker, performance)
         
         # Check if response was made
         if (decision1.keys==None):
             msg = 'Zu langsam!' 
-            giveFeedback(experimentStructure, stimuliStructure, feedbackText, msg, routineTimer, globalClock,1)
+            giveFeedback(experimentStructure, stimuliStructure, feedbackText, msg, routineTimer, globalClock, 1, thisTrial.feedbackJitter)
         
         # Check if response was correct
         elif (decision1.keys!=None):
@@ -75,7 +80,7 @@ conditionName, showFeedback, nTrialsPatches, blockIndex, globalClock, tracker):
                     msg = 'richtig' 
                 elif decision1.corr == 0:
                     msg = 'falsch'
-                giveFeedback(experimentStructure, stimuliStructure, feedbackText, msg, routineTimer, globalClock,0)
+                giveFeedback(experimentStructure, stimuliStructure, feedbackText, msg, routineTimer, globalClock, 0, thisTrial.feedbackJitter)
             
             # Record reaction time
             trials.addData('decision1.rt', decision1.rt)
@@ -83,12 +88,19 @@ conditionName, showFeedback, nTrialsPatches, blockIndex, globalClock, tracker):
         # Record additional data
         trials.addData('whichLoop', whichLoop)
         trials.addData('block', blockIndex)
-        accPerf = trials.data['decision1.corr'].sum()
 
         # Indicate that trial is over
         thisExp.nextEntry()
+        performance.endTrial(int(decision1.keys == None))
         myCount = myCount + 1
         if myCount == nTrialsPatches :
             trials.finished = True
+    
+    # Block performance
+    accPerf = performance.decision1Corr
+    
+    # Frame timing summary of the block (the experimenter is warned if too many frames were dropped)
+    if frameMonitor is not None:
+        frameMonitor.endBlock()
         
     return(accPerf)
\ No newline at end of file
@@ -6,6 +6,10 @@ from createFractals import createFractals
 from psychopy import core
 from simpleInstructions import simpleInstructions
 from giveFeedback import giveFeedback
+from blockCache import importBlock, blockConditions
+from trialRecords import compileTrials, drawJitter
+from performanceAccumulator import BlockPerformance
+from trialScheduler import TrialScheduler
 import re
 
 def runTask(experimentStructure, outcomeStructure, stimuliStructure, data,
@@ -13,7 +17,8 @@ feedbackText, nTrials, whichLoop, blockIndex, blockNumber, conditionName, global
     """ This function runs a single block of the Gabor-bandit task
     
     Here we loop over trials and check if the current participant missed trials.
-    If trials were missed, we repeat these trials at the end of the block.
+    Missed trials are repeated according to the repeat policy of the trial
+    scheduler (experimentStructure 'missPolicy', 'missDelay', 'maxRepeats').
     
     Input:
         experimentStructure: all general experimental properties 
@@ -40,47 +45,59 @@ feedbackText, nTrials, whichLoop, blockIndex, blockNumber, conditionName, global
     patchClock      = stimuliStructure['patchClock']
     win             = experimentStructure['win']
     useEyeTracker   = experimentStructure['useEyeTracker']
-    win.setRecordFrameIntervals(True)
+    whichVersion    = experimentStructure['whichVersion']
+    frameMonitor    = experimentStructure.get('frameMonitor')
+    
+    # Frame intervals of this block are counted by the frame monitor (or recorded by the window)
+    if frameMonitor is not None:
+        frameMonitor.startBlock(blockIndex)
+    else:
+        win.setRecordFrameIntervals(True)
     
     # Set up handler to look after randomisation of conditions etc
+    block = importBlock(experimentStructure, data, blockIndex)
     trials = data.TrialHandler(nReps=1, method='sequential', 
         extraInfo=expInfo, originPath=None,
-        trialList=data.importConditions(blockIndex),
+        trialList=blockConditions(block),
         seed=None, name = conditionName) 
     thisExp.addLoop(trials)  # add the loop to the experiment
-    thisTrial = trials.trialList[0]  # so we can initialise stimuli with some values
     
-    # Abbreviate parameter names if possible (e.g. rgb=thisTrial.rgb)
-    if thisTrial != None:
-        for paramName in thisTrial.keys():
-            exec(paramName + '= thisTrial.' + paramName)
+    # Compile trial records once per block (keys, positions, jitter schedule and patch textures are prepared here)
+    records = compileTrials(block, whichVersion, expInfo['cBal'])
+    drawJitter(records, experimentStructure['jitterGenerator'], stimuliStructure['jitter'])
+    if stimuliStructure.get('gaborCache') is not None:
+        stimuliStructure['gaborCache'].prepareBlock(records)
     
-    myCount         = 0 # counter for total number of completed trials (if missed trials exist, can be larger than nTrials)
-    missCounter     = 0 # counter for number of misses
-    misses          = list() # temporarily saves information about trials that have been missed to repeat these trials
+    # Trial scheduler (owns the queue of pending trials and repeats of missed trials)
+    scheduler       = TrialScheduler(nTrials, experimentStructure['missPolicy'], experimentStructure['missDelay'],
+                                     experimentStructure['maxRepeats'])
     routineTimer    = core.CountdownTimer()
-    currentMiss     = float('nan') # actual trial that has to be repeated next
+    performance     = BlockPerformance() # running rewards, misses and reaction times
+    if experimentStructure.get('agent') is not None:
+        experimentStructure['agent'].startBlock()
     
-    while True: 
+    while scheduler.hasNext(): 
         
         missIndex = 0
-        try:
-            thisTrial = trials.next()
-        except StopIteration:  # we got a StopIteration error
-            currentMiss = misses[0]
-            thisTrial = trials.trialList[currentMiss] 
-        
-        currentLoop = trials
-        
-        # Abbreviate parameter names if possible (e.g. rgb = thisTrial.rgb)
-        if thisTrial != None:
-            for paramName in thisTrial.keys():
-                exec(paramName + '= thisTrial.' + paramName)
+        (trialIndex, repeat) = scheduler.next()
+        thisTrial = records[trialIndex]
+        if repeat == 0:
+            trials.next() # first presentation of a trial follows the order of the block file
+            currentMiss = float('nan')
+        else:
+            currentMiss = trialIndex # trial that is repeated
+            
+            # The TrialHandler still holds the previously presented trial, so the parameters of the repeated trial are recorded explicitly
+            thisExp.addData('PU', thisTrial.PU)
+            thisExp.addData('targetPatch', thisTrial.targetPatch)
+            thisExp.addData('redFractal', thisTrial.redFractal)
+            thisExp.addData('corrAns', thisTrial.corrAns)
+            thisExp.addData('outcomes', thisTrial.outcomes)
         
         # First state (Gabor-patches)
         thisDifference = float('nan')
         (decision1, trials, routineTimer, globalClock, decision1.timestamp, fixCrossTiming, saccadeMiss) = createPatches(experimentStructure,
-        stimuliStructure, patchClock, targetPatch, trials, whichLoop, thisDifference, PU, routineTimer, globalClock, tracker)
+        stimuliStructure, patchClock, thisTrial, trials, whichLoop, thisDifference, routineTimer, globalClock, tracker, performance)
         
         if (decision1.keys==None):
             if saccadeMiss == 1:
@@ -90,14 +107,14 @@ feedbackText, nTrials, whichLoop, blockIndex, blockNumber, conditionName, global
             
             # Feedback, if required
             (routineTimer, globalClock, feedbackTimestamp, fixCrossTiming_feedback) = giveFeedback(experimentStructure,
-            stimuliStructure, feedbackText, msg, routineTimer, globalClock, 1)
+            stimuliStructure, feedbackText, msg, routineTimer, globalClock, 1, thisTrial.feedbackJitter)
             trials.addData('decision1.rt', float('nan'))
             trials.addData('decision2.rt', float('nan'))
             trials.addData('decision2.keys', float('nan'))
             trials.addData('decision2.corr', float('nan'))
             trials.addData('decision2.color', float('nan'))
             trials.addData('decision2.reward', 0)
-            accPerf = trials.data['decision2.reward'].sum()
+            accPerf = performance.addDecision2(float('nan'), 0, float('nan'))
             trials.addData('decision2.accPerf', accPerf)
             
             # Triggers for fMRI
@@ -108,11 +125,17 @@ feedbackText, nTrials, whichLoop, blockIndex, blockNumber, conditionName, global
             trials.addData('feedback.trigger_1', feedbackTimestamp)                             # feedback fixation cross onset
             trials.addData('feedback.trigger_2', (feedbackTimestamp + fixCrossTiming_feedback)) # feedback reward onset
             
-            # Check if trial was missed
-            if (myCount < nTrials):
-                misses.append(myCount)
-                missCounter = missCounter + 1
-                missIndex = 1
+            # Realized durations and quantization error of jittered onsets
+            trials.addData('decision1.fixDuration', decision1.fixDuration)
+            trials.addData('decision1.stimDuration', decision1.stimDuration)
+            trials.addData('decision1.quantError', decision1.quantError)
+            trials.addData('decision2.fixDuration', float('nan'))
+            trials.addData('decision2.stimDuration', float('nan'))
+            trials.addData('decision2.quantError', float('nan'))
+            trials.addData('feedback.fixDuration', feedbackText.fixDuration)
+            trials.addData('feedback.stimDuration', feedbackText.stimDuration)
+            trials.addData('feedback.quantError', feedbackText.quantError)
+            missIndex = 1
 
         elif (decision1.keys!=None):
             
@@ -120,9 +143,9 @@ feedbackText, nTrials, whichLoop, blockIndex, blockNumber, conditionName, global
             trials.addData('decision1.rt', decision1.rt)
             
             # Second stage (fractals)
-            (decision2, trials, misses, missCounter, routineTimer, globalClock, decision2.timestamp, fixCrossTiming, feedbackTimestamp,
-            fixCrossTiming_feedback, missIndex) = createFractals(experimentStructure, outcomeStructure, stimuliStructure, redFractal, 
-            targetPatch, corrAns, trials, outcomes, feedbackText, misses, missCounter, myCount, routineTimer, globalClock, nTrials)
+            (decision2, trials, routineTimer, globalClock, decision2.timestamp, fixCrossTiming, feedbackTimestamp,
+            fixCrossTiming_feedback, missIndex) = createFractals(experimentStructure, outcomeStructure, stimuliStructure, thisTrial,
+            trials, feedbackText, routineTimer, globalClock, performance)
             
             # Triggers for fMRI
             trials.addData('decision1.trigger_1', decision1.timestamp)                          # decision1 fixation cross onset
@@ -132,33 +155,48 @@ feedbackText, nTrials, whichLoop, blockIndex, blockNumber, conditionName, global
             trials.addData('feedback.trigger_1', feedbackTimestamp)                             # feedback fixation cross onset
             trials.addData('feedback.trigger_2', feedbackTimestamp + fixCrossTiming_feedback)   # feedback reward onset
             
-            # Delete miss that has been repeated
-            if (decision2.keys!=None) and myCount >= nTrials and len(misses) > 0:
-                misses.pop(0)
+            # Realized durations and quantization error of jittered onsets
+            trials.addData('decision1.fixDuration', decision1.fixDuration)
+            trials.addData('decision1.stimDuration', decision1.stimDuration)
+            trials.addData('decision1.quantError', decision1.quantError)
+            trials.addData('decision2.fixDuration', decision2.fixDuration)
+            trials.addData('decision2.stimDuration', decision2.stimDuration)
+            trials.addData('decision2.quantError', decision2.quantError)
+            trials.addData('feedback.fixDuration', feedbackText.fixDuration)
+            trials.addData('feedback.stimDuration', feedbackText.stimDuration)
+            trials.addData('feedback.quantError', feedbackText.quantError)
         
         # Record data
         trials.addData('whichLoop', whichLoop)
         trials.addData('block', blockIndex)
         trials.addData('blockNumber', blockNumber)
         trials.addData('eyeTracker', useEyeTracker)
+        trials.addData('trialIndex', trialIndex)
+        trials.addData('repeat', repeat)
         trials.addData('missIndex', missIndex)
-        trials.addData('misses', missCounter)
+        
+        # Repeat missed trial (according to repeat policy)
+        givenUp = 0
+        if missIndex == 1:
+            givenUp = int(not scheduler.missed())
+        trials.addData('givenUp', givenUp)
+        trials.addData('maxTrials', scheduler.maxLength())
+        trials.addData('misses', scheduler.nMisses)
         trials.addData('currentMiss', currentMiss)
+        if not scheduler.hasNext():
+            trials.addData('trialOrder', ' '.join(str(x) for x in scheduler.realizedOrder())) # realized order of the block
         thisExp.nextEntry()
         
         # Update counter
-        myCount = myCount + 1
-        
-        # Check if more we have to repeat any misses
-        if (myCount) >= nTrials and len(misses)==0:
-            break
+        performance.endTrial(missIndex)
     
     # Block performance 
-    if 'decision2' in locals():
-        accPerf = trials.data['decision1.reward'].sum() + trials.data['decision2.reward'].sum()
+    accPerf = performance.accPerf()
+    
+    # Frame timing summary of the block (the experimenter is warned if too many frames were dropped)
+    if frameMonitor is not None:
+        frameMonitor.endBlock()
     else:
-        accPerf = trials.data['decision1.reward'].sum()
-        
-    win.setRecordFrameIntervals(False)    
+        win.setRecordFrameIntervals(False)    
     
     return(accPerf, win)
\ No newline at end of file
@@ -0,0 +1,194 @@
+import os
+import csv
+import time
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# fMRI trigger listener
+#
+# A background thread waits for the TR pulses of the scanner (parallel port
+# or software emulator), timestamps every pulse against the global clock and
+# puts the timestamps into a queue. The task only reads the queue, so waiting
+# for the scanner does not depend on the frame loop. The pulse times of every
+# block are appended to a separate file (filename_triggers.csv), not to the
+# data file, where they would be a row of the unfinished trial loop of the block.
+
+
+class ParallelPortSource(object):
+    """ This class detects TR pulses on a pin of the parallel port
+
+    Input:
+        address: address of parallel port
+        pin: pin that receives the scanner pulse
+        pollInterval: time between two reads of the pin in seconds
+    """
+
+    def __init__(self, address=0x0378, pin=10, pollInterval=0.0005):
+        from psychopy import parallel
+        self.port = parallel.ParallelPort(address=address)
+        self.pin = pin
+        self.pollInterval = pollInterval
+        self.running = True
+
+    def waitForPulse(self):
+        """ This function blocks until the next rising edge (returns False if source was closed) """
+
+        level = self.port.readPin(self.pin)
+        while self.running:
+            previousLevel = level
+            level = self.port.readPin(self.pin)
+            if level == 1 and previousLevel != 1:
+                return True
+            time.sleep(self.pollInterval)
+        return False
+
+    def close(self):
+        self.running = False
+
+
+class ScannerEmulator(object):
+    """ This class generates TR pulses in software (stand-in for the scanner)
+
+    Input:
+        TR: repetition time in seconds
+        speedUp: factor by which the emulated scanner runs faster than real time
+        volumes: number of volumes (None = until closed)
+        startDelay: time before the first pulse in seconds
+    """
+
+    def __init__(self, TR=2.0, speedUp=1.0, volumes=None, startDelay=1.0):
+        self.interval = TR / float(speedUp)
+        self.volumes = volumes
+        self.startDelay = startDelay
+        self.nPulses = 0
+        self.nextPulse = None
+        self.closed = threading.Event()
+
+    def waitForPulse(self):
+        """ This function blocks until the next emulated pulse (returns False if source was closed or run is over) """
+
+        if self.nextPulse is None:
+            self.nextPulse = time.time() + self.startDelay
+        if self.volumes is not None and self.nPulses >= self.volumes:
+            return False
+        if self.closed.wait(max(0, self.nextPulse - time.time())):
+            return False
+        self.nPulses = self.nPulses + 1
+        self.nextPulse = self.nextPulse + self.interval
+        return True
+
+    def close(self):
+        self.closed.set()
+
+
+class TriggerListener(object):
+    """ This class listens for TR pulses on a background thread
+
+    Input:
+        source: pulse source (ParallelPortSource or ScannerEmulator)
+        globalClock: clock to control timing during fMRI
+        pulseFile: path of the .csv file that the pulse times of every block are appended to (None = not recorded)
+    """
+
+    def __init__(self, source, globalClock, pulseFile=None):
+        self.source = source
+        self.globalClock = globalClock
+        self.pulseFile = pulseFile
+        self.pulses = queue.Queue()
+        self.nPulses = 0
+        self.thread = threading.Thread(target=self.run, name='triggerListener')
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        while self.source.waitForPulse():
+            self.pulses.put(self.globalClock.getTime())
+            self.nPulses = self.nPulses + 1
+
+    def getPulse(self, timeout=None):
+        """ This function returns the time of the next pulse
+
+        Input:
+            timeout: maximal waiting time in seconds (None = do not wait)
+
+        Return:
+            pulseTime: time of pulse on the global clock (None if no pulse was received)
+        """
+
+        try:
+            if timeout is None:
+                return self.pulses.get_nowait()
+            return self.pulses.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self):
+        """ This function removes and returns all received pulses
+
+        Return:
+            pulseTimes: list of pulse times on the global clock
+        """
+
+        pulseTimes = []
+        pulseTime = self.getPulse()
+        while pulseTime is not None:
+            pulseTimes.append(pulseTime)
+            pulseTime = self.getPulse()
+        return pulseTimes
+
+    def recordBlock(self, conditionName, blockNumber, blockIndex):
+        """ This function appends the times of all pulses of a block to the pulse file
+
+        The first pulse of the block (time zero of the global clock) was
+        already read when the block was started.
+
+        Input:
+            conditionName: name of current condition
+            blockNumber: indicates current block number
+            blockIndex: path to pre-generated block
+
+        Return:
+            pulseTimes: list of pulse times on the global clock
+        """
+
+        pulseTimes = [0.0] + self.drain()
+        if self.pulseFile is not None:
+            newFile = not os.path.isfile(self.pulseFile) or os.path.getsize(self.pulseFile) == 0
+            with open(self.pulseFile, 'a') as f:
+                writer = csv.writer(f, lineterminator='\n')
+                if newFile:
+                    writer.writerow(['condition', 'blockNumber', 'block', 'triggerTimes'])
+                writer.writerow([conditionName, blockNumber, blockIndex, ' '.join(['%.4f' % x for x in pulseTimes])])
+        return pulseTimes
+
+    def stop(self):
+        self.source.close()
+
+
+def openTriggerListener(triggerSource, globalClock, TR=2.0, speedUp=1.0, pulseFile=None):
+    """ This function starts the trigger listener
+
+    Input:
+        triggerSource: 'parallel' = parallel port; 'emulator' = software scanner
+        globalClock: clock to control timing during fMRI
+        TR: repetition time of emulated scanner in seconds
+        speedUp: speed-up factor of emulated scanner
+        pulseFile: path of the .csv file of the pulse times (None = not recorded)
+
+    Return:
+        triggerListener: running trigger listener
+    """
+
+    if triggerSource == 'parallel':
+        source = ParallelPortSource()
+    elif triggerSource == 'emulator':
+        source = ScannerEmulator(TR, speedUp)
+    else:
+        raise ValueError('unknown trigger source %r (use parallel or emulator)' % triggerSource)
+    return TriggerListener(source, globalClock, pulseFile).start()
@@ -0,0 +1,166 @@
+import numpy as np
+
+# Session checkpoints in the trial log
+#
+# At every block boundary of a task loop, a checkpoint row is appended to the
+# streamed trial log. It contains the block order of the current part, the
+# number of completed blocks, the points of these blocks, the results of all
+# completed parts of the session, the states of the jitter generator and of
+# the global NumPy generator (block shuffling), and the measured frame rate.
+#
+# To resume an interrupted session, only the checkpoint rows of the log are
+# parsed (the last one holds the complete state). Completed parts and their
+# instructions are skipped, the interrupted part continues with the block after
+# the last completed block, and further rows are appended to the same log.
+
+
+def randomStateToList(randomState):
+    """ This function converts the state of a numpy RandomState into a json-encodable list
+
+    Input:
+        randomState: numpy RandomState instance (or the numpy.random module)
+
+    Return:
+        state: list of name, keys, position, has_gauss and cached_gaussian
+    """
+
+    (name, keys, pos, hasGauss, cachedGaussian) = randomState.get_state()[:5]
+    return [name, keys.tolist(), int(pos), int(hasGauss), float(cachedGaussian)]
+
+
+def listToRandomState(randomState, state):
+    """ This function restores the state of a numpy RandomState
+
+    Input:
+        randomState: numpy RandomState instance (or the numpy.random module)
+        state: list as returned by randomStateToList
+
+    Return: ~
+    """
+
+    (name, keys, pos, hasGauss, cachedGaussian) = state
+    randomState.set_state((str(name), np.array(keys, dtype=np.uint32), pos, hasGauss, cachedGaussian))
+
+
+def loadCheckpoint(path):
+    """ This function reads the last checkpoint of a trial log
+
+    Input:
+        path: path of trial log
+
+    Return:
+        state: checkpoint dictionary (None if the log has no checkpoint)
+    """
+
+    import json
+    state = None
+    with open(path, 'r') as f:
+        for line in f:
+            if line.startswith('{"checkpoint": ') and line.endswith('\n'):
+                state = json.loads(line)['checkpoint']
+    return state
+
+
+class SessionCheckpoint(object):
+    """ This class records and restores the progress of a session at block boundaries
+
+    When a session is resumed, the random generators are set to their state
+    at the last checkpoint, so that block order and jitter schedules continue
+    as in the interrupted session.
+
+    Input:
+        expInfo: structure with background information about experiment
+        jitterGenerator: numpy RandomState instance of the jitter schedules
+        trialLog: trial log that checkpoints are appended to (None = no checkpoints)
+        state: checkpoint of an interrupted session (None = new session)
+    """
+
+    def __init__(self, expInfo, jitterGenerator, trialLog=None, state=None):
+        self.expInfo = expInfo
+        self.jitterGenerator = jitterGenerator
+        self.trialLog = trialLog
+        self.resumeState = state
+        self.parts = {}  # results of completed parts
+        self.current = None
+        if state is not None:
+            for name in ('participant', 'session', 'cBal'):
+                if str(state['expInfo'][name]) != str(expInfo[name]):
+                    raise ValueError('checkpoint belongs to %s %s, not %s' % (name, state['expInfo'][name], expInfo[name]))
+            self.parts = dict(state['parts'])
+            listToRandomState(jitterGenerator, state['jitterState'])
+            listToRandomState(np.random, state['globalState'])
+            if trialLog is not None:
+                trialLog.append({'resumed': {'part': state['part'], 'completedBlocks': state['completedBlocks']}})
+
+    def isComplete(self, part):
+        """ This function indicates if a part of the session was completed before the interruption """
+
+        return part in self.parts
+
+    def isStarted(self, part):
+        """ This function indicates if a part of the session was started before the interruption """
+
+        return part in self.parts or (self.resumeState is not None and self.resumeState['part'] == part)
+
+    def result(self, part):
+        """ This function returns the stored results of a completed part (e.g. score and reward) """
+
+        return tuple(self.parts[part])
+
+    def startPart(self, part, blockList):
+        """ This function starts a task loop (the interrupted loop continues where it stopped)
+
+        Input:
+            part: name of part (condition name of the task loop)
+            blockList: shuffled block order of a new part
+
+        Return:
+            blockList: block order (the stored one if the part is resumed)
+            firstBlock: index of the first block that is run
+            accPerf: points of the completed blocks
+        """
+
+        state = self.resumeState
+        if state is not None and state['part'] == part and part not in self.parts:
+            self.current = (part, list(state['blockList']), list(state['accPerf']))
+            return list(state['blockList']), state['completedBlocks'], list(state['accPerf'])
+        self.current = (part, list(blockList), [])
+        return blockList, 0, []
+
+    def blockDone(self, accPerf):
+        """ This function writes a checkpoint after a completed block
+
+        Input:
+            accPerf: points of all completed blocks of the current part
+
+        Return: ~
+        """
+
+        (part, blockList, previous) = self.current
+        self.current = (part, blockList, list(accPerf))
+        self.write()
+
+    def partDone(self, part, *results):
+        """ This function stores the results of a completed part and writes a checkpoint
+
+        Input:
+            part: name of part
+            results: results of the part (e.g. score and reward)
+
+        Return: ~
+        """
+
+        self.parts[part] = list(results)
+        self.write()
+
+    def write(self):
+        """ This function appends the current state to the trial log """
+
+        if self.trialLog is None:
+            return
+        (part, blockList, accPerf) = self.current or (None, [], [])
+        info = dict((name, self.expInfo.get(name)) for name in ('participant', 'session', 'cBal', 'date', 'frameRate'))
+        self.trialLog.append({'checkpoint': {'part': part, 'blockList': list(blockList), 'completedBlocks': len(accPerf),
+                              'accPerf': list(accPerf), 'parts': dict(self.parts), 'expInfo': info,
+                              'jitterState': randomStateToList(self.jitterGenerator),
+                              'globalState': randomStateToList(np.random)}})
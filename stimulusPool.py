@@ -0,0 +1,107 @@
+import os
+
+# Process-wide stimulus pool
+#
+# Images are decoded once and the decoded image is shared by all stimuli that
+# show it. Configured stimuli are handed out by key, so that task and example
+# routines (which are called repeatedly during the practice session) reuse the
+# same instances and their GPU textures instead of building new ones.
+
+pools = {}  # one pool per window
+
+
+class StimulusPool(object):
+    """ This class keeps decoded images and configured stimuli by key
+
+    Input:
+        win: window object instance
+    """
+
+    def __init__(self, win):
+        self.win = win
+        self.images = {}
+        self.stims = {}
+        self.nHits = 0
+        self.nMisses = 0
+        self.nDecoded = 0
+
+    def image(self, path):
+        """ This function returns the decoded image of a file (decoded only once)
+
+        Input:
+            path: path to image file
+
+        Return:
+            image: decoded PIL image
+        """
+
+        key = os.path.abspath(path)
+        image = self.images.get(key)
+        if image is None:
+            from PIL import Image
+            image = Image.open(path)
+            image.load()
+            self.images[key] = image
+            self.nDecoded = self.nDecoded + 1
+        return image
+
+    def get(self, key, stimType, **params):
+        """ This function returns the stimulus of a key (created on first request)
+
+        Input:
+            key: name of stimulus in the pool
+            stimType: stimulus class (e.g. visual.ImageStim)
+            params: parameters of the stimulus (only used when it is created)
+
+        Return:
+            stim: stimulus object instance
+        """
+
+        stim = self.stims.get(key)
+        if stim is None:
+            stim = stimType(**params)
+            self.stims[key] = stim
+            self.nMisses = self.nMisses + 1
+        else:
+            self.nHits = self.nHits + 1
+        return stim
+
+    def textureBytes(self):
+        """ This function returns the memory of all decoded images
+
+        Return:
+            nBytes: memory in bytes
+        """
+
+        nBytes = 0
+        for image in self.images.values():
+            (width, height) = image.size
+            nBytes = nBytes + width * height * len(image.getbands())
+        return nBytes
+
+    def stats(self):
+        """ This function returns the usage statistics of the pool
+
+        Return:
+            stats: dictionary with hits, misses, number of stimuli and decoded images, and texture memory
+        """
+
+        return {'hits': self.nHits, 'misses': self.nMisses, 'stims': len(self.stims),
+                'images': self.nDecoded, 'textureBytes': self.textureBytes()}
+
+
+def stimulusPool(win):
+    """ This function returns the stimulus pool of a window
+
+    Input:
+        win: window object instance
+
+    Return:
+        pool: stimulus pool that is shared by all routines of the process
+    """
+
+    pool = pools.get(id(win))
+    if pool is None or pool.win is not win:
+        pool = StimulusPool(win)
+        pools[id(win)] = pool
+    return pool
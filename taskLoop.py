@@ -2,6 +2,7 @@
 
 
 from numpy.random import shuffle
+from psychopy import visual, core
 from simpleInstructions import simpleInstructions 
 from runTask import runTask 
 
@@ -35,25 +36,37 @@ feedbackText, nTrials, tracker, blockList, expInfo, conditionName, targetWord):
     
     """
     
+    # Create some shortnames
+    win             = experimentStructure['win']
+    event           = experimentStructure['event']
+    triggerListener = experimentStructure['triggerListener']
+    checkpoint      = experimentStructure.get('checkpoint')
+    
     whichLoop = conditionName
     accPerf = []
+    firstBlock = 0
+    
+    # Continue an interrupted task loop with the next block
+    if checkpoint is not None:
+        (blockList, firstBlock, accPerf) = checkpoint.startPart(conditionName, blockList)
     
     # Start task
-    for x in range (0, nBlocks):
+    for x in range (firstBlock, nBlocks):
         
         # Wait for fMRI signal and sync with globalClock
         if whichVersion == 2:
             
-            port = parallel.ParallelPort(address=0x0378)
+            # Pulses of the previous block are not needed anymore
+            triggerListener.drain()
             
             dummy = visual.TextStim(win, text='Warte auf MRT Signal...', units='pix')
             
             while 1:
                 dummy.draw()
                 win.flip()
-                dat = port.readPin(10)
-                if dat == 1:
-                    globalClock.reset()
+                pulseTime = triggerListener.getPulse()
+                if pulseTime != None:
+                    globalClock.add(pulseTime) # time of first pulse is zero
                     break
                 # check for quit:
                 if event.getKeys(keyList=["escape"]):
@@ -71,6 +84,14 @@ feedbackText, nTrials, tracker, blockList, expInfo, conditionName, targetWord):
         
         accPerf.append(y)
         
+        # Record times of all TR pulses of this block (filename_triggers.csv)
+        if whichVersion == 2:
+            triggerListener.recordBlock(conditionName, x, blockIndex)
+        
+        # Checkpoint at block boundary
+        if checkpoint is not None:
+            checkpoint.blockDone(accPerf)
+        
         if x < nBlocks-1:
             header = 'Block %1.0f von %1.0f' %(x+1,nBlocks)
             mainText = ("""In diesem Block hast Du %1.0f Punkte gesammelt!\n\n"""
@@ -92,4 +113,7 @@ feedbackText, nTrials, tracker, blockList, expInfo, conditionName, targetWord):
     
     print('Reward for subject %s in %s: %s Euros' %(expInfo['participant'], conditionName, totalReward))
     
+    if checkpoint is not None:
+        checkpoint.partDone(conditionName, sum(accPerf), totalReward)
+    
     return(sum(accPerf), totalReward)
\ No newline at end of file
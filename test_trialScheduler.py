@@ -0,0 +1,64 @@
+import unittest
+from trialScheduler import TrialScheduler
+
+# Tests of the repeat policies of the trial scheduler (python -m pytest or python -m unittest)
+
+
+def runBlock(scheduler, misses):
+    """ This function presents all trials of a scheduler
+
+    Input:
+        scheduler: trial scheduler object instance
+        misses: dictionary of trial index -> number of presentations that are missed
+
+    Return:
+        order: realized order of (trial index, repeat)
+        givenUp: list of trial indices that were given up
+    """
+
+    order = []
+    givenUp = []
+    while scheduler.hasNext():
+        (trialIndex, repeat) = scheduler.next()
+        order.append((trialIndex, repeat))
+        if misses.get(trialIndex, 0) > repeat and not scheduler.missed():
+            givenUp.append(trialIndex)
+    return order, givenUp
+
+
+class TestTrialScheduler(unittest.TestCase):
+
+    def testEnd(self):
+        scheduler = TrialScheduler(5, 'end')
+        (order, givenUp) = runBlock(scheduler, {1: 2, 3: 1})
+        self.assertEqual(order, [(0, 0), (1, 0), (2, 0), (3, 0), (4, 0), (1, 1), (3, 1), (1, 2)])
+        self.assertEqual(scheduler.realizedOrder(), [0, 1, 2, 3, 4, 1, 3, 1])
+        self.assertEqual(givenUp, [])
+        self.assertEqual(scheduler.nMisses, 3)
+
+    def testAfter(self):
+        scheduler = TrialScheduler(6, 'after', delay=2)
+        (order, givenUp) = runBlock(scheduler, {1: 2, 4: 1})
+        self.assertEqual(scheduler.realizedOrder(), [0, 1, 2, 3, 1, 4, 5, 1, 4])
+        self.assertEqual(order[4], (1, 1))
+        self.assertEqual(order[7], (1, 2))
+
+    def testAfterDelayZero(self):
+        scheduler = TrialScheduler(3, 'after', delay=0)
+        runBlock(scheduler, {0: 1})
+        self.assertEqual(scheduler.realizedOrder(), [0, 0, 1, 2])
+
+    def testMaxRepeats(self):
+        scheduler = TrialScheduler(3, 'end', maxRepeats=1)
+        (order, givenUp) = runBlock(scheduler, {0: 5, 2: 1})
+        self.assertEqual(order, [(0, 0), (1, 0), (2, 0), (0, 1), (2, 1)])
+        self.assertEqual(givenUp, [0])
+        self.assertEqual(scheduler.nGivenUp, 1)
+        self.assertEqual(scheduler.maxLength(), 6)
+
+    def testUnknownPolicy(self):
+        self.assertRaises(ValueError, TrialScheduler, 3, 'random')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import os
+import json
+import atexit
+import threading
+from collections import deque
+
+# Streaming append-only trial log
+#
+# Every row of the experiment handler (thisExp.nextEntry) is queued for a
+# background writer thread that appends it as one JSON line to the log file.
+# The writer drains all queued rows, writes them and syncs the file once per
+# batch (group commit), so the frame loop never touches the disk and a crash
+# loses at most the trial that was in flight. Rows that are still queued on
+# core.quit() are written by an exit handler. A truncated last line (crash
+# while writing) is skipped when the log is read.
+
+
+def jsonValue(value):
+    """ This function converts values that json cannot encode (e.g. NumPy types)
+
+    Input:
+        value: value of a data column
+
+    Return:
+        value: encodable value
+    """
+
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+
+class TrialLog(object):
+    """ This class appends rows to a JSON-lines file on a background thread
+
+    Input:
+        path: path of log file (rows are appended if it exists)
+        syncInterval: maximal time in seconds between writer wake-ups (rows are written immediately when queued)
+    """
+
+    def __init__(self, path, syncInterval=1.0):
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.path = path
+        self.syncInterval = syncInterval
+        self.file = open(path, 'a')
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.running = True
+        self.nWritten = 0
+        self.nSyncs = 0
+        self.thread = threading.Thread(target=self.run, name='trialLog')
+        self.thread.daemon = True
+        self.thread.start()
+        atexit.register(self.close)
+
+    def append(self, row):
+        """ This function queues a row (called between trials; does not touch the disk)
+
+        Input:
+            row: dictionary of data columns
+        """
+
+        with self.condition:
+            self.queue.append(row)
+            self.condition.notify()
+
+    def run(self):
+        """ This function writes queued rows until the log is closed (writer thread) """
+
+        while True:
+            with self.condition:
+                if self.running and len(self.queue) == 0:
+                    self.condition.wait(self.syncInterval)
+                rows = list(self.queue)
+                self.queue.clear()
+                running = self.running
+            if len(rows) > 0:
+                self.write(rows)
+            if not running:
+                break
+
+    def write(self, rows):
+        """ This function appends a batch of rows and syncs the file once
+
+        Input:
+            rows: list of dictionaries of data columns
+        """
+
+        lines = [json.dumps(row, default=jsonValue, sort_keys=True) + '\n' for row in rows]
+        self.file.write(''.join(lines))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.nWritten = self.nWritten + len(rows)
+        self.nSyncs = self.nSyncs + 1
+
+    def close(self):
+        """ This function writes all remaining rows and closes the file """
+
+        if not self.running:
+            return
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+        self.file.close()
+
+
+def streamEntries(thisExp, trialLog):
+    """ This function streams every completed entry of an experiment handler to a trial log
+
+    The handler keeps its entries and end-of-session files; the log is an
+    additional crash-safe copy. Rows contain the loop information and
+    extraInfo that nextEntry adds.
+
+    Input:
+        thisExp: experiment handler
+        trialLog: trial log
+
+    Return:
+        thisExp: experiment handler with streaming nextEntry
+    """
+
+    nextEntry = thisExp.nextEntry
+
+    def streamingNextEntry():
+        nextEntry()
+        trialLog.append(thisExp.entries[-1])
+
+    thisExp.nextEntry = streamingNextEntry
+    return thisExp
+
+
+def readTrialLog(path):
+    """ This function reads all complete rows of a trial log
+
+    Input:
+        path: path of log file
+
+    Return:
+        rows: list of dictionaries of data columns
+    """
+
+    rows = []
+    with open(path, 'r') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                break  # truncated by a crash while writing
+            rows.append(json.loads(line))
+    return rows
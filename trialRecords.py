@@ -0,0 +1,161 @@
+import zlib
+import numpy as np
+
+# Compiled trial records
+#
+# Blocks are compiled once into lightweight records with typed fields.
+# Everything that only depends on the block file, the task version and the
+# counterbalancing (response keys, stimulus positions, state) is resolved
+# here, so that the trial loop only reads attributes. The jitter schedule of
+# the block is drawn here as well.
+
+# Response keys of the behavioral (1) and fMRI (2) version
+keyMaps = {1: {'left': 'left', 'right': 'right', 'up': 'up', 'down': 'down'},
+           2: {'left': '3', 'right': '1', 'up': '4', 'down': '2'}}
+
+# Positions of the fractals [fractal1 (blue), fractal2 (red)]
+fractalPositions = {'up': ([0, -4], [0, 4]), 'down': ([0, 4], [0, -4])}
+
+
+class TrialRecord(object):
+    """ This class stores the parameters of a single trial
+
+    Input:
+        index: index of trial in block file
+        PU: presented contrast difference
+        targetPatch: position of the patch that should be identified
+        redFractal: position of red fractal
+        corrAns: indicates which fractal position is correct (up vs. down)
+        outcomes: outcome if answer is correct
+    """
+
+    __slots__ = ('index', 'PU', 'targetPatch', 'redFractal', 'corrAns', 'outcomes',
+                 'targetPatchKey', 'redFractalKey', 'blueFractalKey', 'corrAnsKey',
+                 'patch1Pos', 'patch2Pos', 'fractal1Pos', 'fractal2Pos', 'deltaContrast', 'state',
+                 'patchJitter', 'fractalJitter', 'feedbackJitter')
+
+    def __init__(self, index, PU, targetPatch, redFractal, corrAns, outcomes):
+        self.index = index
+        self.PU = PU
+        self.targetPatch = targetPatch
+        self.redFractal = redFractal
+        self.corrAns = corrAns
+        self.outcomes = outcomes
+        self.patchJitter = 0.0
+        self.fractalJitter = 0.0
+        self.feedbackJitter = 0.0
+
+
+def compileTrials(conditions, whichVersion, cBal):
+    """ This function compiles the trial list of a block into trial records
+
+    Input:
+        conditions: block as structured array (slice of block cache) or list of dictionaries (one per trial)
+        whichVersion: 1 = behavioral; 2 = fMRI
+        cBal: 1 = high contrast patch, 2 = low contrast patch
+
+    Return:
+        records: list of trial records
+    """
+
+    keyMap = keyMaps[whichVersion]
+    if isinstance(conditions, np.ndarray):
+        # Cached block: read the typed columns of the slice (no dictionary per trial)
+        columns = zip(conditions['PU'].tolist(), conditions['targetPatch'].tolist(), conditions['redFractal'].tolist(),
+                      conditions['corrAns'].tolist(), conditions['outcomes'].tolist())
+    else:
+        columns = ((float(x['PU']), str(x['targetPatch']), str(x['redFractal']), str(x['corrAns']),
+                    int(float(x['outcomes']))) for x in conditions)
+    records = []
+    for i, (PU, targetPatch, redFractal, corrAns, outcomes) in enumerate(columns):
+        record = TrialRecord(i, PU, str(targetPatch), str(redFractal), str(corrAns), outcomes)
+
+        # Perceptual decision: key, patch positions, delta contrast and state
+        record.targetPatchKey = keyMap.get(record.targetPatch)
+        left = record.targetPatch == 'left'
+        if (cBal == '1') == left:
+            record.patch1Pos = [-6, 0]
+            record.patch2Pos = [6, 0]
+        else:
+            record.patch1Pos = [6, 0]
+            record.patch2Pos = [-6, 0]
+        if left:
+            record.deltaContrast = record.PU * -1
+            record.state = 0
+        else:
+            record.deltaContrast = record.PU
+            record.state = 1
+
+        # Economic decision: keys and fractal positions (not defined for perceptual decision blocks)
+        if record.redFractal in fractalPositions:
+            record.redFractalKey = keyMap[record.redFractal]
+            if record.redFractal == 'up':
+                record.blueFractalKey = keyMap['down']
+            else:
+                record.blueFractalKey = keyMap['up']
+            (record.fractal1Pos, record.fractal2Pos) = fractalPositions[record.redFractal]
+        else:
+            record.redFractalKey = None
+            record.blueFractalKey = None
+            record.fractal1Pos = None
+            record.fractal2Pos = None
+        record.corrAnsKey = keyMap.get(record.corrAns)
+        records.append(record)
+    return records
+
+
+def jitterGenerator(participant, session):
+    """ This function creates the random number generator for the jitter of a participant
+
+    The seed only depends on participant and session, so that the jitter
+    schedule of a session can be reproduced.
+
+    Input:
+        participant: participant's ID
+        session: 1 = practice; 2 = main condition; 3 = digit-span
+
+    Return:
+        generator: numpy RandomState instance
+        seed: seed of the generator
+    """
+
+    seed = zlib.crc32(('%s-%s' % (participant, session)).encode('utf-8')) & 0xffffffff
+    return np.random.RandomState(seed), seed
+
+
+def drawJitter(records, generator, jitter):
+    """ This function draws the jitter schedule of a block and stores it in the trial records
+
+    Fixation jitter of patches, fractals and feedback are drawn in one call
+    when the block is loaded, instead of during the trials.
+
+    Input:
+        records: list of trial records
+        generator: numpy RandomState instance
+        jitter: maximal jitter in seconds
+
+    Return:
+        schedule: array with jitter of patches, fractals and feedback (one row per trial)
+    """
+
+    schedule = generator.uniform(0, jitter, size=(len(records), 3))
+    for (record, (patchJitter, fractalJitter, feedbackJitter)) in zip(records, schedule.tolist()):
+        record.patchJitter = patchJitter
+        record.fractalJitter = fractalJitter
+        record.feedbackJitter = feedbackJitter
+    return schedule
+
+
+def decisionKeys(whichVersion):
+    """ This function returns the valid response keys of both decisions
+
+    Input:
+        whichVersion: 1 = behavioral; 2 = fMRI
+
+    Return:
+        decision1Keys: keys of perceptual decision (left, right)
+        decision2Keys: keys of economic decision (up, down)
+    """
+
+    keyMap = keyMaps[whichVersion]
+    return [keyMap['left'], keyMap['right']], [keyMap['up'], keyMap['down']]
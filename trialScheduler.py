@@ -0,0 +1,97 @@
+from collections import deque
+
+# Scheduling of trials within a block
+#
+# The scheduler owns the queue of pending trials. Every trial of the block is
+# presented once in its original order; missed trials are put back into the
+# queue according to the repeat policy.
+
+# Repeat policies
+policies = ('end', 'after')
+
+
+class TrialScheduler(object):
+    """ This class schedules the trials of a block including repeats of missed trials
+
+    Input:
+        nTrials: number of trials in the block
+        policy: 'end' = missed trials are repeated at the end of the block;
+                'after' = missed trials are repeated after 'delay' other trials
+        delay: number of trials before a missed trial is repeated (policy 'after')
+        maxRepeats: number of repeats after which a missed trial is given up (None = repeat until answered)
+    """
+
+    def __init__(self, nTrials, policy='end', delay=0, maxRepeats=None):
+        if policy not in policies:
+            raise ValueError('unknown repeat policy %r (use one of %s)' % (policy, ', '.join(policies)))
+        self.nTrials = nTrials
+        self.policy = policy
+        self.delay = delay
+        self.maxRepeats = maxRepeats
+        self.pending = deque((trialIndex, 0) for trialIndex in range(nTrials))
+        self.current = None
+        self.order = []      # realized order of (trial index, repeat)
+        self.nMisses = 0     # number of missed trials
+        self.nGivenUp = 0    # number of trials that were given up
+
+    def realizedOrder(self):
+        """ This function returns the realized trial order of the block so far (including repeats)
+
+        Return:
+            realizedOrder: list of trial indices in the order of presentation
+        """
+
+        return [trialIndex for (trialIndex, repeat) in self.order]
+
+    def maxLength(self):
+        """ This function returns the maximal number of trials of the block
+
+        Return:
+            maxLength: maximal number of trials (None if missed trials are repeated until answered)
+        """
+
+        if self.maxRepeats is None:
+            return None
+        return self.nTrials * (self.maxRepeats + 1)
+
+    def hasNext(self):
+        """ This function indicates if trials are pending
+
+        Return:
+            hasNext: True if at least one trial is pending
+        """
+
+        return len(self.pending) > 0
+
+    def next(self):
+        """ This function returns the next trial
+
+        Return:
+            trialIndex: index of trial in block file
+            repeat: number of previous presentations of this trial (0 = first presentation)
+        """
+
+        self.current = self.pending.popleft()
+        self.order.append(self.current)
+        return self.current
+
+    def missed(self):
+        """ This function puts the current trial back into the queue
+
+        Return:
+            requeued: True if trial will be repeated, False if it was given up
+        """
+
+        self.nMisses = self.nMisses + 1
+        (trialIndex, repeat) = self.current
+        if self.maxRepeats is not None and repeat >= self.maxRepeats:
+            self.nGivenUp = self.nGivenUp + 1
+            return False
+        if self.policy == 'end' or self.delay >= len(self.pending):
+            self.pending.append((trialIndex, repeat + 1))
+        else:
+            # deque.insert requires Python 3.5
+            self.pending.rotate(-self.delay)
+            self.pending.appendleft((trialIndex, repeat + 1))
+            self.pending.rotate(self.delay)
+        return True
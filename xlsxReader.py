@@ -0,0 +1,198 @@
+import re
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+# Streaming reader for the small .xlsx files of the task
+#
+# Block files and digit-span files only contain a header row and a few
+# columns of shared strings or numbers. Instead of going through a general
+# spreadsheet library, the reader pulls xl/sharedStrings.xml and the first
+# worksheet straight from the zip archive and parses them incrementally.
+
+ns = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+# Column types of the pre-generated block files
+blockColumnTypes = {'PU': float, 'targetPatch': str, 'redFractal': str, 'corrAns': str,
+                    'outcomes': lambda x: int(float(x))}
+
+cellReference = re.compile('([A-Z]+)')
+
+
+def columnIndex(reference):
+    """ This function converts a cell reference (e.g. C12) into a column index
+
+    Input:
+        reference: cell reference
+
+    Return:
+        index: zero-based column index
+    """
+
+    letters = cellReference.match(reference).group(1)
+    index = 0
+    for letter in letters:
+        index = index * 26 + (ord(letter) - 64)
+    return index - 1
+
+
+def numberValue(text):
+    """ This function converts a numeric cell value into int or float
+
+    Input:
+        text: cell value as stored in the worksheet
+
+    Return:
+        value: int if the number is integral, otherwise float
+    """
+
+    value = float(text)
+    if value == int(value) and 'E' not in text.upper() and '.' not in text:
+        return int(value)
+    return value
+
+
+def readSharedStrings(archive):
+    """ This function reads the shared string table of a workbook
+
+    Input:
+        archive: opened zip file
+
+    Return:
+        sharedStrings: list of strings
+    """
+
+    sharedStrings = []
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return sharedStrings
+    f = archive.open('xl/sharedStrings.xml')
+    try:
+        for event, element in iterparse(f):
+            if element.tag == ns + 'si':
+                sharedStrings.append(''.join(x.text or '' for x in element.iter(ns + 't')))
+                element.clear()
+    finally:
+        f.close()
+    return sharedStrings
+
+
+def firstSheet(archive):
+    """ This function returns the name of the first worksheet in a workbook
+
+    Input:
+        archive: opened zip file
+
+    Return:
+        sheetName: path of the worksheet within the archive
+    """
+
+    names = archive.namelist()
+    if 'xl/worksheets/sheet1.xml' in names:
+        return 'xl/worksheets/sheet1.xml'
+    return sorted(x for x in names if x.startswith('xl/worksheets/sheet'))[0]
+
+
+def iterRows(path):
+    """ This function streams the rows of the first worksheet
+
+    Input:
+        path: path to .xlsx file
+
+    Return:
+        generator of rows (lists of str, int, float, bool or None)
+    """
+
+    archive = zipfile.ZipFile(path)
+    try:
+        sharedStrings = readSharedStrings(archive)
+        f = archive.open(firstSheet(archive))
+        try:
+            row = None
+            for event, element in iterparse(f, events=('start', 'end')):
+                tag = element.tag
+                if event == 'start':
+                    if tag == ns + 'row':
+                        row = []
+                    continue
+                if tag == ns + 'c':
+                    cellType = element.get('t', 'n')
+                    if cellType == 'inlineStr':
+                        value = ''.join(x.text or '' for x in element.iter(ns + 't'))
+                    else:
+                        v = element.find(ns + 'v')
+                        if v is None or v.text is None:
+                            value = None
+                        elif cellType == 's':
+                            value = sharedStrings[int(v.text)]
+                        elif cellType == 'b':
+                            value = v.text == '1'
+                        elif cellType in ('str', 'e'):
+                            value = v.text
+                        else:
+                            value = numberValue(v.text)
+                    reference = element.get('r')
+                    if reference is not None:
+                        index = columnIndex(reference)
+                        while len(row) < index:
+                            row.append(None)
+                    row.append(value)
+                    element.clear()
+                elif tag == ns + 'row':
+                    yield row
+                    element.clear()
+        finally:
+            f.close()
+    finally:
+        archive.close()
+
+
+def iterRecords(path, columnTypes=None):
+    """ This function streams the trials of a conditions file as typed records
+
+    Input:
+        path: path to .xlsx file (first row contains column names)
+        columnTypes: dictionary of column name -> conversion function (optional)
+
+    Return:
+        generator of dictionaries (one per trial)
+    """
+
+    rows = iterRows(path)
+    try:
+        header = next(rows)
+    except StopIteration:
+        return
+    # Columns with empty header cells are skipped (column index -> name)
+    header = [(i, x) for i, x in enumerate(header) if x is not None]
+    if columnTypes is None:
+        converters = [None] * len(header)
+    else:
+        converters = [columnTypes.get(x) for (i, x) in header]
+    nColumns = header[-1][0] + 1 if len(header) > 0 else 0
+    for row in rows:
+        if all(x is None for x in row):
+            continue
+        row = row + [None] * (nColumns - len(row))
+        record = {}
+        for ((i, name), converter) in zip(header, converters):
+            value = row[i]
+            if converter is not None and value is not None:
+                value = converter(value)
+            record[name] = value
+        yield record
+
+
+def readConditions(path):
+    """ This function reads a conditions file as trial list for the PsychoPy TrialHandler
+
+    Columns of the block files are converted with the block column types;
+    other columns (e.g. digit-span) keep the numbers and strings stored in
+    the worksheet.
+
+    Input:
+        path: path to .xlsx file
+
+    Return:
+        conditions: list of dictionaries (one per trial)
+    """
+
+    return list(iterRecords(path, blockColumnTypes))